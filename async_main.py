@@ -0,0 +1,434 @@
+# Import necessary libraries
+import os, sys, json, asyncio
+import importlib.util
+import numpy as np
+import argparse
+from functools import wraps
+# Import asyncio web server, the async postgres driver and its connection pool
+from aiohttp import web
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+from src.utils import db_params, db_pool_params, cache_params, logging, CustomException
+from src.storage import storage_backend
+from src.cache import ResponseCache
+from src.point_index import WeatherPointIndex, POINT_INDEX_QUERY
+from src.analytics import (WeatherCube, MONTHLY_ROLLUP_QUERY, MONTHLY_WEATHER_QUERY, CROP_YIELD_QUERY, MIN_YEARS,
+                           parse_seasons, yield_series, analyze_yield)
+from src.db_pool import PREPARED_STATEMENTS, PLAN_CACHE_MODES
+from src.api_queries import (STREAM_PAGE_SIZE, CURSOR_ITERSIZE, ROLLUP_AVAILABLE_QUERY, message, missing_params,
+                             parse_weather_params, parse_date, parse_int, parse_station_ids, build_weather_page_query,
+                             build_weather_keyset_query, build_weather_stats_query, build_weather_batch_query, parse_batch_params,
+                             encode_json_array, encode_keyset_page, split_station_ids, stream_records, RecordEncoder,
+                             StationGroupEncoder)
+
+
+# Results with more rows than this are encoded in a worker thread, so the event loop keeps serving other requests meanwhile
+OFFLOAD_ROWS = 200
+# Swagger UI page, served from the static files of flask_swagger_ui already shipped for the Flask application. The package is
+# located without importing it, which would import Flask as well
+SWAGGER_URL = '/swagger'
+SWAGGER_UI_DIST = os.path.join(os.path.dirname(importlib.util.find_spec('flask_swagger_ui').origin), 'dist')
+SWAGGER_UI_PAGE = f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8">
+  <title>Weather_Crop_Data_Analysis_and_ETL API</title>
+  <link rel="stylesheet" type="text/css" href="{SWAGGER_URL}/dist/swagger-ui.css">
+</head>
+<body>
+  <div id="swagger-ui"></div>
+  <script src="{SWAGGER_URL}/dist/swagger-ui-bundle.js"></script>
+  <script>window.onload = function () {{ window.ui = SwaggerUIBundle({{url: "/swagger.json", dom_id: "#swagger-ui"}}); }}</script>
+</body>
+</html>'''
+
+
+def text_response(body):
+    """
+    Returns a body the way Flask returns a plain string from a view, so both servers answer with the same content type.
+    """
+    return web.Response(text=body, content_type='text/html')
+
+
+async def encode(rows, encoder, *args):
+    """
+    Runs a CPU bound encoder over query results, in a worker thread when the result is large.
+    """
+    if len(rows) > OFFLOAD_ROWS:
+        return await asyncio.to_thread(encoder, *args)
+    return encoder(*args)
+
+
+async def fetch_all(request, query, params):
+    """
+    Runs a query on a pooled connection and returns the result column names and rows.
+    """
+    async with request.app['db_pool'].connection() as conn:
+        cur = await conn.execute(query, params)
+        return [desc.name for desc in cur.description], await cur.fetchall()
+
+
+async def fetch_data_version(pool):
+    """
+    Reads the data version stamp that DBOperations bumps with every load, or 0 if nothing was loaded yet.
+    """
+    try:
+        async with pool.connection() as conn:
+            cur = await conn.execute("SELECT version FROM data_version WHERE id = 1")
+            row = await cur.fetchone()
+            return row[0] if row else 0
+    except psycopg.Error:
+        return 0
+
+
+async def fetch_rollup_available(pool):
+    """
+    Reads whether the weather_rollup cube exists.
+    """
+    async with pool.connection() as conn:
+        cur = await conn.execute(ROLLUP_AVAILABLE_QUERY)
+        return (await cur.fetchone())[0]
+
+
+async def poll_data_version(app):
+    # ResponseCache asks for the version synchronously, so it is refreshed in the background instead of per request.
+    # Creating the rollup cube bumps the version, so its availability only needs a re-check when the version changes.
+    state = app['state']
+    while True:
+        await asyncio.sleep(app['response_cache'].version_check_interval)
+        version = await fetch_data_version(app['db_pool'])
+        if version != state['data_version']:
+            state['rollup'] = await fetch_rollup_available(app['db_pool'])
+        state['data_version'] = version
+
+
+async def db_pool_context(app):
+    """
+    Opens the async connection pool, sized by the [db_pool] section of config.ini, for the lifetime of the server.
+    """
+    # Queries are prepared on their first execution instead of their fifth (the psycopg default), up to prepared_statements
+    # per connection as the Flask pool does
+    prepared_statements = int(db_pool_params.get('prepared_statements', PREPARED_STATEMENTS))
+    plan_cache_mode = db_pool_params.get('plan_cache_mode')
+    if plan_cache_mode is not None and plan_cache_mode not in PLAN_CACHE_MODES:
+        raise ValueError(f"plan_cache_mode must be one of {PLAN_CACHE_MODES}, got {plan_cache_mode}")
+
+    async def configure(conn):
+        conn.prepare_threshold = 0 if prepared_statements > 0 else None
+        conn.prepared_max = max(prepared_statements, 1)
+
+    pool = AsyncConnectionPool(
+        psycopg.conninfo.make_conninfo(host=db_params['hostname'], port=db_params['port'], dbname=db_params['dbname'],
+                                       user=db_params['username'], password=db_params['password'],
+                                       client_encoding='utf8',
+                                       options=f'-c plan_cache_mode={plan_cache_mode}' if plan_cache_mode else None),
+        min_size=int(db_pool_params.get('minconn', 1)),
+        max_size=int(db_pool_params.get('maxconn', 10)),
+        timeout=float(db_pool_params.get('timeout', 30)),
+        configure=configure,
+        open=False,
+    )
+    await pool.open()
+    app['db_pool'] = pool
+    app['state']['data_version'] = await fetch_data_version(pool)
+    app['state']['rollup'] = await fetch_rollup_available(pool)
+    poller = asyncio.create_task(poll_data_version(app))
+    logging.info(f'Async Postgres connection pool initialized with min_size={pool.min_size} max_size={pool.max_size}')
+    yield
+    poller.cancel()
+    await pool.close()
+
+
+def cached_response(handler):
+    """
+    Decorator serving repeated requests of an endpoint from the response cache, with the same keys and entries as main.py.
+    Only complete successful responses are cached, streamed exports are not.
+    """
+    @wraps(handler)
+    async def wrapper(request):
+        response_cache = request.app['response_cache']
+        key = response_cache.key(request.path, request.query.items())
+        cached = response_cache.get(key)
+        if cached is not None:
+            content_type, body = cached.split('\n', 1)
+            return web.Response(text=body, content_type=content_type)
+
+        response = await handler(request)
+        if response.status == 200 and not response.prepared:
+            response_cache.set(key, f"{response.content_type}\n{response.text}")
+        return response
+    return wrapper
+
+
+async def get_cache_stats(request):
+    """
+    API endpoint returning the hit, miss and eviction counters of the response cache.
+    """
+    return web.json_response(request.app['response_cache'].stats())
+
+
+async def swagger(request):
+    """
+    Endpoint to return the API specification in JSON format for use by the Swagger UI.
+    """
+    with open('swagger.json', 'r') as f:
+        return web.json_response(json.load(f))
+
+
+async def swagger_ui(request):
+    return web.Response(text=SWAGGER_UI_PAGE, content_type='text/html')
+
+
+async def stream_rows(request, query, params, output_format, encoder):
+    """
+    Streams the result of a query from a server-side cursor, CURSOR_ITERSIZE rows per round trip, encoding every batch with
+    the feed and close methods of encoder (a RecordEncoder or StationGroupEncoder).
+    """
+    async with request.app['db_pool'].connection() as conn:
+        async with conn.cursor(name='weather_rows') as cur:
+            await cur.execute(query, params)
+            rows = await cur.fetchmany(CURSOR_ITERSIZE)
+            if not rows:
+                return text_response(message('No records for this query'))
+
+            response = web.StreamResponse(headers={'Cache-Control': 'no-store'})
+            response.content_type = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+            await response.prepare(request)
+            while rows:
+                chunk = await encode(rows, encoder.feed, rows)
+                if chunk:
+                    await response.write(chunk.encode('utf-8'))
+                rows = await cur.fetchmany(CURSOR_ITERSIZE)
+            await response.write(encoder.close().encode('utf-8'))
+            await response.write_eof()
+            return response
+
+
+@cached_response
+async def get_weather_data_api_handle(request):
+    """
+    API endpoint for retrieving weather data, same contract as /api/weather of main.py.
+    """
+    args = request.query
+
+    # Checking if all required query params are passed
+    if missing_params(args):
+        return text_response(message('Incomplete query params'))
+
+    # Validating the query params before they reach the database
+    try:
+        start_date, end_date, station_id, pageNumber, pageSize, cursor = parse_weather_params(args)
+    except ValueError as e:
+        return text_response(message(str(e)))
+
+    # Keyset pagination: an (empty for the first page) cursor param switches to cursor based paging
+    if 'cursor' in args:
+        _, rows = await fetch_all(request, *build_weather_keyset_query(start_date, end_date, station_id, pageSize, cursor))
+        res, next_cursor = await encode(rows, encode_keyset_page, rows, pageSize)
+        if res == '[]':
+            return text_response(message('No records for this query'))
+        return text_response('{"records": %s, "next_cursor": %s}' % (res, json.dumps(next_cursor)))
+
+    # Large pages and NDJSON exports are streamed from a server-side cursor instead of being built in memory
+    output_format = args.get('format', 'json')
+    if output_format == 'ndjson' or pageSize > STREAM_PAGE_SIZE:
+        query, params = build_weather_page_query(start_date, end_date, station_id, pageNumber, pageSize)
+        return await stream_rows(request, query, params, output_format, RecordEncoder(output_format))
+
+    _, rows = await fetch_all(request, *build_weather_page_query(start_date, end_date, station_id, pageNumber, pageSize))
+    res = await encode(rows, lambda: ''.join(encode_json_array(rows)))
+    if res == '[]':
+        return text_response(message('No records for this query'))
+    return text_response(res)
+
+
+@cached_response
+async def get_weather_data_stats(request):
+    """
+    API endpoint for retrieving yearly (or monthly) weather statistics, same contract as /api/weather/stats of main.py.
+    """
+    args = request.query
+
+    # Checking if all required query params are passed
+    if missing_params(args):
+        return text_response(message('Incomplete query params'))
+
+    # Validating the query params before they reach the database
+    try:
+        start_date = parse_date(args.get('start_date'), 'start_date')
+        end_date = parse_date(args.get('end_date'), 'end_date')
+        station_ids = parse_station_ids(args.getall('station_id'))
+    except ValueError as e:
+        return text_response(message(str(e)))
+    granularity = args.get('granularity', 'year')
+    if granularity not in ('year', 'month'):
+        return text_response(message('granularity must be year or month'))
+
+    # Aggregate the weather data records inside the database
+    columns, rows = await fetch_all(request, *build_weather_stats_query(start_date, end_date, station_ids, granularity,
+                                                                         request.app['state']['rollup']))
+    if not rows:
+        return text_response(message('No records for this query'))
+    body = await encode(rows, lambda: ''.join(stream_records(columns, rows)))
+    return web.Response(text=body, content_type='application/json')
+
+
+@cached_response
+async def get_weather_data_batch(request):
+    """
+    API endpoint for retrieving the weather data of many stations with one query, same contract as /api/weather/batch of main.py.
+    """
+    args = request.query
+
+    # Checking if all required query params are passed
+    if missing_params(args):
+        return text_response(message('Incomplete query params'))
+
+    station_ids, columns, error = parse_batch_params(args.getall('station_id'), args.getall('columns', []))
+    if error:
+        return text_response(message(error))
+    try:
+        start_date = parse_date(args.get('start_date'), 'start_date')
+        end_date = parse_date(args.get('end_date'), 'end_date')
+    except ValueError as e:
+        return text_response(message(str(e)))
+
+    output_format = args.get('format', 'json')
+    query, params = build_weather_batch_query(start_date, end_date, station_ids, columns)
+    return await stream_rows(request, query, params, output_format, StationGroupEncoder(columns, output_format))
+
+
+async def get_weather_cube(request):
+    """
+    Returns the monthly weather cube and the grain yield per cube year, reloaded only when the data version changes.
+    """
+    state = request.app['state']
+    if state.get('cube_version') != state['data_version']:
+        version = state['data_version']
+        _, rows = await fetch_all(request, MONTHLY_ROLLUP_QUERY if state['rollup'] else MONTHLY_WEATHER_QUERY, [])
+        cube = await asyncio.to_thread(WeatherCube.from_rows, rows)
+        _, yield_rows = await fetch_all(request, CROP_YIELD_QUERY, [])
+        state.update(cube_version=version, cube=cube, yields=yield_series(yield_rows, cube.years))
+    return state['cube'], state['yields']
+
+
+@cached_response
+async def get_yield_analytics(request):
+    """
+    API endpoint correlating season weather features with the crop grain yield, same contract as /api/analytics/yield of main.py.
+    """
+    args = request.query
+    try:
+        seasons = parse_seasons(args.get('season'))
+        top = parse_int(args['top'], 'top') if 'top' in args else None
+        min_years = parse_int(args['min_years'], 'min_years') if 'min_years' in args else MIN_YEARS
+    except ValueError as e:
+        return text_response(message(str(e)))
+    station_ids = split_station_ids(args.getall('station_id', [])) or None
+    by_station = args.get('by_station', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        cube, yields = await get_weather_cube(request)
+    except psycopg.Error:
+        # The weather or crop yield tables are not loaded yet
+        return text_response(message('No records for this query'))
+    if not len(cube.years) or np.isnan(yields).all():
+        return text_response(message('No records for this query'))
+    # The sweep is CPU bound, keep it off the event loop
+    body = await asyncio.to_thread(analyze_yield, cube, yields, seasons, station_ids, by_station, top, min_years)
+    return web.Response(text=json.dumps(body), content_type='application/json')
+
+
+async def get_point_index(request):
+    """
+    Returns the point lookup index of weather_data, rebuilt only when the data version changes. The lock lets one request
+    rebuild it while concurrent ones wait.
+    """
+    state = request.app['state']
+    if state.get('point_index_version') != state['data_version']:
+        async with state['point_index_lock']:
+            if state.get('point_index_version') != state['data_version']:
+                version = state['data_version']
+                _, rows = await fetch_all(request, POINT_INDEX_QUERY, [])
+                index = await asyncio.to_thread(WeatherPointIndex.from_rows, rows)
+                state.update(point_index_version=version, point_index=index)
+    return state['point_index']
+
+
+async def get_weather_point(request):
+    """
+    API endpoint returning the record of one station on one day from the in-memory point index, same contract as
+    /api/weather/point of main.py.
+    """
+    args = request.query
+    if missing_params(args, ('station_id', 'date')):
+        return text_response(message('Incomplete query params'))
+    index = await get_point_index(request)
+    try:
+        record = index.lookup(args['station_id'], args['date'])
+    except ValueError as e:
+        return text_response(message(str(e)))
+    if record is None:
+        return text_response(message('No records for this query'))
+    return web.Response(text=json.dumps(record), content_type='application/json')
+
+
+async def get_weather_day(request):
+    """
+    API endpoint returning the records of every station on one date from the in-memory point index, same contract as
+    /api/weather/day of main.py.
+    """
+    args = request.query
+    if missing_params(args, ('date',)):
+        return text_response(message('Incomplete query params'))
+    index = await get_point_index(request)
+    try:
+        records = index.day_slice(args['date'], split_station_ids(args.getall('station_id', [])) or None)
+    except ValueError as e:
+        return text_response(message(str(e)))
+    if not records:
+        return text_response(message('No records for this query'))
+    return web.Response(text=json.dumps(records), content_type='application/json')
+
+
+def create_app():
+    """
+    Builds the asyncio application serving the same endpoints as the Flask application of main.py. It runs on Postgres
+    only; serve the duckdb storage backend with main.py.
+    """
+    try:
+        if storage_backend() != 'postgres':
+            raise ValueError('async_main.py requires the postgres storage backend')
+    except Exception as e:
+        raise CustomException(e, sys)
+    app = web.Application()
+    app['state'] = {'data_version': 0, 'rollup': False, 'point_index_lock': asyncio.Lock()}
+    # Cache of API responses, configured by the [cache] section of config.ini and invalidated by data version bumps
+    app['response_cache'] = ResponseCache.from_config(cache_params, lambda: app['state']['data_version'])
+    app.cleanup_ctx.append(db_pool_context)
+    app.router.add_get('/api/weather', get_weather_data_api_handle)
+    app.router.add_get('/api/weather/stats', get_weather_data_stats)
+    app.router.add_get('/api/weather/batch', get_weather_data_batch)
+    app.router.add_get('/api/weather/point', get_weather_point)
+    app.router.add_get('/api/weather/day', get_weather_day)
+    app.router.add_get('/api/analytics/yield', get_yield_analytics)
+    app.router.add_get('/api/cache/stats', get_cache_stats)
+    app.router.add_get('/swagger.json', swagger)
+    app.router.add_get(SWAGGER_URL, swagger_ui)
+    app.router.add_get(f'{SWAGGER_URL}/', swagger_ui)
+    app.router.add_static(f'{SWAGGER_URL}/dist', SWAGGER_UI_DIST)
+    return app
+
+
+if __name__ == "__main__":
+    '''
+    Serves the API with an asyncio server and non-blocking database access instead of the Flask development server.
+
+    Usage: python async_main.py --port 5000
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port)
@@ -0,0 +1,59 @@
+# Import in-built libraries
+import time
+# Import argument parser library
+import argparse
+
+# Import the Flask application and the cache backend used to disable response caching
+import main
+from src.cache import MemoryCacheBackend
+from src.utils import logging
+
+
+def station_ids(count):
+    conn = main.db_pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT DISTINCT station_id FROM weather_data ORDER BY station_id LIMIT %s", [count])
+            return [row[0] for row in cur.fetchall()]
+    finally:
+        main.db_pool.putconn(conn)
+
+
+def timed(client, urls, repeat):
+    # Best of repeat runs of fetching every url in turn
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url in urls:
+            client.get(url).get_data()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    '''
+    Compares fetching the weather data of many stations with one /api/weather request per station against a single
+    /api/weather/batch request, with the response cache disabled.
+
+    Usage: python -m benchmarks.bench_api_batch --stations 10 50 --start_date 1994-01-01 --end_date 1994-12-31
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stations', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--start_date', type=str, default='1994-01-01')
+    parser.add_argument('--end_date', type=str, default='1994-12-31')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    main.response_cache.backend = MemoryCacheBackend(max_entries=0)
+    client = main.app.test_client()
+    dates = f'start_date={args.start_date}&end_date={args.end_date}'
+
+    print(f"{'stations':>8} {'per station ms':>15} {'batch ms':>9}")
+    for count in args.stations:
+        ids = station_ids(count)
+        # page_size covers a whole year so every per station request returns all of its records
+        single = [f'/api/weather?{dates}&station_id={station_id}&page_size=366' for station_id in ids]
+        batch = [f'/api/weather/batch?{dates}&station_id={",".join(ids)}']
+        per_station, batched = timed(client, single, args.repeat), timed(client, batch, args.repeat)
+        print(f"{count:>8} {per_station * 1000:>15.1f} {batched * 1000:>9.1f}")
+        logging.info(f"API batch benchmark: stations={count} per_station={per_station * 1000:.1f}ms batch={batched * 1000:.1f}ms")
@@ -0,0 +1,62 @@
+# Import in-built libraries
+import time, threading
+# Import argument parser library
+import argparse
+# Import http client and thread pool for the concurrent load generator
+from urllib.request import urlopen
+from concurrent.futures import ThreadPoolExecutor
+# Import werkzeug server to serve the Flask app from a background thread
+from werkzeug.serving import make_server
+
+# Import the Flask application and the connection pool
+import main
+from src.db_pool import ConnectionPool
+from src.utils import db_params, logging
+
+
+QUERY = '/api/weather?start_date=1994-05-01&end_date=1998-04-01&station_id=USC00110072&page_size=100&page_number=3'
+
+
+def run_load(base_url, clients, requests_per_client):
+    """
+    Fires requests_per_client sequential requests from each of clients concurrent threads and returns the requests/second.
+    """
+    def client(_):
+        for _ in range(requests_per_client):
+            with urlopen(base_url + QUERY) as response:
+                response.read()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    '''
+    Load tests /api/weather on a threaded server with different connection pool sizes and concurrent client counts.
+    A pool of size 1 reproduces the former single shared connection.
+
+    Usage: python -m benchmarks.bench_api_pool --pool_sizes 1 4 8 --clients 1 2 4 8 16
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pool_sizes', type=int, nargs='+', default=[1, 4, 8], help='maxconn values to benchmark')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='concurrent client counts')
+    parser.add_argument('--requests', type=int, default=50, help='requests sent by each client')
+    parser.add_argument('--port', type=int, default=5055, help='port of the benchmark server')
+    args = parser.parse_args()
+
+    server = make_server('127.0.0.1', args.port, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{args.port}'
+
+    print(f"{'pool':>5} " + " ".join(f"{clients:>8}c" for clients in args.clients) + "   (requests/second)")
+    for pool_size in args.pool_sizes:
+        main.db_pool.closeall()
+        main.db_pool = ConnectionPool(db_params, minconn=1, maxconn=pool_size)
+        run_load(base_url, 1, 5)    # warm up the pool and the server
+        throughput = [run_load(base_url, clients, args.requests) for clients in args.clients]
+        print(f"{pool_size:>5} " + " ".join(f"{rps:>9.0f}" for rps in throughput))
+        logging.info(f"API pool benchmark: maxconn={pool_size} throughput={dict(zip(args.clients, throughput))}")
+
+    server.shutdown()
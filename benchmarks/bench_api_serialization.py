@@ -0,0 +1,72 @@
+# Import in-built libraries
+import time, tracemalloc
+# Import argument parser library
+import argparse
+# Import data manipulation libraries for the former serialization path
+import pandas as pd
+
+# Import the API module and its serialization helpers
+import main
+
+
+def legacy_serialize(start_date, end_date, station_id, page_size):
+    """
+    The former /api/weather serialization: fetch every row, build a DataFrame, round-trip the dates and call to_json.
+    """
+    conn = main.db_pool.getconn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM weather_data WHERE date >= %s AND date <= %s AND station_id = %s ORDER BY station_id, date LIMIT %s",
+                    [start_date, end_date, station_id, page_size])
+        df = pd.DataFrame(cur.fetchall(), columns=[desc[0] for desc in cur.description])
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
+        return len(df.to_json(orient='records'))
+    finally:
+        main.db_pool.putconn(conn)
+
+
+def streamed_serialize(start_date, end_date, station_id, page_size):
+    """
+    The current path: rows from a server-side cursor encoded chunk by chunk, as sent for large pages.
+    """
+    query, params = main.build_weather_page_query(start_date, end_date, station_id, 1, page_size)
+    return sum(len(chunk) for chunk in main.encode_json_array(main.iter_weather_rows(query, params)))
+
+
+def measure(func, *args, repeat=5):
+    # Latency is timed without tracemalloc, which slows down allocation heavy code unevenly
+    elapsed = min(timed(func, *args) for _ in range(repeat))
+    tracemalloc.start()
+    size = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    '''
+    Compares latency and peak Python memory of the former DataFrame based serialization of /api/weather with the streamed
+    row encoder, for increasing page sizes.
+
+    Usage: python -m benchmarks.bench_api_serialization --station_id USC00110072 --page_sizes 10 1000 10000
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--start_date', type=str, default='1985-01-01')
+    parser.add_argument('--end_date', type=str, default='2014-12-31')
+    parser.add_argument('--station_id', type=str, default='USC00110072')
+    parser.add_argument('--page_sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'page_size':>9} {'path':>9} {'latency ms':>11} {'peak MB':>8} {'bytes':>9}")
+    for page_size in args.page_sizes:
+        for name, func in (('dataframe', legacy_serialize), ('streamed', streamed_serialize)):
+            func(args.start_date, args.end_date, args.station_id, page_size)   # warm up
+            elapsed, peak, size = measure(func, args.start_date, args.end_date, args.station_id, page_size)
+            print(f"{page_size:>9} {name:>9} {elapsed * 1000:>11.2f} {peak / 1024 / 1024:>8.2f} {size:>9}")
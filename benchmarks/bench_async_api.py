@@ -0,0 +1,104 @@
+# Import in-built libraries
+import time, asyncio, multiprocessing
+# Import argument parser library
+import argparse
+# Import async http client for the load generator
+import aiohttp
+
+from src.utils import logging
+
+
+QUERY = '/api/weather?start_date=1994-05-01&end_date=1998-04-01&station_id=USC00110072&page_size=100&page_number=%d'
+
+
+def serve_flask(port):
+    # Threaded werkzeug server, as bench_api_pool, with the response cache disabled so every request reaches Postgres
+    from werkzeug.serving import make_server
+    import main
+    from src.cache import MemoryCacheBackend
+    main.response_cache.backend = MemoryCacheBackend(max_entries=0)
+    make_server('127.0.0.1', port, main.app, threaded=True).serve_forever()
+
+
+def serve_async(port):
+    from aiohttp import web
+    import async_main
+    from src.cache import MemoryCacheBackend
+    app = async_main.create_app()
+    app['response_cache'].backend = MemoryCacheBackend(max_entries=0)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+SERVERS = {'flask': serve_flask, 'async': serve_async}
+
+
+async def run_load(base_url, clients, requests_per_client):
+    """
+    Fires requests_per_client sequential requests from each of clients concurrent tasks.
+
+    Returns:
+        tuple: The requests/second and the p50 and p99 latency in milliseconds.
+    """
+    latencies = []
+
+    async def client(session, index):
+        for request in range(requests_per_client):
+            start = time.perf_counter()
+            # Vary the page so consecutive requests are not answered from the same buffers
+            async with session.get(base_url + QUERY % (1 + (index + request) % 10)) as response:
+                await response.read()
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session, index) for index in range(clients)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+    return len(latencies) / elapsed, percentile(0.50), percentile(0.99)
+
+
+async def wait_until_up(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(base_url + '/api/cache/stats') as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    '''
+    Load tests /api/weather on the threaded Flask server of main.py and on the asyncio server of async_main.py, with the
+    response cache disabled. Each server runs in its own process so it does not share the interpreter with the load generator.
+
+    Usage: python -m benchmarks.bench_async_api --clients 1 8 32 64 --requests 50
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--servers', type=str, nargs='+', default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32, 64], help='concurrent client counts')
+    parser.add_argument('--requests', type=int, default=50, help='requests sent by each client')
+    parser.add_argument('--port', type=int, default=5055, help='port of the benchmark server')
+    args = parser.parse_args()
+    base_url = f'http://127.0.0.1:{args.port}'
+
+    print(f"{'server':>6} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name in args.servers:
+        server = multiprocessing.get_context('spawn').Process(target=SERVERS[name], args=(args.port,), daemon=True)
+        server.start()
+        try:
+            asyncio.run(wait_until_up(base_url))
+            asyncio.run(run_load(base_url, 4, 5))    # warm up the connection pool and the server
+            for clients in args.clients:
+                rps, p50, p99 = asyncio.run(run_load(base_url, clients, args.requests))
+                print(f"{name:>6} {clients:>7} {rps:>8.0f} {p50:>8.1f} {p99:>8.1f}")
+                logging.info(f"Async API benchmark: {name} clients={clients} rps={rps:.0f} p50={p50:.1f}ms p99={p99:.1f}ms")
+        finally:
+            server.terminate()
+            server.join()
@@ -0,0 +1,185 @@
+# Import in-built libraries
+import os, sys, json, time, platform, subprocess
+from datetime import datetime
+# Import argument parser library
+import argparse
+# Import data manipulation libraries
+import numpy as np
+
+# Import the pipeline stages, the synthetic data generator and the cached PrepareData of the load mode benchmark
+from benchmarks.bench_load_modes import LimitedPrepareData
+from benchmarks.synthetic_data import generate_dataset, station_ids
+from src.database_operations import DBOperations, LOAD_MODES
+from src.data_preparation import PrepareData
+from src.db_pool import ConnectionPool
+from src.cache import MemoryCacheBackend
+from src.utils import db_params, logging
+
+
+# Metrics compared against a baseline run; all of them are better when lower
+COMPARED_METRICS = ('seconds', 'p50_ms', 'p95_ms')
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def time_prepare(data_dir, repeat):
+    seconds = best_of(lambda: PrepareData(data_dir).prepare_weather_data(), repeat)
+    return {'seconds': seconds}
+
+
+def time_inserts(bench_params, prep_data, modes, records):
+    results = {}
+    for mode in modes:
+        db_operations = DBOperations(bench_params)
+        db_operations.create_weather_data_table()
+        db_operations.cursor.execute("TRUNCATE weather_data, weather_data_transform_queue;")
+        db_operations.conn.commit()
+        start = time.perf_counter()
+        db_operations.insert_data_into_table(prep_data, 'weather_data', mode)
+        seconds = time.perf_counter() - start
+        db_operations.conn.close()
+        results[f'insert_{mode}'] = {'seconds': seconds, 'rows_per_second': records / seconds}
+    return results
+
+
+def time_transform(bench_params):
+    # Full rebuild of the yearly aggregates from the loaded weather_data
+    db_operations = DBOperations(bench_params)
+    db_operations.create_weather_data_transformed_table()
+    db_operations.cursor.execute("TRUNCATE weather_data_transformed;")
+    db_operations.conn.commit()
+    start = time.perf_counter()
+    db_operations.insert_data_into_table(None, 'weather_data_transformed')
+    seconds = time.perf_counter() - start
+    db_operations.conn.close()
+    return {'transform_rebuild': {'seconds': seconds}}
+
+
+def time_api(bench_params, stations, years, requests):
+    """
+    Measures the latency of /api/weather pages and /api/weather/stats through the Flask test client, with the response cache
+    disabled so every request reaches the database.
+    """
+    import main
+    main.db_pool = ConnectionPool(bench_params)
+    main.response_cache.backend = MemoryCacheBackend(max_entries=0)
+    client = main.app.test_client()
+    end_year = 1985 + years - 1
+    rng = np.random.default_rng(0)
+    endpoints = {
+        'api_weather': lambda station_id: f'/api/weather?start_date=1985-01-01&end_date={end_year}-12-31&station_id={station_id}'
+                                          f'&page_size=100&page_number={rng.integers(1, 10)}',
+        'api_stats': lambda station_id: f'/api/weather/stats?start_date=1985-01-01&end_date={end_year}-12-31&station_id={station_id}',
+    }
+    results = {}
+    for name, url in endpoints.items():
+        client.get(url(stations[0])).get_data()    # warm up the connection pool
+        latencies = []
+        for request in range(requests):
+            target = url(stations[request % len(stations)])
+            start = time.perf_counter()
+            response = client.get(target)
+            response.get_data()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f'{target} returned {response.status_code}')
+        results[name] = {'p50_ms': float(np.percentile(latencies, 50)), 'p95_ms': float(np.percentile(latencies, 95)),
+                         'mean_ms': float(np.mean(latencies))}
+    main.db_pool.closeall()
+    return results
+
+
+def git_commit():
+    # Commit of the benchmarked code, whichever folder the benchmark is run from
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    Returns the metrics of results that are slower than in the baseline run by more than threshold (0.2 = 20%).
+    """
+    regressions = []
+    for stage, metrics in results.items():
+        for metric in COMPARED_METRICS:
+            before = baseline.get('results', {}).get(stage, {}).get(metric)
+            after = metrics.get(metric)
+            if before and after is not None and after > before * (1 + threshold):
+                regressions.append({'stage': stage, 'metric': metric, 'baseline': before, 'current': after,
+                                    'change': round(after / before - 1, 4)})
+    return regressions
+
+
+if __name__ == "__main__":
+    '''
+    Generates a synthetic dataset and times every stage of the pipeline on it: PrepareData.prepare_weather_data, each
+    insert_data_into_table load mode, the weather_data_transformed rebuild and the latency of /api/weather and
+    /api/weather/stats through the Flask test client. The results are written as JSON; with --baseline, metrics slower than
+    the baseline run by more than --threshold are reported as regressions and the benchmark exits with status 1.
+    The weather tables of --dbname are truncated, so point it at a scratch database.
+
+    Usage: python -m benchmarks.bench_end_to_end --dbname weather_bench --stations 20 --years 10 --baseline benchmarks/results/baseline.json
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dbname', type=str, required=True, help='scratch database whose weather tables are truncated')
+    parser.add_argument('--data_dir', type=str, default='synthetic', help='folder the synthetic wx_data and yld_data are generated in')
+    parser.add_argument('--stations', type=int, default=20)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--sentinel_rate', type=float, default=0.01, help='share of measures recorded as missing (-9999)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--modes', type=str, nargs='+', default=list(LOAD_MODES), choices=LOAD_MODES, help='load modes to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of prepare_weather_data, the best one is kept')
+    parser.add_argument('--requests', type=int, default=50, help='requests sent to each API endpoint')
+    parser.add_argument('--output', type=str, default=None, help='JSON results file (default: benchmarks/results/e2e_<timestamp>.json)')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown over the baseline reported as a regression')
+    args = parser.parse_args()
+
+    started_at = datetime.now()
+    bench_params = dict(db_params, dbname=args.dbname)
+    dataset = generate_dataset(args.data_dir, args.stations, args.years, args.sentinel_rate, args.seed)
+    stations = station_ids(args.stations)
+
+    results = {'prepare_weather_data': time_prepare(args.data_dir, args.repeat)}
+    prep_data = LimitedPrepareData(args.data_dir, None)
+    records = len(prep_data.prepare_weather_data())
+    results.update(time_inserts(bench_params, prep_data, args.modes, records))
+    results.update(time_transform(bench_params))
+    results.update(time_api(bench_params, stations, args.years, args.requests))
+
+    report = {
+        'created_at': started_at.isoformat(),
+        'git_commit': git_commit(),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'dataset': dict(dataset, loaded_records=records),
+        'results': results,
+        'regressions': [],
+    }
+    if args.baseline:
+        with open(args.baseline) as fh:
+            report['baseline'] = args.baseline
+            report['regressions'] = find_regressions(results, json.load(fh), args.threshold)
+
+    output = args.output or os.path.join('benchmarks', 'results', f"e2e_{started_at.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+
+    for stage, metrics in results.items():
+        print(f"{stage:>22} " + ' '.join(f"{metric}={value:.4g}" for metric, value in metrics.items()))
+        logging.info(f"End to end benchmark: {stage} {metrics}")
+    for regression in report['regressions']:
+        print(f"REGRESSION {regression['stage']} {regression['metric']}: {regression['baseline']:.4g} -> {regression['current']:.4g} (+{regression['change']:.0%})")
+    print(f"results written to {output}")
+    if report['regressions']:
+        sys.exit(1)
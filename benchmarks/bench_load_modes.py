@@ -0,0 +1,64 @@
+# Import in-built libraries
+import time
+# Import argument parser library
+import argparse
+
+# Import python classes from python modules present in src directory
+from src.database_operations import DBOperations, LOAD_MODES
+from src.data_preparation import PrepareData
+from src.utils import db_params, logging
+
+
+class LimitedPrepareData(PrepareData):
+    """
+    PrepareData variant that only hands the first n weather records to the loader, so the slow row by row mode finishes in a
+    reasonable time while both modes are measured on exactly the same rows.
+    """
+    def __init__(self, cwd, limit):
+        super().__init__(cwd)
+        self.limit = limit
+        self._weather_df = None
+
+    def prepare_weather_data(self):
+        # Parse the station files once and reuse the frame for every benchmarked mode
+        if self._weather_df is None:
+            df = super().prepare_weather_data()
+            self._weather_df = df if self.limit is None else df.head(self.limit)
+        return self._weather_df.copy()
+
+
+if __name__ == "__main__":
+    '''
+    Compares the row by row and COPY based ingestion paths of DBOperations.insert_data_into_table on the bundled dataset.
+    The weather_data table of the given database is truncated before every run, so point --dbname at a scratch database.
+
+    Usage: python -m benchmarks.bench_load_modes --dbname weather_bench --dir . --limit 50000
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dbname', type=str, required=True, help='scratch database whose weather_data table is truncated between runs')
+    parser.add_argument('--dir', type=str, default='.', help='folder containing wx_data and yld_data')
+    parser.add_argument('--limit', type=int, default=None, help='only load the first n weather records (default: all)')
+    parser.add_argument('--modes', type=str, nargs='+', default=list(LOAD_MODES), choices=LOAD_MODES, help='load modes to benchmark')
+    args = parser.parse_args()
+
+    bench_params = dict(db_params, dbname=args.dbname)
+    prep_data = LimitedPrepareData(args.dir, args.limit)
+    n_rows = len(prep_data.prepare_weather_data())
+
+    results = {}
+    for mode in args.modes:
+        db_operations = DBOperations(bench_params)
+        db_operations.create_weather_data_table()
+        db_operations.cursor.execute("TRUNCATE weather_data;")
+        db_operations.conn.commit()
+
+        start = time.perf_counter()
+        db_operations.insert_data_into_table(prep_data, 'weather_data', mode)
+        results[mode] = time.perf_counter() - start
+        db_operations.conn.close()
+
+        print(f"{mode:>5}: {n_rows} rows in {results[mode]:.2f}s ({n_rows / results[mode]:.0f} rows/s)")
+        logging.info(f"Load mode benchmark: {mode} loaded {n_rows} rows in {results[mode]:.2f}s")
+
+    if 'rows' in results and 'copy' in results:
+        print(f"copy speedup over rows: {results['rows'] / results['copy']:.1f}x")
@@ -0,0 +1,77 @@
+# Import in-built libraries
+import re, time
+# Import argument parser library
+import argparse
+# Import python library for postgres sql
+import psycopg2
+
+# Import the API query builders and the database parameters
+import main
+from src.utils import db_params, logging
+
+
+def single_year_queries(year, station_id):
+    """
+    Returns (name, sql, params) of the single year range queries issued by the API and the transform step.
+    """
+    start_date, end_date = f'{year}-01-01', f'{year}-12-31'
+    page_query, page_params = main.build_weather_page_query(start_date, end_date, station_id, 3, 100)
+    all_stations_query, all_stations_params = main.build_weather_page_query(start_date, end_date, None, 1, 1000)
+    return [
+        ('station page', page_query, page_params),
+        ('all stations page', all_stations_query, all_stations_params),
+        ('yearly rollup', '''
+            SELECT station_id, AVG(max_temp), AVG(min_temp), SUM(precipitation_amt)
+            FROM weather_data WHERE date >= %s AND date <= %s GROUP BY station_id
+            ''', [start_date, end_date]),
+    ]
+
+
+def measure(cur, query, params, repeat):
+    # Best of repeat runs, after one warm up run that also loads the pages into the buffer cache
+    cur.execute(query, params)
+    cur.fetchall()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(query, params)
+        cur.fetchall()
+        timings.append(time.perf_counter() - start)
+    # Count the distinct tables (partitions) the plan reads, ignoring scans of their indexes
+    cur.execute("EXPLAIN " + query, params)
+    scanned = {match for (line,) in cur.fetchall() for match in re.findall(r'Scan (?:using \w+ )?on (weather_data\w*)', line)
+               if not match.endswith('_pkey') and not match.endswith('_idx')}
+    return min(timings), len(scanned)
+
+
+if __name__ == "__main__":
+    '''
+    Compares single year range query latency on a plain weather_data table with a partitioned one holding the same data.
+    Create and load the partitioned copy first, e.g.
+        python .\\data_model.py --create_weather_data_tbl "1" --partition_by year   (with dbname of config.ini set to the copy)
+        python .\\data_model.py --insert_data_tbl "1" --dir . --tbl_name weather_data --load_mode copy
+
+    Usage: python -m benchmarks.bench_partitioning --flat_dbname Crop_Weather_ETL --partitioned_dbname weather_partitioned
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--flat_dbname', type=str, required=True, help='database with a plain weather_data table')
+    parser.add_argument('--partitioned_dbname', type=str, required=True, help='database with a partitioned weather_data table')
+    parser.add_argument('--years', type=int, nargs='+', default=[1990, 2010])
+    parser.add_argument('--station_id', type=str, default='USC00110072')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    connections = {name: psycopg2.connect(host=db_params['hostname'], port=db_params['port'], database=dbname,
+                                          user=db_params['username'], password=db_params['password'])
+                   for name, dbname in (('flat', args.flat_dbname), ('partitioned', args.partitioned_dbname))}
+
+    print(f"{'year':>4} {'query':>18} {'flat ms':>9} {'partitioned ms':>15} {'partitions read':>15}")
+    for year in args.years:
+        for name, query, params in single_year_queries(year, args.station_id):
+            flat, _ = measure(connections['flat'].cursor(), query, params, args.repeat)
+            partitioned, scanned = measure(connections['partitioned'].cursor(), query, params, args.repeat)
+            print(f"{year:>4} {name:>18} {flat * 1000:>9.2f} {partitioned * 1000:>15.2f} {scanned:>15}")
+            logging.info(f"Partitioning benchmark: {year} {name} flat={flat * 1000:.2f}ms partitioned={partitioned * 1000:.2f}ms")
+
+    for conn in connections.values():
+        conn.close()
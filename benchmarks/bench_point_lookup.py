@@ -0,0 +1,94 @@
+# Import in-built libraries
+import time
+# Import argument parser library
+import argparse
+# Import data manipulation libraries
+import numpy as np
+
+# Import the Flask application, its response cache backend and the SQL builders of the weather endpoints
+import main
+from src.cache import MemoryCacheBackend
+from src.point_index import WeatherPointIndex, EPOCH
+from src.api_queries import build_weather_page_query, build_weather_batch_query, BATCH_DEFAULT_COLUMNS
+from src.utils import logging
+
+
+def sample_points(index, count, seed):
+    """
+    Draws (station_id, date) pairs of existing records, uniformly over the index.
+    """
+    rng = np.random.default_rng(seed)
+    stations, days = np.nonzero(index.present)
+    picks = rng.integers(0, len(stations), count)
+    return [(index.station_names[stations[pick]], str(np.datetime64(EPOCH, 'D') + index.first_day + days[pick])) for pick in picks]
+
+
+def latency(func, args):
+    # Latency of every call in microseconds, after one warm up call
+    func(*args[0])
+    timings = []
+    for arg in args:
+        start = time.perf_counter()
+        func(*arg)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return np.percentile(timings, 50), np.percentile(timings, 95)
+
+
+def get(client, url):
+    response = client.get(url)
+    response.get_data()
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code}')
+
+
+if __name__ == "__main__":
+    '''
+    Compares "one station, one day" and "all stations on one date" lookups answered by the in-memory point index with the
+    SQL path, both in process (index vs query round trip) and through the Flask endpoints with the response cache disabled:
+    /api/weather/point vs /api/weather with start_date = end_date, and /api/weather/day vs /api/weather/batch with
+    station_id=all. Runs against the database of config.ini, which is only read.
+
+    Usage: python -m benchmarks.bench_point_lookup --requests 500
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=500, help='lookups per measured path')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    main.response_cache.backend = MemoryCacheBackend(max_entries=0)
+    conn = main.db_pool.getconn()
+    cur = conn.cursor()
+    start = time.perf_counter()
+    index = WeatherPointIndex.fetch(cur)
+    build = time.perf_counter() - start
+    print(f"index of {int(index.present.sum())} records built in {build:.2f} s, {index.nbytes / 1e6:.1f} MB")
+    logging.info(f"Point lookup benchmark: index built in {build:.2f}s, {index.nbytes / 1e6:.1f} MB")
+
+    points = sample_points(index, args.requests, args.seed)
+    dates = [(date,) for _, date in points]
+
+    def sql_point(station_id, date):
+        cur.execute(*build_weather_page_query(date, date, station_id, 1, 10))
+        cur.fetchall()
+
+    def sql_day(date):
+        cur.execute(*build_weather_batch_query(date, date, ['all'], BATCH_DEFAULT_COLUMNS))
+        cur.fetchall()
+
+    client = main.app.test_client()
+    paths = [
+        ('point in process', 'sql', sql_point, points),
+        ('point in process', 'index', index.lookup, points),
+        ('day in process', 'sql', sql_day, dates),
+        ('day in process', 'index', index.day_slice, dates),
+        ('point endpoint', 'sql', lambda station_id, date: get(client, f'/api/weather?start_date={date}&end_date={date}&station_id={station_id}'), points),
+        ('point endpoint', 'index', lambda station_id, date: get(client, f'/api/weather/point?station_id={station_id}&date={date}'), points),
+        ('day endpoint', 'sql', lambda date: get(client, f'/api/weather/batch?start_date={date}&end_date={date}&station_id=all'), dates),
+        ('day endpoint', 'index', lambda date: get(client, f'/api/weather/day?date={date}'), dates),
+    ]
+    print(f"{'lookup':>18}{'path':>7}{'p50 us':>12}{'p95 us':>12}")
+    for name, path, func, calls in paths:
+        p50, p95 = latency(func, calls)
+        print(f"{name:>18}{path:>7}{p50:>12.1f}{p95:>12.1f}")
+        logging.info(f"Point lookup benchmark: {name} {path} p50={p50:.1f}us p95={p95:.1f}us")
+    main.db_pool.putconn(conn)
@@ -0,0 +1,44 @@
+# Import in-built libraries
+import os, time
+# Import argument parser library
+import argparse
+# Import data manipulation libraries
+import pandas as pd
+
+# Import python classes from python modules present in src directory
+from src.data_preparation import PrepareData
+from src.utils import logging
+
+
+if __name__ == "__main__":
+    '''
+    Reports the wall-clock time of PrepareData.prepare_weather_data against the number of worker processes and checks that
+    every parallel run produces exactly the same dataframe as the serial path.
+
+    Usage: python -m benchmarks.bench_prepare_workers --dir . --workers 1 2 4 8
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', type=str, default='.', help='folder containing wx_data and yld_data')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1], help='worker counts to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per worker count, the best one is reported')
+    args = parser.parse_args()
+
+    serial_df = None
+    serial_time = None
+    for workers in [1] + sorted(set(args.workers) - {1}):
+        prep_data = PrepareData(args.dir, workers)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            df = prep_data.prepare_weather_data()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+
+        if workers == 1:
+            serial_df, serial_time = df, best
+        else:
+            # Parallel output must match the serial path row for row
+            pd.testing.assert_frame_equal(serial_df, df)
+
+        print(f"workers={workers:>2}: {best:.2f}s for {len(df)} rows, speedup {serial_time / best:.2f}x")
+        logging.info(f"Prepare benchmark: {workers} workers prepared {len(df)} rows in {best:.2f}s")
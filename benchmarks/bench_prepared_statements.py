@@ -0,0 +1,115 @@
+# Import in-built libraries
+import time
+from datetime import date, timedelta
+# Import argument parser library
+import argparse
+# Import data manipulation libraries
+import numpy as np
+# Import python library for postgres sql
+import psycopg2
+from psycopg2 import extensions
+
+# Import the query builders of the API and the prepared statement connection of its pool
+from src.db_pool import PreparedStatementConnection, PLAN_CACHE_MODES
+from src.api_queries import (ROLLUP_AVAILABLE_QUERY, BATCH_DEFAULT_COLUMNS, build_weather_page_query, build_weather_keyset_query,
+                             build_weather_batch_query, build_weather_stats_query, encode_cursor)
+from src.utils import db_params, logging
+
+
+def connect(connection_factory=None, plan_cache_mode=None):
+    return psycopg2.connect(host=db_params['hostname'], port=db_params['port'], database=db_params['dbname'],
+                            user=db_params['username'], password=db_params['password'], connection_factory=connection_factory,
+                            options=f'-c plan_cache_mode={plan_cache_mode}' if plan_cache_mode else None)
+
+
+def query_shapes(cur, count, seed):
+    """
+    Returns, for every query shape of the API, count (query, params) pairs with random stations and dates of weather_data.
+    """
+    cur.execute("SELECT array_agg(DISTINCT station_id), min(date), max(date) FROM weather_data")
+    stations, first, last = cur.fetchone()
+    cur.execute(ROLLUP_AVAILABLE_QUERY)
+    rollup = cur.fetchone()[0]
+    rng = np.random.default_rng(seed)
+
+    def day(margin=0):
+        return first + timedelta(days=int(rng.integers(0, (last - first).days - margin + 1)))
+
+    def station():
+        return stations[rng.integers(len(stations))]
+
+    shapes = {'point': [], 'page': [], 'keyset': [], 'batch': [], 'stats': []}
+    for _ in range(count):
+        start, station_id = day(31), station()
+        shapes['point'].append(build_weather_page_query(str(start), str(start), station_id, 1, 10))
+        shapes['page'].append(build_weather_page_query(str(start), str(start + timedelta(days=30)), station_id,
+                                                        int(rng.integers(1, 4)), 10))
+        shapes['keyset'].append(build_weather_keyset_query(str(start), str(start + timedelta(days=30)), station_id, 10,
+                                                           encode_cursor(station_id, str(start + timedelta(days=5)))))
+        shapes['batch'].append(build_weather_batch_query(str(start), str(start + timedelta(days=2)),
+                                                         [station() for _ in range(3)], BATCH_DEFAULT_COLUMNS))
+        year = day().year
+        shapes['stats'].append(build_weather_stats_query(str(date(year, 1, 1)), str(date(year, 12, 31)), [station()], 'year', rollup))
+    return shapes
+
+
+def latency(cur, queries):
+    # Round trip of every query in microseconds
+    timings = []
+    for query, params in queries:
+        start = time.perf_counter()
+        cur.execute(query, params)
+        cur.fetchall()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return np.percentile(timings, 50), np.percentile(timings, 95)
+
+
+def planning_time(cur, queries):
+    # Mean planning time reported by EXPLAIN ANALYZE, in microseconds
+    timings = []
+    for query, params in queries:
+        cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + query, params)
+        timings.append(cur.fetchone()[0][0]['Planning Time'] * 1000)
+    return float(np.mean(timings))
+
+
+if __name__ == "__main__":
+    '''
+    Compares the API queries run ad hoc, parsed and planned by Postgres on every request, with the server-side prepared
+    statements of the API connection pool (src/db_pool.py), which are parsed once per connection and whose plans may be
+    cached, under every given plan_cache_mode. Every query shape is run with random stations and dates; reports the round
+    trip latency and the planning time measured by EXPLAIN ANALYZE per query. Runs against the database of config.ini,
+    which is only read.
+
+    Usage: python -m benchmarks.bench_prepared_statements --queries 500 --plan_cache_modes auto force_generic_plan
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=500, help='queries per shape and path')
+    parser.add_argument('--plan_cache_modes', type=str, nargs='+', default=['auto', 'force_generic_plan'], choices=PLAN_CACHE_MODES)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    adhoc_conn = connect()
+    adhoc = adhoc_conn.cursor()
+    prepared_conns = {mode: connect(PreparedStatementConnection, mode) for mode in args.plan_cache_modes}
+    shapes = query_shapes(adhoc, args.queries, args.seed)
+
+    print(f"{'query':>8}{'path':>28}{'p50 us':>10}{'p95 us':>10}{'planning us':>13}")
+    for name, queries in shapes.items():
+        paths = [('adhoc', adhoc, adhoc, lambda query: query)]
+        for mode, conn in prepared_conns.items():
+            # EXPLAIN statements are not prepared themselves, they run on a plain cursor of the prepared connection
+            paths.append((f'prepared {mode}', conn.cursor(), conn.cursor(cursor_factory=extensions.cursor),
+                          lambda query, conn=conn: conn.prepared_statement(query)[0]))
+        for path, cur, explain, statement in paths:
+            # Warm up; the first executions of a prepared statement are planned per call by Postgres in auto mode
+            for query, params in queries[:10]:
+                cur.execute(query, params)
+                cur.fetchall()
+            p50, p95 = latency(cur, queries)
+            planning = planning_time(explain, [(statement(query), params) for query, params in queries])
+            print(f"{name:>8}{path:>28}{p50:>10.1f}{p95:>10.1f}{planning:>13.1f}")
+            logging.info(f"Prepared statements benchmark: {name} {path} p50={p50:.1f}us p95={p95:.1f}us planning={planning:.1f}us")
+    adhoc_conn.close()
+    for conn in prepared_conns.values():
+        conn.close()
@@ -0,0 +1,106 @@
+# Import in-built libraries
+import os, sys, time, subprocess, shutil, tempfile
+from configparser import ConfigParser
+# Import argument parser library
+import argparse
+# Import statistics for the median of the runs
+import statistics
+
+from src.utils import logging
+from src.storage import STORAGE_BACKENDS
+
+
+# Commands timed in a fresh interpreter: name -> python arguments, run from --dir with the checkout on PYTHONPATH
+STARTUP_COMMANDS = {
+    'python': ['-c', 'pass'],
+    'import src.utils': ['-c', 'import src.utils'],
+    'data_model --help': ['{root}/data_model.py', '--help'],
+    'import main': ['-c', 'import main'],
+    'import async_main': ['-c', 'import async_main'],
+}
+
+
+def run(args, root, cwd):
+    env = dict(os.environ, PYTHONPATH=root)
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + [arg.format(root=root) for arg in args], cwd=cwd, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return time.perf_counter() - start
+
+
+def slowest_imports(args, root, cwd, top):
+    # Cumulative import times reported by python -X importtime, in microseconds, of the modules imported by the command itself
+    # and of their direct imports
+    env = dict(os.environ, PYTHONPATH=root)
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + [arg.format(root=root) for arg in args], cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit() and len(name) - len(name.lstrip()) <= 3:
+                imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def backend_dir(config_dir, backend):
+    # A temporary folder holding a copy of config.ini with its [storage] section set to the backend. The DuckDB file is only
+    # opened on the first query, so it does not need to exist.
+    config = ConfigParser()
+    config.read(os.path.join(config_dir, 'config.ini'))
+    folder = tempfile.mkdtemp(prefix=f'bench_startup_{backend}_')
+    if not config.has_section('storage'):
+        config.add_section('storage')
+    config.set('storage', 'backend', backend)
+    if backend == 'duckdb' and not config.has_option('storage', 'path'):
+        config.set('storage', 'path', os.path.join(folder, 'weather.duckdb'))
+    with open(os.path.join(folder, 'config.ini'), 'w') as f:
+        config.write(f)
+    return folder
+
+
+def count_log_folders(cwd):
+    logs = os.path.join(cwd, 'logs')
+    return len(os.listdir(logs)) if os.path.isdir(logs) else 0
+
+
+if __name__ == "__main__":
+    '''
+    Times the startup of short CLI invocations and API worker imports in fresh interpreters, and counts the log folders they
+    leave behind. Pass the folder of an older checkout (e.g. a git worktree) to --roots to compare it with this one.
+    --dir must contain config.ini; every command is run once per storage backend of --backends, from a temporary copy of it
+    whose [storage] section selects that backend. No database connection is opened.
+
+    Usage: python -m benchmarks.bench_startup --dir . --repeat 10 --roots . ../weather_before --backends postgres duckdb
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', type=str, default='.', help='folder containing config.ini, the commands are run from it')
+    parser.add_argument('--roots', type=str, nargs='+', default=[os.path.dirname(os.path.dirname(os.path.abspath(__file__)))],
+                        help='checkouts to benchmark (default: this one)')
+    parser.add_argument('--commands', type=str, nargs='+', default=list(STARTUP_COMMANDS), choices=list(STARTUP_COMMANDS))
+    parser.add_argument('--backends', type=str, nargs='+', default=list(STORAGE_BACKENDS), choices=STORAGE_BACKENDS)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--importtime', type=int, default=0, help='also list the n slowest top level imports of every command')
+    args = parser.parse_args()
+
+    roots = [os.path.abspath(root) for root in args.roots]
+    dirs = {backend: backend_dir(os.path.abspath(args.dir), backend) for backend in args.backends}
+    print(f"{'backend':>9}{'command':>20}" + ''.join(f"{os.path.basename(root) + ' ms':>24}{'log folders':>13}" for root in roots))
+    for backend, cwd in dirs.items():
+        for name in args.commands:
+            row = f"{backend:>9}{name:>20}"
+            for root in roots:
+                folders = count_log_folders(cwd)
+                timings = [run(STARTUP_COMMANDS[name], root, cwd) for _ in range(args.repeat)]
+                created = count_log_folders(cwd) - folders
+                median = statistics.median(timings) * 1000
+                row += f"{median:>21.1f} ms{created:>13}"
+                logging.info(f"Startup benchmark: {backend} {name} root={root} median={median:.1f}ms "
+                             f"min={min(timings) * 1000:.1f}ms log_folders={created}")
+            print(row)
+            if args.importtime:
+                for root in roots:
+                    for cumulative, module in slowest_imports(STARTUP_COMMANDS[name], root, cwd, args.importtime):
+                        print(f"{'':>31}{os.path.basename(root)}: {module} {cumulative / 1000:.1f} ms")
+    for cwd in dirs.values():
+        shutil.rmtree(cwd)
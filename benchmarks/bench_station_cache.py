@@ -0,0 +1,47 @@
+# Import in-built libraries
+import time, shutil, tempfile
+# Import argument parser library
+import argparse
+
+# Import the data preparation class
+from src.data_preparation import PrepareData
+
+
+def timed_prepare(cwd, workers, cache_dir):
+    start = time.perf_counter()
+    df = PrepareData(cwd, workers, cache_dir).prepare_weather_data()
+    return time.perf_counter() - start, len(df)
+
+
+if __name__ == "__main__":
+    '''
+    Compares weather data preparation without the station cache, with a cold cache (parse and write every station) and with a
+    warm cache (memory-map every station), plus reading the whole cache as one Arrow table.
+
+    Usage: python -m benchmarks.bench_station_cache --dir . --workers 1 4
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', type=str, default='.', help='folder containing wx_data')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help='worker process counts to benchmark')
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'no cache s':>11} {'cold s':>8} {'warm s':>8} {'rows':>9}")
+    for workers in args.workers:
+        cache_dir = tempfile.mkdtemp(prefix='station_cache_')
+        try:
+            uncached, rows = timed_prepare(args.dir, workers, None)
+            cold, _ = timed_prepare(args.dir, workers, cache_dir)
+            warm, _ = timed_prepare(args.dir, workers, cache_dir)
+            print(f"{workers:>7} {uncached:>11.2f} {cold:>8.2f} {warm:>8.2f} {rows:>9}")
+        finally:
+            shutil.rmtree(cache_dir)
+
+    cache_dir = tempfile.mkdtemp(prefix='station_cache_')
+    try:
+        prep = PrepareData(args.dir, 1, cache_dir)
+        prep.prepare_weather_data()
+        start = time.perf_counter()
+        table = prep.read_weather_cache()
+        print(f"read_weather_cache: {table.num_rows} rows, {table.nbytes / 1024 / 1024:.1f} MB mapped in {time.perf_counter() - start:.3f} s")
+    finally:
+        shutil.rmtree(cache_dir)
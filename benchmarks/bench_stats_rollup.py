@@ -0,0 +1,63 @@
+# Import in-built libraries
+import time
+# Import argument parser library
+import argparse
+# Import python library for postgres sql
+import psycopg2
+
+# Import the stats query builder and the database parameters
+from src.api_queries import build_weather_stats_query, stats_source
+from src.utils import db_params, logging
+
+
+# (name, start_date, end_date, station_ids, granularity) of typical stats requests
+STATS_REQUESTS = [
+    ('station years', '1994-01-01', '1998-12-31', ['USC00110072', 'USC00110187'], 'year'),
+    ('station months', '1994-01-01', '1994-12-31', ['USC00110072'], 'month'),
+    ('all stations years', '1985-01-01', '2014-12-31', ['all'], 'year'),
+    ('all stations months', '1985-01-01', '2014-12-31', ['all'], 'month'),
+    ('all stations season', '1994-06-01', '1994-08-31', ['all'], 'year'),
+]
+
+
+def measure(cur, query, params, repeat):
+    # Best of repeat runs, after one warm up run that also loads the pages into the buffer cache
+    cur.execute(query, params)
+    cur.fetchall()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(query, params)
+        cur.fetchall()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    '''
+    Compares the latency of /api/weather/stats queries answered without the weather_rollup cube (weather_data_transformed or
+    weather_data) and from the coarsest rollup grain covering them. Create the cube first:
+        python .\\data_model.py --create_weather_rollup_tbl "1"
+
+    Usage: python -m benchmarks.bench_stats_rollup --repeat 10
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(host=db_params['hostname'], port=db_params['port'], database=db_params['dbname'],
+                            user=db_params['username'], password=db_params['password'])
+    cur = conn.cursor()
+
+    print(f"{'request':>20} {'source':>11} {'ms':>9} {'rollup':>7} {'ms':>9}")
+    for name, start_date, end_date, station_ids, granularity in STATS_REQUESTS:
+        timings = {}
+        for rollup in (False, True):
+            query, params = build_weather_stats_query(start_date, end_date, station_ids, granularity, rollup)
+            timings[rollup] = (stats_source(start_date, end_date, station_ids, granularity, rollup),
+                               measure(cur, query, params, args.repeat))
+        (base_source, base), (rollup_source, rolled) = timings[False], timings[True]
+        print(f"{name:>20} {base_source:>11} {base * 1000:>9.2f} {rollup_source:>7} {rolled * 1000:>9.2f}")
+        logging.info(f"Stats rollup benchmark: {name} {base_source}={base * 1000:.2f}ms {rollup_source}={rolled * 1000:.2f}ms")
+
+    conn.close()
@@ -0,0 +1,123 @@
+# Import in-built libraries
+import os, time
+# Import argument parser library
+import argparse
+
+# Import the storage backends, the API query builders and the cached PrepareData of the load mode benchmark
+from benchmarks.bench_load_modes import LimitedPrepareData
+from src.database_operations import DBOperations
+from src.db_pool import ConnectionPool
+from src.duckdb_operations import DuckDBOperations, EmbeddedConnectionPool
+from src.api_queries import (build_weather_page_query, build_weather_keyset_query, build_weather_stats_query, build_weather_batch_query,
+                             BATCH_DEFAULT_COLUMNS)
+from src.utils import db_params, logging
+
+
+def api_queries(station_ids):
+    """
+    Returns (name, query, params) of typical API requests: a weather page, a keyset page, stats answered from weather_data and
+    from weather_data_transformed, and a batch export.
+    """
+    station_id = station_ids[0]
+    return [
+        ('weather page', *build_weather_page_query('1994-01-01', '1998-12-31', station_id, 3, 100)),
+        ('weather keyset', *build_weather_keyset_query('1994-01-01', '1998-12-31', station_id, 100, '')),
+        ('stats all months', *build_weather_stats_query('1994-01-01', '1994-12-31', ['all'], 'month')),
+        ('stats transformed', *build_weather_stats_query('1985-01-01', '2014-12-31', station_ids[:10], 'year')),
+        ('batch 50 stations', *build_weather_batch_query('1994-01-01', '1994-12-31', station_ids[:50], BATCH_DEFAULT_COLUMNS)),
+    ]
+
+
+def time_queries(pool, queries, repeat):
+    # Best of repeat runs after one warm up run
+    conn = pool.getconn()
+    try:
+        cur = conn.cursor()
+        timings = {}
+        for name, query, params in queries:
+            cur.execute(query, params)
+            cur.fetchall()
+            runs = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                cur.execute(query, params)
+                cur.fetchall()
+                runs.append(time.perf_counter() - start)
+            timings[name] = min(runs)
+        return timings
+    finally:
+        pool.putconn(conn)
+
+
+def load(db_operations, prep_data):
+    # The station files are parsed once by LimitedPrepareData, so only the database side of the ingestion is compared
+    start = time.perf_counter()
+    db_operations.insert_data_into_table(prep_data, 'weather_data', 'copy')
+    ingest = time.perf_counter() - start
+    start = time.perf_counter()
+    db_operations.insert_data_into_table(None, 'weather_data_transformed')
+    return {'ingest': ingest, 'transform': time.perf_counter() - start}
+
+
+def run_postgres(prep_data, dbname, queries, repeat):
+    bench_params = dict(db_params, dbname=dbname)
+    db_operations = DBOperations(bench_params)
+    db_operations.create_weather_data_table()
+    db_operations.create_weather_data_transformed_table()
+    db_operations.cursor.execute("TRUNCATE weather_data, weather_data_transformed, weather_data_transform_queue;")
+    db_operations.conn.commit()
+    timings = load(db_operations, prep_data)
+    db_operations.conn.close()
+    pool = ConnectionPool(bench_params)
+    timings.update(time_queries(pool, queries, repeat))
+    pool.closeall()
+    return timings
+
+
+def run_duckdb(prep_data, path, queries, repeat):
+    if os.path.exists(path):
+        os.remove(path)
+    db_operations = DuckDBOperations({'path': path})
+    db_operations.create_weather_data_table()
+    db_operations.create_weather_data_transformed_table()
+    timings = load(db_operations, prep_data)
+    db_operations.conn.close()
+    pool = EmbeddedConnectionPool(path)
+    timings.update(time_queries(pool, queries, repeat))
+    pool.closeall()
+    return timings
+
+
+if __name__ == "__main__":
+    '''
+    Runs the same ingest (COPY load of the prepared weather data), transform (yearly weather_data_transformed build) and API
+    query workload on the postgres and on the embedded duckdb storage backend. The weather tables of --dbname are truncated
+    and the --duckdb_path file is recreated, so point both at scratch locations.
+
+    Usage: python -m benchmarks.bench_storage_backends --dbname weather_bench --dir . --duckdb_path bench.duckdb
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dbname', type=str, required=True, help='scratch Postgres database whose weather tables are truncated')
+    parser.add_argument('--duckdb_path', type=str, default='bench.duckdb', help='scratch DuckDB file, recreated by the benchmark')
+    parser.add_argument('--dir', type=str, default='.', help='folder containing wx_data and yld_data')
+    parser.add_argument('--limit', type=int, default=None, help='only load the first n weather records (default: all)')
+    parser.add_argument('--backends', type=str, nargs='+', default=['postgres', 'duckdb'], choices=['postgres', 'duckdb'])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    prep_data = LimitedPrepareData(args.dir, args.limit)
+    weather_df = prep_data.prepare_weather_data()
+    queries = api_queries(sorted(weather_df['station_id'].unique()))
+    print(f"{len(weather_df)} weather records, {len(queries)} API queries (best of {args.repeat})")
+
+    results = {}
+    for backend in args.backends:
+        if backend == 'postgres':
+            results[backend] = run_postgres(prep_data, args.dbname, queries, args.repeat)
+        else:
+            results[backend] = run_duckdb(prep_data, args.duckdb_path, queries, args.repeat)
+
+    print(f"{'stage':>18}" + ''.join(f"{backend + ' ms':>14}" for backend in results))
+    for stage in results[args.backends[0]]:
+        print(f"{stage:>18}" + ''.join(f"{timings[stage] * 1000:>14.1f}" for timings in results.values()))
+        logging.info(f"Storage backend benchmark: {stage} " + ' '.join(f"{backend}={timings[stage] * 1000:.1f}ms" for backend, timings in results.items()))
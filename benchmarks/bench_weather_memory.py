@@ -0,0 +1,41 @@
+# Import in-built libraries
+import time, multiprocessing
+# Import argument parser library
+import argparse
+# Import process pool to measure every layout in a fresh process
+from concurrent.futures import ProcessPoolExecutor
+
+# Import the data preparation class and the memory helper
+from src.data_preparation import PrepareData
+from src.utils import peak_rss_mb
+
+
+def measure_layout(cwd, compact):
+    """
+    Prepares the weather data in one layout and returns its preparation time, per column deep memory usage in MB and the
+    peak RSS of the process.
+    """
+    start = time.perf_counter()
+    df = PrepareData(cwd, compact=compact).prepare_weather_data()
+    elapsed = time.perf_counter() - start
+    usage = (df.memory_usage(deep=True, index=False) / 1024 / 1024).round(1).to_dict()
+    return elapsed, usage, peak_rss_mb()
+
+
+if __name__ == "__main__":
+    '''
+    Reports the memory footprint of the prepared weather dataframe in the full layout (float64 measures, date objects,
+    station_id and wid strings) and in the compact layout (datetime64 dates, float32 measures, categorical station_id,
+    no wid). Each layout is prepared in a fresh process so the peak RSS figures do not interfere.
+
+    Usage: python -m benchmarks.bench_weather_memory --dir .
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', type=str, default='.', help='folder containing wx_data')
+    args = parser.parse_args()
+
+    for name, compact in (('full', False), ('compact', True)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            elapsed, usage, peak = executor.submit(measure_layout, args.dir, compact).result()
+        print(f"{name:>7}: {sum(usage.values()):8.1f} MB dataframe, {peak} MB peak RSS, prepared in {elapsed:.2f} s")
+        print("         " + ", ".join(f"{column} {mb} MB" for column, mb in usage.items()))
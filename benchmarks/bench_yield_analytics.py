@@ -0,0 +1,67 @@
+# Import in-built libraries
+import time
+# Import argument parser library
+import argparse
+# Import data manipulation libraries
+import numpy as np
+# Import python library for postgres sql
+import psycopg2
+
+# Import the analytics engine and the database parameters
+from src.analytics import WeatherCube, CROP_YIELD_QUERY, ALL_SEASONS, FEATURES, yield_series, yield_correlations
+from src.utils import db_params, logging
+
+
+def loop_correlations(cube, yields, seasons, by_station):
+    """
+    Reference implementation fitting one (station, season, feature) at a time with np.corrcoef, as a Python loop would.
+    """
+    stations = [[index] for index in range(len(cube.station_ids))] if by_station else [None]
+    results = []
+    for station in stations:
+        station_ids = None if station is None else cube.station_ids[station]
+        for season in seasons:
+            features = cube.season_features([season], station_ids)[0]
+            for index in range(len(FEATURES)):
+                valid = ~np.isnan(features[index]) & ~np.isnan(yields)
+                if valid.sum() >= 10:
+                    results.append(np.corrcoef(features[index][valid], yields[valid])[0, 1])
+    return results
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    '''
+    Times loading the monthly weather cube from weather_rollup and from weather_data, and sweeping every season window,
+    pooled and per station, with the vectorized engine and with a per fit loop.
+
+    Usage: python -m benchmarks.bench_yield_analytics
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--skip_raw', action='store_true', help='do not time loading the cube from weather_data')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(host=db_params['hostname'], port=db_params['port'], database=db_params['dbname'],
+                            user=db_params['username'], password=db_params['password'])
+    cur = conn.cursor()
+
+    load_rollup, cube = timed(WeatherCube.fetch, cur, True)
+    print(f"cube from weather_rollup: {load_rollup:.2f} s ({len(cube.station_ids)} stations x {len(cube.years)} years)")
+    if not args.skip_raw:
+        load_raw, _ = timed(WeatherCube.fetch, cur, False)
+        print(f"cube from weather_data:   {load_raw:.2f} s")
+    cur.execute(CROP_YIELD_QUERY)
+    yields = yield_series(cur.fetchall(), cube.years)
+
+    for name, by_station in (('pooled', False), ('by station', True)):
+        vectorized, records = timed(yield_correlations, cube, yields, ALL_SEASONS, None, by_station)
+        looped, _ = timed(loop_correlations, cube, yields, ALL_SEASONS, by_station)
+        print(f"{name:>10} sweep of {len(ALL_SEASONS)} windows: {len(records)} fits, vectorized {vectorized * 1000:.1f} ms, loop {looped * 1000:.1f} ms")
+        logging.info(f"Yield analytics benchmark: {name} vectorized={vectorized * 1000:.1f}ms loop={looped * 1000:.1f}ms")
+
+    conn.close()
@@ -0,0 +1,115 @@
+# Import in-built libraries
+import os
+# Import argument parser library
+import argparse
+# Import data manipulation libraries
+import numpy as np
+
+from src.utils import logging
+
+
+# Value of a measure that was not recorded in the raw station files
+SENTINEL = -9999
+# First year of the generated records, as in the bundled wx_data files
+START_YEAR = 1985
+# Name of the generated crop yield file, as in the bundled yld_data folder
+CROP_FILE = 'US_corn_grain_yield.txt'
+
+
+def station_ids(stations):
+    """
+    Returns the ids of the synthetic stations, 11 characters long like the bundled ones, e.g. SYN00000001.
+    """
+    return [f"SYN{index:08d}" for index in range(1, stations + 1)]
+
+
+def generate_station(rng, years, sentinel_rate):
+    """
+    Generates the daily records of one station in the raw wx_data layout.
+
+    Parameters
+    ----------
+    rng (numpy.random.Generator): Random generator of the run.
+    years (int): Number of years covered from START_YEAR on.
+    sentinel_rate (float): Share of the measures replaced by SENTINEL.
+
+    Returns
+    -------
+    numpy.ndarray ->  int64 array of shape (days, 4): date as YYYYMMDD, max and min temperature in tenths of a degree celsius
+                      and precipitation in tenths of a millimeter.
+    """
+    dates = np.arange(np.datetime64(f'{START_YEAR}-01-01'), np.datetime64(f'{START_YEAR + years}-01-01'))
+    months = dates.astype('datetime64[M]')
+    day_of_year = (dates - dates.astype('datetime64[Y]')).astype(np.int64)
+    records = np.empty((len(dates), 4), dtype=np.int64)
+    records[:, 0] = ((dates.astype('datetime64[Y]').astype(np.int64) + 1970) * 10000
+                     + (months.astype(np.int64) % 12 + 1) * 100 + (dates - months).astype(np.int64) + 1)
+    # Seasonal temperature cycle with a station specific offset and daily noise
+    seasonal = rng.normal(100, 30) - np.cos(2 * np.pi * day_of_year / 365.25) * 140
+    records[:, 1] = np.round(seasonal + 60 + rng.normal(0, 40, len(dates)))
+    records[:, 2] = records[:, 1] - np.round(np.abs(rng.normal(110, 30, len(dates))))
+    # Dry on most days, exponentially distributed amounts otherwise
+    records[:, 3] = np.where(rng.random(len(dates)) < 0.3, np.round(rng.exponential(60, len(dates))), 0)
+    records[:, 1:][rng.random((len(dates), 3)) < sentinel_rate] = SENTINEL
+    return records
+
+
+def generate_dataset(directory, stations, years, sentinel_rate=0.01, seed=0):
+    """
+    Writes a synthetic dataset in the layout PrepareData reads: directory/wx_data with one tab separated file per station and
+    directory/yld_data with one crop yield per year. The same arguments always produce the same files.
+
+    Parameters
+    ----------
+    directory (str): Folder to create wx_data and yld_data in. Synthetic station files of earlier runs are removed.
+    stations (int): Number of station files.
+    years (int): Number of years covered by every station, from START_YEAR on.
+    sentinel_rate (float): Share of the measures recorded as missing (-9999).
+    seed (int): Seed of the random generator.
+
+    Returns
+    -------
+    dict ->  The arguments of the run together with the number of records and bytes written.
+    """
+    rng = np.random.default_rng(seed)
+    weather_path = os.path.join(directory, 'wx_data')
+    crop_path = os.path.join(directory, 'yld_data')
+    os.makedirs(weather_path, exist_ok=True)
+    os.makedirs(crop_path, exist_ok=True)
+    # Drop the station files of an earlier, larger run so they are not parsed along with this one
+    for name in os.listdir(weather_path):
+        if name.startswith('SYN') and name.endswith('.txt'):
+            os.remove(os.path.join(weather_path, name))
+
+    records = size = 0
+    for station_id in station_ids(stations):
+        path = os.path.join(weather_path, f'{station_id}.txt')
+        station = generate_station(rng, years, sentinel_rate)
+        np.savetxt(path, station, fmt=['%d', '%5d', '%5d', '%5d'], delimiter='\t')
+        records += len(station)
+        size += os.path.getsize(path)
+
+    yields = np.round(rng.normal(250000, 40000, years)).astype(np.int64)
+    np.savetxt(os.path.join(crop_path, CROP_FILE), np.column_stack([np.arange(START_YEAR, START_YEAR + years), yields]),
+               fmt='%d', delimiter='\t')
+    logging.info(f"Synthetic dataset written to {directory}: {stations} stations x {years} years, {records} records")
+    return {'stations': stations, 'years': years, 'sentinel_rate': sentinel_rate, 'seed': seed, 'records': records, 'bytes': size}
+
+
+if __name__ == "__main__":
+    '''
+    Generates a synthetic dataset of station files in the wx_data format, and the matching yld_data file, to benchmark the
+    pipeline at any scale.
+
+    Usage: python -m benchmarks.synthetic_data --dir synthetic --stations 200 --years 30 --sentinel_rate 0.01
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', type=str, required=True, help='folder to write wx_data and yld_data into')
+    parser.add_argument('--stations', type=int, default=50)
+    parser.add_argument('--years', type=int, default=30)
+    parser.add_argument('--sentinel_rate', type=float, default=0.01, help='share of measures recorded as missing (-9999)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    summary = generate_dataset(args.dir, args.stations, args.years, args.sentinel_rate, args.seed)
+    print(f"{summary['records']} records in {summary['stations']} station files ({summary['bytes'] / 1e6:.1f} MB) written to {args.dir}")
@@ -3,20 +3,13 @@
 import os, sys  
 # Import argument parser library
 import argparse 
-# Import python library for postgres sql
-import psycopg2
-# Import data manipulation libraries
-import pandas as pd
-import numpy as np
 
-# Import python classes from python modules present in src directory
-from src.database_operations import DBOperations
-from src.data_preparation import PrepareData
-from src.utils import db_params, logging, CustomException
-
-
-# Instantiate DBOperations class
-db_operations = DBOperations(db_params)  
+# Import python classes from python modules present in src directory. The storage backends and PrepareData (pandas, numpy,
+# psycopg2, duckdb) are loaded when first used, so --help and argument errors return without importing them or connecting
+from src.storage import create_db_operations, storage_backend
+from src.utils import logging, CustomException
+from src.profiling import profiler, CAPTURE_MODES
+from src.pipeline import build_etl_pipeline, CHECKPOINT_FILES, PIPELINE_WORKERS
 
 
 
@@ -29,48 +22,91 @@ if __name__ == "__main__":
     parser.add_argument('--create_crop_yield_tbl', type=str, required=False, help='Create crop_yield_data table under the created database in Postgres SQL')
     parser.add_argument('--create_weather_data_transformed_tbl', type=str, required=False, help='Create weather_data_transformed table under created database in Postgres SQL')
 
+    parser.add_argument('--create_weather_rollup_tbl', type=str, required=False, help='Create and build the weather_rollup table of monthly and yearly aggregates per station and for all stations')
+
+    parser.add_argument('--partition_by', type=str, default=None, choices=['year', 'decade'], help='with --create_weather_data_tbl, create weather_data range partitioned on date by year or decade')
+    parser.add_argument('--hash_partitions', type=int, default=0, help='with --partition_by, split every date partition into this many hash partitions on station_id')
+    parser.add_argument('--clean_weather_data_tbl', type=str, required=False, help='Set missing and out of range measures already stored in weather_data to NULL and delete empty records')
     parser.add_argument('--insert_data_tbl', type=str, help='Inserts data into Postgres SQL tables')
     parser.add_argument('--dir', type=str, help='provide the folder where the data files are stored')
     parser.add_argument('--src_tbl_name', type=str, help='pass the raw data table name on which fetch and transformation operations are to be performed')
     parser.add_argument('--tbl_name', type=str, help='pass the table name')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes used to parse the weather station files')
+    parser.add_argument('--cache_dir', type=str, default=None, help='folder of the columnar station cache reused across runs (requires pyarrow)')
+    parser.add_argument('--compact', action='store_true', help='prepare weather data in the compact typed layout (float32 measures, categorical station ids, no wid column) to cut memory')
+    parser.add_argument('--load_mode', type=str, default='rows', choices=['rows', 'copy'], help='rows -> check and insert row by row, copy -> bulk load through COPY into a staging table')
 
-    args = parser.parse_args() # Create an object to accept input parameters to command line scripts
-
-
-    # Create weather data table
-    if args.create_weather_data_tbl:
-        db_operations.create_weather_data_table()
-
-    # Create crop yield data table
-    if args.create_crop_yield_tbl:
-        db_operations.create_crop_yield_table()
-    
-    # Create weather data transformed table
-    if args.create_weather_data_transformed_tbl:
-        db_operations.create_weather_data_transformed_table()
-
+    parser.add_argument('--incremental', action='store_true', help='only load weather station files that are new or changed since the last run, tracked in the ingestion_manifest table')
+    parser.add_argument('--stream', action='store_true', help='stream the weather data into the table in batches instead of preparing it all in memory first')
+    parser.add_argument('--batch_size', type=int, default=None, help='records per streamed batch (default: one batch per station file)')
+    parser.add_argument('--max_memory_mb', type=float, default=None, help='memory ceiling in MB for prepared batches waiting to be written when streaming')
 
-    # Insert data into weather_data and crop_yield_data tables
-    if args.insert_data_tbl:
-        if args.dir:
-            prep_data = PrepareData(args.dir)
-            db_operations.insert_data_into_table(prep_data, args.tbl_name)
+    parser.add_argument('--pipeline', action='store_true', help='run the whole ETL from --dir as a DAG: create the tables, load weather_data and crop_yield_data concurrently, then refresh weather_data_transformed. Run it again to resume an interrupted run')
+    parser.add_argument('--checkpoint_files', type=int, default=CHECKPOINT_FILES, help='with --pipeline, station files committed per checkpoint of the weather_data load')
+    parser.add_argument('--pipeline_workers', type=int, default=PIPELINE_WORKERS, help='with --pipeline, steps running at the same time, each on its own database connection')
 
-    # Insert data into weather_data_transformed table by checking if weather_data table is populated with data or not
-    if args.insert_data_tbl and args.tbl_name == 'weather_data_transformed':
-        try:
-            if db_operations.fetch_data_table(args.src_tbl_name):
-                db_operations.insert_data_into_table(None, args.tbl_name)
-        except Exception as e:
-            raise CustomException(e, sys)
+    parser.add_argument('--profile', type=str, default=None, choices=list(CAPTURE_MODES), help='also profile the run with cProfile or the stack sampler, the top functions are added to the JSON report written next to the log file')
 
-
-
-    
-
-    
-
-        
-
-
-    
+    args = parser.parse_args() # Create an object to accept input parameters to command line scripts
+    if args.pipeline and (not args.dir or args.insert_data_tbl or args.clean_weather_data_tbl or args.create_weather_data_tbl or
+                          args.create_crop_yield_tbl or args.create_weather_data_transformed_tbl or args.create_weather_rollup_tbl):
+        parser.error('--pipeline requires --dir and runs every step itself, it cannot be combined with the --create_*, --clean_* and --insert_data_tbl arguments')
+
+
+    # Stage timers and counters of the run are written as a JSON report next to the log file, also when the run fails
+    try:
+        with profiler.capture(args.profile):
+            # Run the whole ETL as a DAG of steps, each on a connection of its own
+            if args.pipeline:
+                from src.data_preparation import PrepareData
+                pipeline = build_etl_pipeline(create_db_operations, lambda: PrepareData(args.dir, args.workers, args.cache_dir, args.compact),
+                                              args.load_mode, args.checkpoint_files, args.partition_by, args.hash_partitions,
+                                              # DuckDB allows one writing transaction at a time, so its steps run one after the other
+                                              args.pipeline_workers if storage_backend() == 'postgres' else 1)
+                pipeline.run()
+            else:
+                # Instantiate DBOperations class of the storage backend selected in config.ini
+                db_operations = create_db_operations()
+
+            # Create weather data table
+            if args.create_weather_data_tbl:
+                db_operations.create_weather_data_table(args.partition_by, args.hash_partitions)
+
+            # Create crop yield data table
+            if args.create_crop_yield_tbl:
+                db_operations.create_crop_yield_table()
+
+            # Create weather data transformed table
+            if args.create_weather_data_transformed_tbl:
+                db_operations.create_weather_data_transformed_table()
+
+            # Create weather rollup table, built from the weather data already loaded and maintained by every later load
+            if args.create_weather_rollup_tbl:
+                db_operations.create_weather_rollup_table()
+
+            # Clean weather data table loaded before the validation stage existed
+            if args.clean_weather_data_tbl:
+                db_operations.clean_weather_data_table()
+
+
+            # Insert data into weather_data and crop_yield_data tables
+            if args.insert_data_tbl:
+                if args.dir:
+                    from src.data_preparation import PrepareData
+                    prep_data = PrepareData(args.dir, args.workers, args.cache_dir, args.compact)
+                    if args.incremental and args.tbl_name == 'weather_data':
+                        db_operations.ingest_weather_data_incremental(prep_data)
+                    elif args.stream and args.tbl_name == 'weather_data':
+                        db_operations.stream_data_into_table(prep_data, args.tbl_name, args.load_mode, args.batch_size, max_memory_mb=args.max_memory_mb)
+                    else:
+                        db_operations.insert_data_into_table(prep_data, args.tbl_name, args.load_mode)
+
+            # Insert data into weather_data_transformed table by checking if weather_data table is populated with data or not
+            if args.insert_data_tbl and args.tbl_name == 'weather_data_transformed':
+                try:
+                    if db_operations.table_has_rows(args.src_tbl_name):
+                        db_operations.insert_data_into_table(None, args.tbl_name, args.load_mode)
+                except Exception as e:
+                    raise CustomException(e, sys)
+    finally:
+        profiler.write_report()
@@ -1,31 +1,31 @@
 # Import necessary libraries
-import os, sys, json
-import pandas as pd
+import os, sys, json, threading
 import numpy as np
 import psycopg2
+from itertools import chain
 
 # Import methods and flask related libraries
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, make_response, has_app_context
 from flask_swagger import swagger
 from flask_restful import Resource, Api
 from flask_swagger_ui import get_swaggerui_blueprint
 
-from src.utils import db_params, logging, CustomException
-from datetime import datetime
+from src.utils import cache_params, logging, CustomException
+from src.storage import create_connection_pool, DATABASE_ERRORS
+from src.cache import ResponseCache
+from src.point_index import WeatherPointIndex
+from src.analytics import (WeatherCube, MONTHLY_ROLLUP_QUERY, MONTHLY_WEATHER_QUERY, CROP_YIELD_QUERY, MIN_YEARS, parse_seasons,
+                           yield_series, analyze_yield)
+from src.api_queries import (STREAM_PAGE_SIZE, CURSOR_ITERSIZE, ROLLUP_AVAILABLE_QUERY, message, missing_params,
+                             parse_weather_params, parse_date, parse_int, parse_station_ids, build_weather_page_query,
+                             build_weather_keyset_query, build_weather_stats_query, build_weather_batch_query, parse_batch_params,
+                             encode_json_array, encode_ndjson, encode_keyset_page, encode_station_groups, split_station_ids,
+                             stream_records)
+from functools import wraps
 
 
-# Constants for page size and number
-PAGE_SIZE = 10
-PAGE_NUMBER = 1
-
-# Creating a postgres sql database connection string
-conn = psycopg2.connect(
-                host = db_params['hostname'], 
-                port= db_params['port'], 
-                database= db_params['dbname'], 
-                user= db_params['username'], 
-                password = db_params['password']
-            )
+# Creating a pool of database connections of the storage backend of config.ini, sized by its [db_pool] section on postgres
+db_pool = create_connection_pool()
 
 # Sets a flask application named app
 app = Flask(__name__)
@@ -33,6 +33,101 @@ app = Flask(__name__)
 api = Api(app)
 
 
+def get_conn():
+    """
+    Returns the database connection of the current request, borrowing one from the pool on first use.
+
+    Returns:
+        psycopg2.extensions.connection: A pooled connection, handed back to the pool on request teardown.
+    """
+    if 'db_conn' not in g:
+        g.db_conn = db_pool.getconn()
+    return g.db_conn
+
+
+@app.teardown_appcontext
+def release_conn(exception):
+    """
+    Returns the connection borrowed by the request to the pool, rolling back whatever the request left open.
+    """
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db_pool.putconn(conn)
+
+
+def fetch_data_version():
+    """
+    Reads the data version stamp that DBOperations bumps with every load, or 0 if nothing was loaded yet. A request already
+    holding a pooled connection reads it on that one: waiting on the pool for a second connection could deadlock once every
+    connection is held by such a request.
+    """
+    borrowed = not (has_app_context() and 'db_conn' in g)
+    conn = db_pool.getconn() if borrowed else g.db_conn
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT version FROM data_version WHERE id = 1")
+        row = cur.fetchone()
+        return row[0] if row else 0
+    except DATABASE_ERRORS:
+        # The request only reads, so its failed transaction can be rolled back
+        conn.rollback()
+        return 0
+    finally:
+        if borrowed:
+            db_pool.putconn(conn)
+
+
+# Cache of API responses, configured by the [cache] section of config.ini and invalidated by data version bumps
+response_cache = ResponseCache.from_config(cache_params, fetch_data_version)
+
+
+# Whether the weather_rollup cube exists, with the data version the answer was read at
+rollup_state = {'version': None, 'available': False}
+
+
+def rollup_available():
+    """
+    Returns whether the weather_rollup cube exists. The answer is reused until the data version changes, which creating the
+    cube bumps.
+    """
+    version = response_cache.current_version()
+    if rollup_state['version'] != version:
+        cur = get_conn().cursor()
+        cur.execute(ROLLUP_AVAILABLE_QUERY)
+        rollup_state.update(version=version, available=cur.fetchone()[0])
+    return rollup_state['available']
+
+
+def cached_response(view):
+    """
+    Decorator serving repeated requests of an endpoint from response_cache. Only successful responses are cached.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = response_cache.key(request.path, request.args.items(multi=True))
+        cached = response_cache.get(key)
+        if cached is not None:
+            mimetype, body = cached.split('\n', 1)
+            return Response(body, mimetype=mimetype)
+
+        response = make_response(view(*args, **kwargs))
+        # Large streamed exports are marked no-store, buffering them for the cache would defeat streaming
+        if response.status_code == 200 and not response.cache_control.no_store:
+            body = response.get_data(as_text=True)
+            response_cache.set(key, f"{response.mimetype}\n{body}")
+            return Response(body, mimetype=response.mimetype)
+        return response
+    return wrapper
+
+
+@app.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """
+    API endpoint returning the hit, miss and eviction counters of the response cache.
+    """
+    return jsonify(response_cache.stats())
+
+
 # Configure Swagger UI documentation for a Flask RESTful
 SWAGGER_URL = '/swagger'
 API_URL = 'http://127.0.0.1:5000/swagger.json'
@@ -74,34 +169,57 @@ def get_weather_data(start_date, end_date , station_id, page_number, page_size):
     Returns:
         str: The weather data in JSON format.
     """
-    cur = conn.cursor()
+    cur = get_conn().cursor()
     # build SQL query based on query parameters
-    query = "SELECT * FROM weather_data WHERE 1=1"
-    if start_date:
-        query += f" AND date >= '{start_date}'"
-    if end_date:
-        query += f" AND date <= '{end_date}'"
-    if station_id:
-        query += f" AND station_id = '{station_id}'"
-    query += f" LIMIT {page_size} OFFSET {page_number}"    # LIMIT-> page size and OFFSET -> page number
-
-
-    # execute SQL query and fetch results
-    cur.execute(query)
-    results = cur.fetchall()
-    # Store the results obtained from the weather_data table based on the user query into a pandas dataframe
-    df = pd.DataFrame(results, columns=[desc[0] for desc in cur.description])
-    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-    # Convert the dataframe into json format
-    res = df.to_json(orient='records')
+    query, params = build_weather_page_query(start_date, end_date, station_id, page_number, page_size)
+
+    # execute SQL query and encode the rows straight into JSON
+    cur.execute(query, params)
+    return ''.join(encode_json_array(cur.fetchall()))
+
 
-    return res
+
+def iter_weather_rows(query, params):
+    """
+    Yields the result rows of a query from a server-side cursor, fetching CURSOR_ITERSIZE rows per round trip. The generator
+    borrows its own pooled connection, as it outlives the request context while the response is streamed, and returns it
+    when the result is exhausted or the client disconnects.
+    """
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor(name='weather_rows') as cur:
+            cur.itersize = CURSOR_ITERSIZE
+            cur.execute(query, params)
+            for row in cur:
+                yield row
+    finally:
+        db_pool.putconn(conn)
+
+
+
+def get_weather_data_keyset(start_date, end_date, station_id, page_size, cursor):
+    """
+    Retrieves one page of weather data using keyset pagination, see build_weather_keyset_query.
+
+    Args:
+        start_date (str): The start date of the period for which to retrieve weather data.
+        end_date (str): The end date of the period for which to retrieve weather data.
+        station_id (str): The ID of the weather station from which to retrieve data.
+        page_size (int): The number of results to retrieve per page.
+        cursor (str): The next_cursor of the previous page, or an empty string for the first page.
+
+    Returns:
+        tuple: The weather data of the page in JSON format and the cursor of the next page (None on the last page).
+    """
+    cur = get_conn().cursor()
+    cur.execute(*build_weather_keyset_query(start_date, end_date, station_id, page_size, cursor))
+    return encode_keyset_page(cur.fetchall(), page_size)
 
 
 
 # first api endpoint with GET method /api/weather
 @app.route("/api/weather", methods=["GET"])
+@cached_response
 def get_weather_data_api_handle():
     """
     API endpoint for retrieving weather data using RESTful API handle.
@@ -109,92 +227,296 @@ def get_weather_data_api_handle():
     Returns:
         str: The weather data in JSON format.
     """
-    pageSize = PAGE_SIZE
-    pageNumber = PAGE_NUMBER
     # getting input query-params from API request
     args = request.args
     args = args.to_dict()
 
     # Checking if all required query params are passed 
-    if 'start_date' not in args or 'station_id' not in args or 'end_date' not in args:
-        response = {
-            'success': 'ok',
-            'message': 'Incomplete query params'
-        }
-        return  json.dumps(response, indent = 4)
-    
-    if 'page_size' in args:
-        pageSize = args.get('page_size')
-
-    if 'page_number' in args:
-        pageNumber = args.get('page_number')
-
-    start_date = args.get('start_date')
-    end_date = args.get('end_date')
-    station_id = args.get('station_id')
+    if missing_params(args):
+        return message('Incomplete query params')
+
+    # Validating the query params before they reach the database
+    try:
+        start_date, end_date, station_id, pageNumber, pageSize, cursor = parse_weather_params(args)
+    except ValueError as e:
+        return message(str(e))
+
+    # Keyset pagination: an (empty for the first page) cursor param switches to cursor based paging
+    if 'cursor' in args:
+        res, next_cursor = get_weather_data_keyset(start_date, end_date, station_id, pageSize, cursor)
+        if res == '[]':
+            return message('No records for this query')
+        return '{"records": %s, "next_cursor": %s}' % (res, json.dumps(next_cursor))
+
+    # Large pages and NDJSON exports are streamed from a server-side cursor instead of being built in memory
+    output_format = args.get('format', 'json')
+    if output_format == 'ndjson' or pageSize > STREAM_PAGE_SIZE:
+        rows = iter_weather_rows(*build_weather_page_query(start_date, end_date, station_id, pageNumber, pageSize))
+        first = next(rows, None)
+        if first is None:
+            return message('No records for this query')
+        if output_format == 'ndjson':
+            response = Response(encode_ndjson(chain([first], rows)), mimetype='application/x-ndjson')
+        else:
+            response = Response(encode_json_array(chain([first], rows)), mimetype='application/json')
+        response.cache_control.no_store = True
+        return response
 
     # Fetching the results from weather_data table by passing the input query params from this function
     res = get_weather_data(start_date, end_date, station_id, pageNumber, pageSize)
     
     # if no records found for the input query - params
-    if not res or not len(res):
-        response = {
-            'success': 'ok',
-            'message': 'No records for this query'
-        }
-        return  json.dumps(response, indent = 4)
+    if res == '[]':
+        return message('No records for this query')
     
     return res
 
     
+def get_station_ids(args):
+    """
+    Collects the requested station ids, accepting both repeated (station_id=A&station_id=B) and comma separated (station_id=A,B) forms.
+
+    Args:
+        args (werkzeug.datastructures.MultiDict): The query params of the API request.
+
+    Returns:
+        list: The requested station ids in request order, without duplicates.
+    """
+    return split_station_ids(args.getlist('station_id'))
+
+
+
+def get_weather_stats(start_date, end_date, station_ids, granularity='year'):
+    """
+    Computes the average max and min temperature and the total precipitation per station and year (or month) inside Postgres.
+    Requests are answered from the coarsest precomputed aggregates covering them (the weather_rollup cube, or the
+    weather_data_transformed table without it) and otherwise aggregated over the requested date range of weather_data.
+
+    Args:
+        start_date (str): The start date of the period, YYYY-MM-DD.
+        end_date (str): The end date of the period, YYYY-MM-DD.
+        station_ids (list): The IDs of the weather stations to aggregate.
+        granularity (str): 'year' or 'month'.
+
+    Returns:
+        tuple: The result column names and the list of result rows.
+    """
+    rollup = rollup_available()
+    cur = get_conn().cursor()
+    cur.execute(*build_weather_stats_query(start_date, end_date, station_ids, granularity, rollup))
+    columns = [desc[0] for desc in cur.description]
+    return columns, cur.fetchall()
+
+
+
 # endpoint for retrieving statistical computations on weather data
 @app.route("/api/weather/stats", methods=["GET"])
+@cached_response
 def get_weather_data_stats():
+    """
+    API endpoint for retrieving the yearly (or monthly) average max and min temperature and total precipitation of one or
+    more stations over a date range.
 
-    pageSize = PAGE_SIZE
-    pageNumber = PAGE_NUMBER
+    Returns:
+        Response: The statistics as a streamed JSON array of records.
+    """
     # getting input query - params from API request
     args = request.args
-    args = args.to_dict()
 
     # Checking if all required query params are passed
-    if 'start_date' not in args or 'station_id' not in args or 'end_date' not in args:
-        response = {
-            'success': 'ok',
-            'message': 'Incomplete query params'
-        }
-        return  json.dumps(response, indent = 4)
-
-    start_date = args.get('start_date')
-    end_date = args.get('end_date')
-    station_id = args.get('station_id')
-
-    # If pagination params are provided in API request
-    if 'page_size' in args:
-        pageSize = args.get('page_size')
-
-    if 'page_number' in args:
-        pageNumber = args.get('page_number')
-    
-    # Fetch the weather data records based on query-params
-    res = get_weather_data(start_date, end_date, station_id, pageNumber, pageSize)
+    if missing_params(args):
+        return message('Incomplete query params')
+
+    # Validating the query params before they reach the database
+    try:
+        start_date = parse_date(args.get('start_date'), 'start_date')
+        end_date = parse_date(args.get('end_date'), 'end_date')
+        station_ids = parse_station_ids(args.getlist('station_id'))
+    except ValueError as e:
+        return message(str(e))
+    granularity = args.get('granularity', 'year')
+    if granularity not in ('year', 'month'):
+        return message('granularity must be year or month')
+
+    # Aggregate the weather data records inside the database
+    columns, rows = get_weather_stats(start_date, end_date, station_ids, granularity)
 
     # If no response found
-    if not res or not len(res):
-        response = {
-            'success': 'ok',
-            'message': 'No records for this query'
-        }
-        return  json.dumps(response, indent = 4)
-    
-    # Read the JSON response into a pandas dataframe to compute the descriptive statistics on certain features of the weather data
-    df = pd.read_json(res)
-    df['date'] = pd.to_datetime(df['date'])
-    df['year'] = [x.year for x in df['date']]
-    stats = pd.DataFrame(df.groupby(['year','station_id']).agg({'max_temp':'mean', 'min_temp':'mean','precipitation_amt':'sum'}).reset_index())
-    stats = stats.to_dict()
-
-    return jsonify(stats)
+    if not rows:
+        return message('No records for this query')
+
+    return Response(stream_records(columns, rows), mimetype='application/json')
+
+
+
+# endpoint for retrieving the weather data of many stations with a single query
+@app.route("/api/weather/batch", methods=["GET"])
+@cached_response
+def get_weather_data_batch():
+    """
+    API endpoint for retrieving the weather data of a list of stations (or of all stations) over a date range with one
+    set-based query, instead of one /api/weather request per station. Only the requested columns are selected.
+
+    Returns:
+        Response: The records grouped by station, streamed one station group at a time as a JSON object keyed by station id,
+        or as one NDJSON line per station with format=ndjson.
+    """
+    # getting input query - params from API request
+    args = request.args
+
+    # Checking if all required query params are passed
+    if missing_params(args):
+        return message('Incomplete query params')
+
+    station_ids, columns, error = parse_batch_params(args.getlist('station_id'), args.getlist('columns'))
+    if error:
+        return message(error)
+    try:
+        start_date = parse_date(args.get('start_date'), 'start_date')
+        end_date = parse_date(args.get('end_date'), 'end_date')
+    except ValueError as e:
+        return message(str(e))
+
+    output_format = args.get('format', 'json')
+    rows = iter_weather_rows(*build_weather_batch_query(start_date, end_date, station_ids, columns))
+    first = next(rows, None)
+    if first is None:
+        return message('No records for this query')
+
+    mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+    response = Response(encode_station_groups(chain([first], rows), columns, output_format), mimetype=mimetype)
+    response.cache_control.no_store = True
+    return response
+
+
+
+# Monthly weather cube and yields of the analytics endpoint, with the data version they were loaded at
+analytics_state = {'version': None, 'cube': None, 'yields': None}
+
+
+def get_weather_cube():
+    """
+    Returns the monthly weather cube and the grain yield per cube year, reloaded only when the data version changes, so
+    sweeping season windows and stations is computed in memory.
+
+    Raises:
+        DATABASE_ERRORS: If weather_data (or weather_rollup) or crop_yield_data does not exist yet.
+    """
+    version = response_cache.current_version()
+    if analytics_state['version'] != version:
+        rollup = rollup_available()
+        cur = get_conn().cursor()
+        # Queried here rather than with WeatherCube.fetch, which wraps the database errors in a CustomException
+        cur.execute(MONTHLY_ROLLUP_QUERY if rollup else MONTHLY_WEATHER_QUERY)
+        cube = WeatherCube.from_rows(cur.fetchall())
+        cur.execute(CROP_YIELD_QUERY)
+        analytics_state.update(version=version, cube=cube, yields=yield_series(cur.fetchall(), cube.years))
+    return analytics_state['cube'], analytics_state['yields']
+
+
+
+# endpoint correlating growing season weather with the crop grain yield
+@app.route("/api/analytics/yield", methods=["GET"])
+@cached_response
+def get_yield_analytics():
+    """
+    API endpoint correlating per-year weather features of season windows (precipitation total, mean max and min temperature)
+    with the grain yield of crop_yield_data, with a least squares fit per feature.
+
+    Query params: season (start-end months, comma separated, or all; default 4-9), station_id (stations to pool, default every
+    station), by_station (true to correlate every station separately), top (number of records kept by absolute correlation)
+    and min_years (minimum number of years of a fit).
+
+    Returns:
+        Response: The correlation records and, for a single pooled season, the yearly features in JSON format.
+    """
+    args = request.args
+    try:
+        seasons = parse_seasons(args.get('season'))
+        top = parse_int(args['top'], 'top') if 'top' in args else None
+        min_years = parse_int(args['min_years'], 'min_years') if 'min_years' in args else MIN_YEARS
+    except ValueError as e:
+        return message(str(e))
+    station_ids = get_station_ids(args) or None
+    by_station = args.get('by_station', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        cube, yields = get_weather_cube()
+    except DATABASE_ERRORS:
+        # The weather or crop yield tables are not loaded yet
+        return message('No records for this query')
+    if not len(cube.years) or np.isnan(yields).all():
+        return message('No records for this query')
+    return Response(json.dumps(analyze_yield(cube, yields, seasons, station_ids, by_station, top, min_years)), mimetype='application/json')
+
+
+
+
+# In-memory point lookup index of weather_data, with the data version it was loaded at
+point_index_state = {'version': None, 'index': None}
+# Only one request rebuilds the index after a load, concurrent ones wait for it instead of rebuilding it too
+point_index_lock = threading.Lock()
+
+
+def get_point_index():
+    """
+    Returns the point lookup index of weather_data, rebuilt only when the data version changes, so station/day lookups are
+    answered from memory without a database round trip.
+    """
+    version = response_cache.current_version()
+    if point_index_state['version'] != version:
+        with point_index_lock:
+            if point_index_state['version'] != version:
+                point_index_state.update(version=version, index=WeatherPointIndex.fetch(get_conn().cursor()))
+    return point_index_state['index']
+
+
+
+# endpoint returning the record of one station on one day
+@app.route("/api/weather/point", methods=["GET"])
+def get_weather_point():
+    """
+    API endpoint returning the record of one station on one day from the in-memory point index, e.g.
+    /api/weather/point?station_id=USC00110072&date=1994-07-01. Measures are numbers, null when missing.
+
+    Returns:
+        Response: The record in JSON format.
+    """
+    args = request.args
+    if missing_params(args, ('station_id', 'date')):
+        return message('Incomplete query params')
+    index = get_point_index()
+    try:
+        record = index.lookup(args['station_id'], args['date'])
+    except ValueError as e:
+        return message(str(e))
+    if record is None:
+        return message('No records for this query')
+    return Response(json.dumps(record), mimetype='application/json')
+
+
+
+# endpoint returning the records of all stations on one date
+@app.route("/api/weather/day", methods=["GET"])
+def get_weather_day():
+    """
+    API endpoint returning the records of every station on one date from the in-memory point index, e.g.
+    /api/weather/day?date=1994-07-01. station_id optionally restricts the stations (comma separated or repeated).
+
+    Returns:
+        Response: The records ordered by station id in JSON format.
+    """
+    args = request.args
+    if missing_params(args, ('date',)):
+        return message('Incomplete query params')
+    index = get_point_index()
+    try:
+        records = index.day_slice(args['date'], get_station_ids(args) or None)
+    except ValueError as e:
+        return message(str(e))
+    if not records:
+        return message('No records for this query')
+    return Response(json.dumps(records), mimetype='application/json')
 
 
 
@@ -0,0 +1,267 @@
+# Import in-built libraries
+import sys
+# Import data manipulation libraries
+import numpy as np
+
+from src.utils import logging, CustomException
+
+
+# Weather features derived per year and season window, in the order of the last axis of WeatherCube arrays
+FEATURES = ('precipitation_amt', 'max_temp', 'min_temp')
+# Default growing season of corn, April to September (inclusive month numbers)
+DEFAULT_SEASON = (4, 9)
+# Fits over fewer years than this are left out of the correlation results
+MIN_YEARS = 10
+# Every season window (start_month, end_month) within a calendar year, swept by season=all
+ALL_SEASONS = [(start, end) for start in range(1, 13) for end in range(start, 13)]
+# Monthly sums and counts of valid values per station, from the weather_rollup cube or aggregated from weather_data
+MONTHLY_ROLLUP_QUERY = '''
+    SELECT station_id, EXTRACT(YEAR FROM period_start)::int, EXTRACT(MONTH FROM period_start)::int,
+           sum_precipitation_amt::float8, count_precipitation_amt, sum_max_temp::float8, count_max_temp,
+           sum_min_temp::float8, count_min_temp
+    FROM weather_rollup
+    WHERE grain = 'month' AND station_id <> 'all'
+    '''
+MONTHLY_WEATHER_QUERY = '''
+    SELECT station_id, EXTRACT(YEAR FROM date)::int, EXTRACT(MONTH FROM date)::int,
+           SUM(precipitation_amt)::float8, COUNT(precipitation_amt), SUM(max_temp)::float8, COUNT(max_temp),
+           SUM(min_temp)::float8, COUNT(min_temp)
+    FROM weather_data
+    GROUP BY 1, 2, 3
+    '''
+CROP_YIELD_QUERY = "SELECT year::int, crop_grain_yield::float8 FROM crop_yield_data ORDER BY year"
+
+
+def parse_seasons(value):
+    """
+    Parses the season query param: comma separated start-end month windows (e.g. "4-9,6-8"), or "all" for every window.
+
+    Args:
+        value (str): The season query param, None for DEFAULT_SEASON.
+
+    Returns:
+        list: The (start_month, end_month) windows.
+
+    Raises:
+        ValueError: If a window is malformed or does not satisfy 1 <= start <= end <= 12.
+    """
+    if not value:
+        return [DEFAULT_SEASON]
+    if value == 'all':
+        return list(ALL_SEASONS)
+    seasons = []
+    for window in value.split(','):
+        start, _, end = window.strip().partition('-')
+        start, end = int(start), int(end or start)
+        if not 1 <= start <= end <= 12:
+            raise ValueError(f"season windows must be start-end months with 1 <= start <= end <= 12, got {window}")
+        seasons.append((start, end))
+    return seasons
+
+
+def regress(x, y):
+    """
+    Pearson correlation and least squares fit y = slope * x + intercept along the last axis, for every leading index at once.
+    NaN marks a missing observation; each fit uses the years where both x and y are present.
+
+    Args:
+        x (numpy.ndarray): Feature values, shape (..., years).
+        y (numpy.ndarray): Target values, shape (years,).
+
+    Returns:
+        dict: Arrays of shape x.shape[:-1] for n, r, r2, slope, intercept and t (the t statistic of r with n - 2 degrees of freedom).
+    """
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    n = valid.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.where(valid, x, 0).sum(axis=-1) / n
+        mean_y = np.where(valid, y, 0).sum(axis=-1) / n
+        dx = np.where(valid, x - mean_x[..., None], 0)
+        dy = np.where(valid, y - mean_y[..., None], 0)
+        sxy, sxx, syy = (dx * dy).sum(axis=-1), (dx * dx).sum(axis=-1), (dy * dy).sum(axis=-1)
+        slope = sxy / sxx
+        r = sxy / np.sqrt(sxx * syy)
+        t = r * np.sqrt((n - 2) / (1 - r * r))
+    return {'n': n, 'r': r, 'r2': r * r, 'slope': slope, 'intercept': mean_y - slope * mean_x, 't': t}
+
+
+class WeatherCube:
+    """
+    Dense NumPy layout of monthly weather sums and counts, indexed [station, year, month, feature], from which the features of
+    any season window are computed with prefix sums over the month axis instead of new database queries.
+
+    Parameters:
+    ----------
+    station_ids (numpy.ndarray): Station ids of the first axis.
+    years (numpy.ndarray): Years of the second axis.
+    sums (numpy.ndarray): Monthly sums of valid values, shape (stations, years, 12, features).
+    counts (numpy.ndarray): Monthly counts of valid values, same shape.
+    """
+    def __init__(self, station_ids, years, sums, counts):
+        self.station_ids = station_ids
+        self.years = years
+        # Prefix sums with a leading zero month, so a window total is prefix[end] - prefix[start - 1]
+        zeros = np.zeros(sums.shape[:2] + (1, len(FEATURES)))
+        self.sum_prefix = np.concatenate([zeros, np.cumsum(sums, axis=2)], axis=2)
+        self.count_prefix = np.concatenate([zeros, np.cumsum(counts, axis=2)], axis=2)
+        # Days per (year, month), to turn mean daily precipitation into a seasonal total
+        months = (years[:, None] * 12 + np.arange(12) - 1970 * 12).astype('datetime64[M]')
+        days = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(int)
+        self.day_prefix = np.concatenate([np.zeros((len(years), 1), dtype=int), np.cumsum(days, axis=1)], axis=1)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds the cube from (station_id, year, month, sum, count, ...) rows in FEATURES order.
+        """
+        stations = np.array([row[0] for row in rows], dtype=object)
+        values = np.array([row[1:] for row in rows], dtype=float).reshape(-1, 2 + 2 * len(FEATURES))
+        station_ids, station_index = np.unique(stations, return_inverse=True)
+        years, year_index = np.unique(values[:, 0].astype(int), return_inverse=True)
+        sums = np.zeros((len(station_ids), len(years), 12, len(FEATURES)))
+        counts = np.zeros_like(sums)
+        month_index = values[:, 1].astype(int) - 1
+        sums[station_index, year_index, month_index] = np.nan_to_num(values[:, 2::2])
+        counts[station_index, year_index, month_index] = values[:, 3::2]
+        return cls(station_ids, years, sums, counts)
+
+    @classmethod
+    def fetch(cls, cursor, rollup=True):
+        """
+        Loads the cube from the monthly rows of weather_rollup, or aggregates weather_data when the cube does not exist.
+
+        Args:
+            cursor: A database cursor.
+            rollup (bool): Whether the weather_rollup cube exists.
+
+        Returns:
+            WeatherCube: The cube of every station and year in the database.
+        """
+        try:
+            cursor.execute(MONTHLY_ROLLUP_QUERY if rollup else MONTHLY_WEATHER_QUERY)
+            cube = cls.from_rows(cursor.fetchall())
+            logging.info(f"Weather cube loaded: {len(cube.station_ids)} stations x {len(cube.years)} years")
+            return cube
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def station_index(self, station_ids=None):
+        """
+        Returns the first axis positions of the requested stations (every station for None), ignoring unknown ids.
+        """
+        if station_ids is None:
+            return np.arange(len(self.station_ids))
+        return np.flatnonzero(np.isin(self.station_ids, station_ids))
+
+    def season_totals(self, seasons, stations):
+        """
+        Window sums and counts of the selected stations, shape (stations, years, windows, features), and window days, shape (years, windows).
+        """
+        starts = np.array([start for start, _ in seasons]) - 1
+        ends = np.array([end for _, end in seasons])
+        sums = self.sum_prefix[stations][:, :, ends] - self.sum_prefix[stations][:, :, starts]
+        counts = self.count_prefix[stations][:, :, ends] - self.count_prefix[stations][:, :, starts]
+        days = self.day_prefix[:, ends] - self.day_prefix[:, starts]
+        return sums, counts, days
+
+    def season_features(self, seasons, station_ids=None, by_station=False):
+        """
+        Computes the weather features of every year and season window: the mean daily max and min temperature, and the
+        precipitation total of the window, estimated as mean daily precipitation times the days of the window so missing days
+        do not bias it. Stations are pooled unless by_station is set.
+
+        Args:
+            seasons (list): The (start_month, end_month) windows.
+            station_ids (list): The stations to include, None for every station.
+            by_station (bool): Compute the features of every station separately.
+
+        Returns:
+            numpy.ndarray: Shape (windows, features, years), or (stations, windows, features, years) by station. NaN where a
+            year has no valid value.
+        """
+        sums, counts, days = self.season_totals(seasons, self.station_index(station_ids))
+        if not by_station:
+            sums, counts = sums.sum(axis=0), counts.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            features = np.where(counts > 0, sums / counts, np.nan)
+        features[..., FEATURES.index('precipitation_amt')] *= days
+        # (..., years, windows, features) -> (..., windows, features, years)
+        return np.moveaxis(features, -3, -1)
+
+
+def yield_series(rows, years):
+    """
+    Aligns (year, crop_grain_yield) rows with the years of a cube, NaN for years without a yield.
+    """
+    series = np.full(len(years), np.nan)
+    if rows:
+        yield_years, yields = np.array(rows, dtype=float).T
+        positions = np.searchsorted(years, yield_years.astype(int))
+        found = (positions < len(years)) & (years[np.minimum(positions, len(years) - 1)] == yield_years)
+        series[positions[found]] = yields[found]
+    return series
+
+
+def yield_correlations(cube, yields, seasons, station_ids=None, by_station=False, top=None, min_years=MIN_YEARS):
+    """
+    Correlates the season features of the cube with the grain yield of every year, for all season windows (and stations) in
+    one vectorized pass, see WeatherCube.season_features and regress.
+
+    Args:
+        cube (WeatherCube): The monthly weather cube.
+        yields (numpy.ndarray): Grain yield per cube year, see yield_series.
+        seasons (list): The (start_month, end_month) windows.
+        station_ids (list): The stations to include, None for every station.
+        by_station (bool): Correlate the features of every station separately instead of pooling the stations.
+        top (int): Keep only the top records by absolute correlation, None for all.
+        min_years (int): Leave out fits over fewer years with both a feature value and a yield.
+
+    Returns:
+        list: Records {season, station_id, feature, n, r, r2, slope, intercept, t}, by decreasing absolute correlation.
+    """
+    features = cube.season_features(seasons, station_ids, by_station)
+    fit = regress(features, yields)
+    stations = cube.station_ids[cube.station_index(station_ids)] if by_station else np.array(['all'], dtype=object)
+    # Flatten the (stations, windows, features) grid of fits into records ordered by |r|, leaving out fits on too few years
+    shape = (len(stations), len(seasons), len(FEATURES))
+    r = np.where(fit['n'] >= max(min_years, 3), fit['r'], np.nan).reshape(-1)
+    order = np.argsort(-np.nan_to_num(np.abs(r), nan=-1), kind='stable')
+    order = order[~np.isnan(r[order])][:top]
+    station, season, feature = np.unravel_index(order, shape)
+    # Plain Python lists make building many records far cheaper than indexing NumPy arrays element by element
+    columns = {name: np.round(values.reshape(-1)[order], 6).tolist() for name, values in fit.items() if name != 'n'}
+    seasons = ['%d-%d' % window for window in seasons]
+    return [{
+        'season': seasons[season_index],
+        'station_id': stations[station_index],
+        'feature': FEATURES[feature_index],
+        'n': n,
+        **{name: None if values[i] != values[i] else values[i] for name, values in columns.items()},
+    } for i, (station_index, season_index, feature_index, n) in enumerate(zip(station.tolist(), season.tolist(), feature.tolist(),
+                                                                            fit['n'].reshape(-1)[order].tolist()))]
+
+
+def season_feature_records(cube, yields, season, station_ids=None):
+    """
+    Returns the pooled features and the yield of every year for one season window, as records {year, yield, *FEATURES}.
+    """
+    features = cube.season_features([season], station_ids)[0]
+    return [{
+        'year': int(year),
+        'crop_grain_yield': None if np.isnan(yields[i]) else float(yields[i]),
+        **{name: None if np.isnan(features[j, i]) else round(float(features[j, i]), 4) for j, name in enumerate(FEATURES)},
+    } for i, year in enumerate(cube.years)]
+
+
+def analyze_yield(cube, yields, seasons, station_ids=None, by_station=False, top=None, min_years=MIN_YEARS):
+    """
+    Builds the body of the yield analytics endpoint: the correlation records and, for a single pooled season window, the
+    yearly features they were computed from.
+
+    Returns:
+        dict: {"correlations": [...]} plus {"features": [...]} for a single pooled season window.
+    """
+    body = {'correlations': yield_correlations(cube, yields, seasons, station_ids, by_station, top, min_years)}
+    if len(seasons) == 1 and not by_station:
+        body['features'] = season_feature_records(cube, yields, seasons[0], station_ids)
+    return body
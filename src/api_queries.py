@@ -0,0 +1,595 @@
+# Import in-built libraries
+import re, json, base64
+from json.encoder import encode_basestring
+from datetime import datetime, timedelta
+from itertools import islice
+
+# SQL builders and JSON encoders of the weather API, shared by the Flask application in main.py and the asyncio server in
+# async_main.py so both serve the same contract. Queries use %s placeholders, understood by psycopg2 and psycopg 3 alike.
+
+
+# Constants for page size and number
+PAGE_SIZE = 10
+PAGE_NUMBER = 1
+# Pages larger than this are streamed to the client in chunks from a server-side cursor
+STREAM_PAGE_SIZE = 1000
+# Rows fetched per round trip by the server-side cursor
+CURSOR_ITERSIZE = 2000
+# Columns of the weather endpoints; dates and NUMERIC values are rendered as text by Postgres, matching the JSON format of the API
+WEATHER_FIELDS = {
+    'date': "to_char(date, 'YYYY-MM-DD')",
+    'max_temp': 'max_temp::text',
+    'min_temp': 'min_temp::text',
+    'precipitation_amt': 'precipitation_amt::text',
+    'station_id': 'station_id',
+    'wid': 'wid',
+}
+WEATHER_COLUMNS = ', '.join(f'{expression} AS {name}' for name, expression in WEATHER_FIELDS.items())
+WEATHER_COLUMN_NAMES = list(WEATHER_FIELDS)
+# Station id of the figures of all stations together
+ALL_STATIONS = 'all'
+# Checks whether the weather_rollup cube of monthly and yearly aggregates was created
+ROLLUP_AVAILABLE_QUERY = "SELECT to_regclass('weather_rollup') IS NOT NULL"
+# Query params every weather endpoint requires
+REQUIRED_PARAMS = ('start_date', 'station_id', 'end_date')
+# Format of the date query params
+DATE_FORMAT = '%Y-%m-%d'
+# Station ids are the names of the station files: letters, digits, '_', '.' and '-'
+STATION_ID_PATTERN = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+# Bounds of the page params, keeping LIMIT and OFFSET well inside bigint
+MAX_PAGE_SIZE = 1000000
+MAX_PAGE_NUMBER = 1000000000
+# Columns the batch endpoint can project (station_id is the group key of its response) and its default projection
+BATCH_COLUMNS = [name for name in WEATHER_FIELDS if name != 'station_id']
+BATCH_DEFAULT_COLUMNS = ['date', 'max_temp', 'min_temp', 'precipitation_amt']
+
+
+def message(text):
+    """
+    Returns the JSON body the API answers with when there are no records to return, e.g. for incomplete query params.
+    """
+    response = {
+        'success': 'ok',
+        'message': text
+    }
+    return json.dumps(response, indent = 4)
+
+
+
+def missing_params(args, required=REQUIRED_PARAMS):
+    """
+    Lists the required query params absent from a request.
+
+    Args:
+        args (Mapping): The query params of the API request.
+        required (tuple): The names of the params the endpoint requires.
+
+    Returns:
+        list: The missing param names, empty when the request is complete.
+    """
+    return [param for param in required if param not in args]
+
+
+
+def parse_date(value, name='date', optional=False):
+    """
+    Validates a date query param.
+
+    Args:
+        value (str): The value of the param.
+        name (str): The name of the param, used in the error message.
+        optional (bool): Whether an empty value is accepted, meaning no bound.
+
+    Returns:
+        str: The date as YYYY-MM-DD, or None for an accepted empty value.
+
+    Raises:
+        ValueError: If the value is not a valid date.
+    """
+    if optional and not value:
+        return None
+    try:
+        return datetime.strptime(value, DATE_FORMAT).date().isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a YYYY-MM-DD date, got {value}")
+
+
+
+def parse_station_id(value, optional=False):
+    """
+    Validates a station id query param, see STATION_ID_PATTERN. An empty value is accepted as no filter when optional.
+
+    Raises:
+        ValueError: If the value is not a valid station id.
+    """
+    if optional and not value:
+        return None
+    if not isinstance(value, str) or not STATION_ID_PATTERN.fullmatch(value):
+        raise ValueError(f"station_id must be a station id, got {value}")
+    return value
+
+
+
+def parse_station_ids(values):
+    """
+    Collects and validates the requested station ids, see split_values and parse_station_id.
+
+    Raises:
+        ValueError: If a value is not a valid station id.
+    """
+    return [parse_station_id(station_id) for station_id in split_station_ids(values)]
+
+
+
+def parse_int(value, name, minimum=1, maximum=None):
+    """
+    Validates an integer query param within [minimum, maximum].
+
+    Raises:
+        ValueError: If the value is not an integer within the bounds.
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer, got {value}")
+    if number < minimum or (maximum is not None and number > maximum):
+        raise ValueError(f"{name} must be between {minimum} and {maximum}, got {value}" if maximum is not None else
+                         f"{name} must be at least {minimum}, got {value}")
+    return number
+
+
+
+def parse_weather_params(args):
+    """
+    Validates and types the query params of the /api/weather endpoint before any query is run.
+
+    Args:
+        args (Mapping): The query params of the API request.
+
+    Returns:
+        tuple: start_date, end_date and station_id (None when empty, i.e. not filtered), page_number and page_size as ints,
+        and the pagination cursor (None without the cursor param, an empty string for the first keyset page).
+
+    Raises:
+        ValueError: If a param is invalid.
+    """
+    start_date = parse_date(args.get('start_date'), 'start_date', optional=True)
+    end_date = parse_date(args.get('end_date'), 'end_date', optional=True)
+    station_id = parse_station_id(args.get('station_id'), optional=True)
+    page_number = parse_int(args.get('page_number', PAGE_NUMBER), 'page_number', maximum=MAX_PAGE_NUMBER)
+    page_size = parse_int(args.get('page_size', PAGE_SIZE), 'page_size', maximum=MAX_PAGE_SIZE)
+    cursor = args.get('cursor')
+    if cursor:
+        decode_cursor(cursor)
+    return start_date, end_date, station_id, page_number, page_size, cursor
+
+
+
+def row_template(names):
+    """
+    Returns the JSON object template of one record with the given columns, filled with already escaped values by encode_row.
+    """
+    return '{' + ','.join(f'"{name}":%s' for name in names) + '}'
+
+
+# JSON object template of one weather record
+WEATHER_ROW_TEMPLATE = row_template(WEATHER_COLUMN_NAMES)
+
+
+
+def build_weather_query(start_date, end_date, station_id):
+    """
+    Builds the filtered weather_data query shared by the paginated endpoints.
+
+    Args:
+        start_date (str): The start date of the period for which to retrieve weather data.
+        end_date (str): The end date of the period for which to retrieve weather data.
+        station_id (str): The ID of the weather station from which to retrieve data.
+
+    Returns:
+        tuple: The SQL query and the list of its bound parameters.
+    """
+    query = f"SELECT {WEATHER_COLUMNS} FROM weather_data WHERE 1=1"
+    params = []
+    if start_date:
+        query += " AND date >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND date <= %s"
+        params.append(end_date)
+    if station_id:
+        query += " AND station_id = %s"
+        params.append(station_id)
+    return query, params
+
+
+
+def build_weather_page_query(start_date, end_date, station_id, page_number, page_size):
+    """
+    Builds the query of one page of the offset paginated weather endpoint.
+
+    Returns:
+        tuple: The SQL query and the list of its bound parameters.
+    """
+    query, params = build_weather_query(start_date, end_date, station_id)
+    query += " ORDER BY weather_data.station_id, weather_data.date LIMIT %s OFFSET %s"    # LIMIT-> page size and OFFSET -> rows on the previous pages
+    params += [int(page_size), (max(int(page_number), 1) - 1) * int(page_size)]
+    return query, params
+
+
+
+def build_weather_keyset_query(start_date, end_date, station_id, page_size, cursor):
+    """
+    Builds the query of one page of the keyset paginated weather endpoint. Rather than skipping the rows of earlier pages with
+    OFFSET, the query seeks directly past the (station_id, date) key encoded in the cursor using the weather_data
+    (station_id, date) index, so deep pages cost the same as the first one.
+
+    Returns:
+        tuple: The SQL query and the list of its bound parameters.
+    """
+    query, params = build_weather_query(start_date, end_date, station_id)
+    if cursor:
+        query += " AND (station_id, date) > (%s, %s)"
+        params += list(decode_cursor(cursor))
+    query += " ORDER BY weather_data.station_id, weather_data.date LIMIT %s"
+    params.append(int(page_size))
+    return query, params
+
+
+
+def encode_row(row, template=WEATHER_ROW_TEMPLATE):
+    """
+    Encodes one weather_data row, as selected with WEATHER_FIELDS, into a compact JSON object. Every column is text, so the
+    values only need string escaping.
+    """
+    return template % tuple('null' if value is None else encode_basestring(value) for value in row)
+
+
+
+def encode_json_array(rows):
+    """
+    Yields the rows as a JSON array of records, one record at a time.
+    """
+    yield '['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + encode_row(row)
+    yield ']'
+
+
+
+def encode_ndjson(rows):
+    """
+    Yields the rows as newline delimited JSON, one record per line.
+    """
+    for row in rows:
+        yield encode_row(row) + '\n'
+
+
+
+def encode_cursor(station_id, date):
+    """
+    Encodes the (station_id, date) key of the last returned record into an opaque pagination cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps([station_id, date]).encode()).decode()
+
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a pagination cursor created by encode_cursor back into its (station_id, date) key.
+
+    Raises:
+        ValueError: If the cursor was not created by encode_cursor.
+    """
+    try:
+        station_id, date = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return parse_station_id(station_id), parse_date(date)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError(f"cursor must be the next_cursor of a previous page, got {cursor}")
+
+
+
+def encode_keyset_page(results, page_size):
+    """
+    Encodes the rows of a keyset page and the cursor of the next page.
+
+    Returns:
+        tuple: The weather data of the page in JSON format and the cursor of the next page (None on the last page).
+    """
+    # A full page means there may be more records after the last one
+    next_cursor = None
+    if len(results) == int(page_size):
+        last = dict(zip(WEATHER_COLUMN_NAMES, results[-1]))
+        next_cursor = encode_cursor(last['station_id'], last['date'])
+    return ''.join(encode_json_array(results)), next_cursor
+
+
+
+def split_values(values):
+    """
+    Collects the values of a list query param, accepting both repeated (param=A&param=B) and comma separated (param=A,B) forms.
+
+    Args:
+        values (list): Every value of the query param.
+
+    Returns:
+        list: The requested values in request order, without duplicates.
+    """
+    collected = []
+    for value in values:
+        for item in value.split(','):
+            item = item.strip()
+            if item and item not in collected:
+                collected.append(item)
+    return collected
+
+
+
+def split_station_ids(values):
+    """
+    Collects the requested station ids, see split_values.
+    """
+    return split_values(values)
+
+
+
+def parse_batch_params(station_values, column_values):
+    """
+    Parses the station and column params of the batch endpoint.
+
+    Args:
+        station_values (list): Every value of the station_id query param; "all" selects every station.
+        column_values (list): Every value of the columns query param; empty for BATCH_DEFAULT_COLUMNS.
+
+    Returns:
+        tuple: The station ids (None for all stations), the projected columns and an error message (None if the params are valid).
+    """
+    try:
+        station_ids = parse_station_ids(station_values)
+    except ValueError as e:
+        return None, None, str(e)
+    columns = split_values(column_values) or BATCH_DEFAULT_COLUMNS
+    unknown = [column for column in columns if column not in BATCH_COLUMNS]
+    if unknown:
+        return None, None, f"Unknown columns {', '.join(unknown)}, expected any of {', '.join(BATCH_COLUMNS)}"
+    if not station_ids:
+        return None, None, 'station_id must list station ids or be all'
+    if ALL_STATIONS in station_ids:
+        station_ids = None
+    return station_ids, columns, None
+
+
+
+def build_weather_batch_query(start_date, end_date, station_ids, columns):
+    """
+    Builds the single query of the batch endpoint, returning the projected columns of every requested station over the date
+    range, ordered by station so the rows of each station arrive together.
+
+    Args:
+        start_date (str): The start date of the period, YYYY-MM-DD.
+        end_date (str): The end date of the period, YYYY-MM-DD.
+        station_ids (list): The IDs of the weather stations, None for all stations.
+        columns (list): The projected columns, a subset of BATCH_COLUMNS.
+
+    Returns:
+        tuple: The SQL query and the list of its bound parameters. The first result column is station_id.
+    """
+    projection = ', '.join(f'{WEATHER_FIELDS[name]} AS {name}' for name in columns)
+    query = f"SELECT station_id, {projection} FROM weather_data WHERE date >= %s AND date <= %s"
+    params = [start_date, end_date]
+    if station_ids is not None:
+        query += " AND station_id = ANY(%s)"
+        params.append(station_ids)
+    query += " ORDER BY weather_data.station_id, weather_data.date"
+    return query, params
+
+
+
+class RecordEncoder:
+    """
+    Incremental counterpart of encode_json_array and encode_ndjson, for rows fetched in batches by an async server-side cursor.
+    """
+    def __init__(self, output_format='json'):
+        self.ndjson = output_format == 'ndjson'
+        self.count = 0
+
+    def feed(self, rows):
+        """
+        Returns the text of the next rows of the response.
+        """
+        if self.ndjson:
+            return ''.join(encode_ndjson(rows))
+        text = ''.join((',' if self.count + index else '[') + encode_row(row) for index, row in enumerate(rows))
+        self.count += len(rows)
+        return text
+
+    def close(self):
+        """
+        Returns the text closing the response.
+        """
+        if self.ndjson:
+            return ''
+        return ']' if self.count else '[]'
+
+
+
+class StationGroupEncoder:
+    """
+    Encodes the rows of a batch query, ordered by station, into one group of records per station. Each group is emitted as
+    soon as the first row of the next station arrives, so a streamed response delivers stations one after another.
+
+    The JSON format is an object keyed by station id, {"A": [...], "B": [...]}; the NDJSON format is one
+    {"station_id": ..., "records": [...]} line per station.
+    """
+    def __init__(self, columns, output_format='json'):
+        self.template = row_template(columns)
+        self.ndjson = output_format == 'ndjson'
+        self.station_id = None
+        self.records = []
+        self.groups = 0
+
+    def _group(self):
+        station_id, records = encode_basestring(self.station_id), ','.join(self.records)
+        self.records = []
+        self.groups += 1
+        if self.ndjson:
+            return '{"station_id":%s,"records":[%s]}\n' % (station_id, records)
+        return '%s%s:[%s]' % ('{' if self.groups == 1 else ',', station_id, records)
+
+    def feed(self, rows):
+        """
+        Consumes (station_id, *columns) rows and returns the text of the station groups they completed.
+        """
+        completed = []
+        for row in rows:
+            if row[0] != self.station_id:
+                if self.records:
+                    completed.append(self._group())
+                self.station_id = row[0]
+            self.records.append(encode_row(row[1:], self.template))
+        return ''.join(completed)
+
+    def close(self):
+        """
+        Returns the text of the last station group and closes the response.
+        """
+        text = self._group() if self.records else ''
+        if not self.ndjson:
+            text += '}' if self.groups else '{}'
+        return text
+
+
+
+def encode_station_groups(rows, columns, output_format='json'):
+    """
+    Yields the rows of a batch query grouped by station, see StationGroupEncoder, one chunk per completed station group.
+    """
+    encoder = StationGroupEncoder(columns, output_format)
+    rows = iter(rows)
+    for chunk in iter(lambda: list(islice(rows, CURSOR_ITERSIZE)), []):
+        text = encoder.feed(chunk)
+        if text:
+            yield text
+    yield encoder.close()
+
+
+
+def covers_whole_years(start_date, end_date):
+    """
+    Checks whether a date range starts on January 1st and ends on December 31st, i.e. can be answered from yearly aggregates.
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    return (start.month, start.day) == (1, 1) and (end.month, end.day) == (12, 31)
+
+
+
+def covers_whole_months(start_date, end_date):
+    """
+    Checks whether a date range starts on the first and ends on the last day of a month, i.e. can be answered from monthly aggregates.
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    return start.day == 1 and (end + timedelta(days=1)).day == 1
+
+
+
+def stats_source(start_date, end_date, station_ids, granularity='year', rollup=False):
+    """
+    Picks the coarsest precomputed table able to answer a stats request exactly.
+
+    Args:
+        start_date (str): The start date of the period, YYYY-MM-DD.
+        end_date (str): The end date of the period, YYYY-MM-DD.
+        station_ids (list): The IDs of the weather stations to aggregate, ALL_STATIONS for all stations together.
+        granularity (str): 'year' or 'month'.
+        rollup (bool): Whether the weather_rollup cube exists.
+
+    Returns:
+        str: 'year' or 'month' for that grain of weather_rollup, 'transformed' for weather_data_transformed or 'raw' for weather_data.
+    """
+    if rollup:
+        if granularity == 'year' and covers_whole_years(start_date, end_date):
+            return 'year'
+        if covers_whole_months(start_date, end_date):
+            return 'month'
+        return 'raw'
+    if granularity == 'year' and covers_whole_years(start_date, end_date) and ALL_STATIONS not in station_ids:
+        return 'transformed'
+    return 'raw'
+
+
+
+def build_weather_stats_query(start_date, end_date, station_ids, granularity='year', rollup=False):
+    """
+    Builds the query of the average max and min temperature and the total precipitation per station and year (or month).
+    The request is answered from the coarsest table that covers it, see stats_source: whole years at yearly granularity from
+    the yearly rows of weather_rollup (or weather_data_transformed without the cube), whole months from its monthly rows, and
+    any other range by aggregating weather_data. The station id ALL_STATIONS requests the figures of all stations together.
+
+    Args:
+        start_date (str): The start date of the period, YYYY-MM-DD.
+        end_date (str): The end date of the period, YYYY-MM-DD.
+        station_ids (list): The IDs of the weather stations to aggregate.
+        granularity (str): 'year' or 'month'.
+        rollup (bool): Whether the weather_rollup cube exists.
+
+    Returns:
+        tuple: The SQL query and the list of its bound parameters.
+    """
+    source = stats_source(start_date, end_date, station_ids, granularity, rollup)
+    month = granularity == 'month'
+    keys = '1, 2, 3' if month else '1, 2'
+    if source == 'transformed':
+        return """
+            SELECT years::int AS year, station_id, avg_max_temp AS max_temp, avg_min_temp AS min_temp,
+                   total_precipitation_amt AS precipitation_amt
+            FROM weather_data_transformed
+            WHERE years BETWEEN %s AND %s AND station_id = ANY(%s)
+            ORDER BY year, station_id
+            """, [int(start_date[:4]), int(end_date[:4]), station_ids]
+    if source in ('year', 'month'):
+        # Means are recombined from sums and counts, so monthly rows add up to exact yearly figures
+        return f"""
+            SELECT EXTRACT(YEAR FROM period_start)::int AS year, {"EXTRACT(MONTH FROM period_start)::int AS month, " if month else ""}station_id,
+                   SUM(sum_max_temp) / NULLIF(SUM(count_max_temp), 0) AS max_temp,
+                   SUM(sum_min_temp) / NULLIF(SUM(count_min_temp), 0) AS min_temp,
+                   SUM(sum_precipitation_amt) AS precipitation_amt
+            FROM weather_rollup
+            WHERE grain = %s AND period_start >= %s AND period_start <= %s AND station_id = ANY(%s)
+            GROUP BY {keys}
+            ORDER BY {keys}
+            """, [source, start_date, end_date, station_ids]
+
+    periods = "EXTRACT(YEAR FROM date)::int AS year, " + ("EXTRACT(MONTH FROM date)::int AS month, " if month else "")
+    measures = "AVG(max_temp) AS max_temp, AVG(min_temp) AS min_temp, SUM(precipitation_amt) AS precipitation_amt"
+    query = f"""
+            SELECT {periods}station_id, {measures}
+            FROM weather_data
+            WHERE date >= %s AND date <= %s AND station_id = ANY(%s)
+            GROUP BY {keys}
+            """
+    params = [start_date, end_date, station_ids]
+    if ALL_STATIONS in station_ids:
+        query += f"""
+            UNION ALL
+            SELECT {periods}%s AS station_id, {measures}
+            FROM weather_data
+            WHERE date >= %s AND date <= %s
+            GROUP BY {'1, 2' if month else '1'}
+            """
+        params += [ALL_STATIONS, start_date, end_date]
+    return query + f"""
+            ORDER BY {keys}
+            """, params
+
+
+
+def stream_records(columns, rows):
+    """
+    Yields a JSON array of records one row at a time, converting the NUMERIC values returned by Postgres to floats.
+    """
+    yield '['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + json.dumps(dict(zip(columns, row)), default=float)
+    yield ']'
@@ -0,0 +1,253 @@
+# Import in-built libraries
+import os, sys, time, json
+# Import hashlib to derive backend keys from request keys
+import hashlib
+# Import threading and OrderedDict for the thread safe LRU store
+import threading
+from collections import OrderedDict
+
+# Import CustomException from utils module
+from src.utils import CustomException
+
+
+class CacheBackend:
+    """
+    Interface of the storage behind ResponseCache. Backends store str values under str keys and keep hit/miss counters.
+
+    Methods
+    -------
+    get(key) -> Returns the cached value or None.
+    set(key, value) -> Stores a value.
+    clear() -> Drops every entry.
+    stats() -> Returns a dictionary of counters.
+
+    options lists the [cache] settings of config.ini the backend constructor accepts.
+    """
+    options = ()
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {'backend': type(self).__name__, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    In-process cache bounded by entry count and total bytes, evicting the least recently used entries first and expiring
+    entries older than ttl seconds.
+
+    Parameterized Constructor:
+    ----------
+    max_entries (int): Maximum number of cached entries.
+    max_bytes (int): Maximum total size of the cached values in bytes.
+    ttl (float): Seconds an entry stays valid.
+    """
+    options = ('max_entries', 'max_bytes', 'ttl')
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300):
+        super().__init__()
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl)
+        self.entries = OrderedDict()   # key -> (expiry time, size in bytes, value), least recently used first
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, value):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.bytes += size
+            # Evict least recently used entries until both bounds hold again
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return dict(super().stats(), entries=len(self.entries), bytes=self.bytes)
+
+
+class FileCacheBackend(CacheBackend):
+    """
+    Cache stored as one file per entry in a shared directory, so every API worker process on the host reads and fills the same
+    cache. A local stand-in for a networked shared cache; counters are per process. The directory is bounded like the memory
+    cache: every write deletes the expired files, then the oldest ones until both bounds hold again.
+
+    Parameterized Constructor:
+    ----------
+    directory (str): Folder holding the cache files.
+    max_entries (int): Maximum number of cached files.
+    max_bytes (int): Maximum total size of the cached files in bytes.
+    ttl (float): Seconds an entry stays valid, based on the file modification time.
+    """
+    options = ('directory', 'max_entries', 'max_bytes', 'ttl')
+
+    def __init__(self, directory='cache', max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=300):
+        super().__init__()
+        self.directory = directory
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl)
+        os.makedirs(self.directory, exist_ok=True)
+        # Entries expired while no worker was running are swept at startup
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                value = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if len(value.encode('utf-8')) > self.max_bytes:
+            return
+        path = self._path(key)
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        """
+        Deletes the expired cache files, then the oldest ones until both bounds hold again. Files another worker deleted in the
+        meantime are skipped.
+        """
+        now = time.time()
+        entries = []   # (modification time, size in bytes, path) of the valid entries
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+                # Temporary files of writes that died before their rename are swept once expired
+                if now - stat.st_mtime > self.ttl:
+                    os.remove(entry.path)
+                elif not entry.name.endswith('.tmp'):
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        entries.sort()
+        count, total = len(entries), sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            count -= 1
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+
+CACHE_BACKENDS = {'memory': MemoryCacheBackend, 'file': FileCacheBackend}
+
+
+class ResponseCache:
+    """
+    Caches API response bodies keyed by the request and by the current data version, so a bump of the data version by an
+    ingestion run invalidates every cached response at once.
+
+    Parameterized Constructor:
+    ----------
+    backend (CacheBackend): Where the responses are stored.
+    version_source (callable): Returns the current data version.
+    version_check_interval (float): Seconds the data version is reused before version_source is asked again.
+    """
+    def __init__(self, backend, version_source, version_check_interval=1.0):
+        self.backend = backend
+        self.version_source = version_source
+        self.version_check_interval = float(version_check_interval)
+        self.version = None
+        self.version_checked_at = 0.0
+
+    @classmethod
+    def from_config(cls, cache_params, version_source):
+        """
+        Builds a ResponseCache from the [cache] section of config.ini (backend, ttl, max_entries, max_bytes, directory,
+        version_check_interval); missing keys fall back to the backend defaults. Settings the chosen backend does not take,
+        such as a directory left over for backend = memory, are ignored.
+        """
+        try:
+            params = dict(cache_params)
+            backend_cls = CACHE_BACKENDS[params.pop('backend', 'memory')]
+            version_check_interval = params.pop('version_check_interval', 1.0)
+            options = {name: value for name, value in params.items() if name in backend_cls.options}
+            return cls(backend_cls(**options), version_source, version_check_interval)
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def current_version(self):
+        now = time.monotonic()
+        if self.version is None or now - self.version_checked_at >= self.version_check_interval:
+            self.version = self.version_source()
+            self.version_checked_at = now
+        return self.version
+
+    def key(self, path, args):
+        """
+        Builds the cache key of a request from its path, its sorted query params and the current data version.
+        """
+        return json.dumps([self.current_version(), path, sorted(args)])
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def stats(self):
+        return dict(self.backend.stats(), data_version=self.version)
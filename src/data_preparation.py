@@ -1,12 +1,208 @@
 # Import in-built libraries
-import os, sys
+import os, sys, io
+# Import hashlib to fingerprint station files for incremental ingestion
+import hashlib
 # Import data manipulation libraries
 import pandas as pd
 import numpy as np
+# Import process pool for parallel parsing of station files
+from concurrent.futures import ProcessPoolExecutor
 
 # Import datetime and logging, CustomException from utils module
 from datetime import datetime
 from src.utils import logging, CustomException
+from src.station_cache import StationCache, cache_available, columns_to_frame, parse_station_columns, MEASURE_DECIMALS
+# Import the ingestion profiler recording stage timers and counters
+from src.profiling import profiler
+
+
+# Value every measure carries in the raw station files when it was not recorded (-9999), after unit scaling
+MISSING_VALUES = {'max_temp': -999.9, 'min_temp': -999.9, 'precipitation_amt': -99.99}
+# Physically plausible range of every measure after unit scaling; values outside are treated as missing
+VALID_RANGES = {'max_temp': (-90.0, 60.0), 'min_temp': (-90.0, 60.0), 'precipitation_amt': (0.0, 100.0)}
+# Per-station counters reported by validate_station_columns
+QUALITY_COUNTERS = ['records', 'missing_max_temp', 'missing_min_temp', 'missing_precipitation_amt', 'out_of_range_max_temp',
+                    'out_of_range_min_temp', 'out_of_range_precipitation_amt', 'min_above_max', 'duplicate_dates', 'empty_records']
+
+
+def validate_station_columns(columns):
+    """
+    Vectorized data quality stage applied to the parsed columns of one station before any dataframe is built. Missing value
+    sentinels and out of range measures become NaN (NULL in the database), repeated dates keep their first record only and
+    records without any valid measure are dropped, so invalid rows never reach the database.
+
+    Parameters
+    ----------
+    columns (dict): Typed columns as returned by src.station_cache.parse_station_columns. Arrays are not modified in place.
+
+    Returns
+    -------
+    tuple -> (dict of validated columns of the same dtypes, dict of QUALITY_COUNTERS for this station)
+    """
+    dates = columns['date']
+    counters = {'records': len(dates)}
+    valid = {}
+    for name in MEASURE_DECIMALS:
+        values = columns[name]
+        missing = values == values.dtype.type(MISSING_VALUES[name])
+        low, high = VALID_RANGES[name]
+        out_of_range = ~missing & ((values < low) | (values > high))
+        counters[f'missing_{name}'] = int(missing.sum())
+        counters[f'out_of_range_{name}'] = int(out_of_range.sum())
+        valid[name] = np.where(missing | out_of_range, np.nan, values).astype(values.dtype)
+    # Inverted temperatures are only flagged, either of the two readings could be the wrong one
+    counters['min_above_max'] = int((valid['min_temp'] > valid['max_temp']).sum())
+
+    # Keep the first record of every date, in file order
+    keep = np.zeros(len(dates), dtype=bool)
+    keep[np.unique(dates, return_index=True)[1]] = True
+    counters['duplicate_dates'] = int(len(dates) - keep.sum())
+    empty = np.isnan(valid['max_temp']) & np.isnan(valid['min_temp']) & np.isnan(valid['precipitation_amt'])
+    counters['empty_records'] = int((keep & empty).sum())
+    keep &= ~empty
+
+    validated = {'date': dates[keep]}
+    for name in MEASURE_DECIMALS:
+        validated[name] = valid[name][keep]
+    return validated, counters
+
+
+def read_station_columns(source, station_cache=None):
+    """
+    Returns the validated columns and quality counters of one station file, read from the station cache when one is given.
+
+    Parameters
+    ----------
+    source (str or file-like): Path of the station file, or a buffer holding part of it (never cached).
+    station_cache (StationCache): The station cache, or None.
+    """
+    if station_cache is not None and isinstance(source, str):
+        columns = station_cache.columns(source)
+    else:
+        columns = parse_station_columns(source)
+    with profiler.stage('prepare.validate'):
+        validated, counters = validate_station_columns(columns)
+    profiler.count('prepare.rows_valid', len(validated['date']))
+    profiler.count('prepare.rows_rejected', counters['records'] - len(validated['date']))
+    return validated, counters
+
+
+def parse_station_files(file_paths, cache_dir=None, compact=False):
+    """
+    Parses, validates and transforms a shard of weather station files into compact column arrays. Used as the unit of work of
+    the worker processes in PrepareData.prepare_weather_data, so it is kept at module level to be picklable.
+
+    Parameters
+    ----------
+    file_paths (list): Paths of the station files belonging to this shard, in the order they should appear in the output.
+    cache_dir (str): Folder of the station cache to read parsed files from and add newly parsed files to. None disables it.
+    compact (bool): Return float32 measures and no 'wid' array, for PrepareData with compact=True.
+
+    Returns
+    -------
+    dict ->  'station_ids', 'counts' and 'quality' hold each station id, its number of records and its quality counters,
+             'date' is a datetime64[D] array and 'max_temp', 'min_temp', 'precipitation_amt' and 'wid' are arrays covering
+             every record of the shard, and 'profile' the profiler stages and counters recorded while parsing it.
+    """
+    before = profiler.snapshot()
+    station_ids, counts, quality = [], [], []
+    columns = {'date': [], 'max_temp': [], 'min_temp': [], 'precipitation_amt': [], 'wid': []}
+    station_cache = StationCache(cache_dir) if cache_dir else None
+    if compact:
+        del columns['wid']
+    for path in file_paths:
+        f = os.path.basename(path)
+        station_id = f[:f.index('.')]
+        station_columns, counters = read_station_columns(path, station_cache)
+        station_ids.append(station_id)
+        counts.append(len(station_columns['date']))
+        quality.append(counters)
+        columns['date'].append(station_columns['date'].astype('datetime64[D]'))
+        if compact:
+            for name in MEASURE_DECIMALS:
+                columns[name].append(station_columns[name])
+            continue
+        # Building the primary key strings is the most expensive step, so it is done here rather than in the parent process
+        with profiler.stage('prepare.build_frame'):
+            tempdf = columns_to_frame(station_columns, station_id)
+        for name in MEASURE_DECIMALS:
+            columns[name].append(tempdf[name].values)
+        columns['wid'].append(tempdf['wid'].values.astype(object))
+
+    shard = {name: np.concatenate(arrays) if arrays else np.array([]) for name, arrays in columns.items()}
+    shard['station_ids'] = station_ids
+    shard['counts'] = counts
+    shard['quality'] = quality
+    shard['profile'] = profiler.since(before)
+    return shard
+
+
+def compact_station_frame(columns, station_id):
+    """
+    Builds the compact weather dataframe of one station: datetime64 dates, float32 measures and a categorical station_id.
+    The wid key is not stored, it is derived from (station_id, date) when the records are loaded (see expand_weather_frame).
+
+    Parameters
+    ----------
+    columns (dict): Typed columns as returned by src.station_cache.parse_station_columns.
+    station_id (str): The station id of the columns.
+
+    Returns
+    -------
+    pandas.DataFrame ->  A compact DataFrame with date, max_temp, min_temp, precipitation_amt and station_id columns.
+    """
+    tempdf = pd.DataFrame({'date': pd.Series(columns['date'].astype('datetime64[D]'))})
+    for name in MEASURE_DECIMALS:
+        tempdf[name] = columns[name].astype(np.float32)
+    tempdf['station_id'] = pd.Categorical.from_codes(np.zeros(len(tempdf), dtype=np.int8), [station_id])
+    return tempdf
+
+
+def is_compact_weather_frame(df):
+    """
+    Returns True for weather dataframes in the compact layout, i.e. with a station_id but without a wid column.
+    """
+    return 'station_id' in df.columns and 'wid' not in df.columns
+
+
+def concat_weather_frames(frames):
+    """
+    Concatenates weather dataframes of either layout. Compact frames keep a categorical station_id across stations instead
+    of falling back to one Python string per row.
+    """
+    frames = list(frames)
+    with profiler.stage('prepare.concat'):
+        if not frames or not is_compact_weather_frame(frames[0]):
+            return pd.concat(frames, axis=0, ignore_index=True)
+        df = pd.concat([frame.drop(columns='station_id') for frame in frames], axis=0, ignore_index=True)
+        df['station_id'] = pd.api.types.union_categoricals([frame['station_id'] for frame in frames])
+        return df
+
+
+def expand_weather_frame(df):
+    """
+    Converts a compact weather dataframe (or a batch of it) into the layout of the weather_data table: dates as strings,
+    measures as float64 with the same values as the full layout, station_id as strings and the wid key. Dataframes already
+    in the full layout are returned unchanged.
+
+    Parameters
+    ----------
+    df (pandas.DataFrame): A compact weather dataframe.
+
+    Returns
+    -------
+    pandas.DataFrame ->  A DataFrame with date, max_temp, min_temp, precipitation_amt, station_id and wid columns.
+    """
+    if not is_compact_weather_frame(df):
+        return df
+    dates = pd.Series(np.datetime_as_string(df['date'].values.astype('datetime64[D]'), unit='D'), index=df.index, dtype=str)
+    station_ids = df['station_id'].astype(str)
+    expanded = pd.DataFrame({'date': dates}, index=df.index)
+    for name, decimals in MEASURE_DECIMALS.items():
+        expanded[name] = np.round(df[name].values.astype(np.float64), decimals)
+    expanded['station_id'] = station_ids
+    expanded['wid'] = station_ids + '_' + dates
+    return expanded
 
 
 # Data Preparation class
@@ -22,24 +218,43 @@ class PrepareData:
                Each folder would then be containing respective data files in txt or csv formats .
     weather_data_path (str): folder name containing the weather data txt or csv files.
     crop_data_path (str): The path to the directory containing the crop data.
+    workers (int): Number of worker processes used to parse the weather station files; 1 keeps the serial path.
+    cache_dir (str): Folder of the columnar station cache (see src.station_cache); None parses every file on every run.
+    compact (bool): Prepare weather dataframes in the compact layout of compact_station_frame instead of the full one.
 
     Methods
     -------
     prepare_weather_data() -> Prepares weather data dataframe ready for ingestion into a Postgres table.
+    prepare_weather_data_incremental() -> Prepares only the weather records added since the last ingestion manifest.
+    stream_weather_data() -> Yields the weather data in per-station or fixed size batches for bounded memory ingestion.
+    read_weather_cache() -> Returns the cached station data as one memory-mapped pyarrow Table.
+    quality_report() -> Returns the per-station data quality counters of the prepared weather data.
     prepare_crop_data() -> Prepares crop data dataframe ready for ingestion into a Postgres table.
     """
-    def __init__(self, cwd):
+    def __init__(self, cwd, workers=1, cache_dir=None, compact=False):
         """
         Initializes the PrepareData class.
 
         Parameters
         ----------
         cwd (str): The current working directory.
+        workers (int): Number of worker processes used by prepare_weather_data. Defaults to 1 (serial).
+        cache_dir (str): Folder of the columnar station cache. Defaults to None (no cache).
+        compact (bool): Prepare compact weather dataframes. Defaults to False.
         """
         try:
             self.cwd = cwd
+            self.workers = max(1, int(workers or 1))
             self.weather_data_path = os.path.join(self.cwd, 'wx_data')
             self.crop_data_path = os.path.join(self.cwd, 'yld_data')
+            self.compact = bool(compact)
+            self.quality = {}   # station_id -> data quality counters of the last prepared file of that station
+            self.station_cache = None
+            if cache_dir:
+                if cache_available():
+                    self.station_cache = StationCache(cache_dir)
+                else:
+                    logging.info('pyarrow is not installed, station cache disabled')
             logging.info("weather data and crop data path variables created")
         except Exception as e:
             raise CustomException(e, sys)
@@ -52,30 +267,247 @@ class PrepareData:
         -------
         pandas.DataFrame ->  A pandas DataFrame containing the weather data.
         """
+        if self.workers > 1:
+            return self.prepare_weather_data_parallel()
         try:
             filelists = []  # list to capture each dataframe obtained from each text or csv file present in the weather data folder
             for f in os.listdir(self.weather_data_path):
-                # Read the text file as a dataframe
-                tempdf = pd.read_csv(os.path.join(self.weather_data_path, f), sep = '\t', names = ['date', 'max_temp', 'min_temp', 'precipitation_amt'])
-                # Create a station_id variable from the file name excluding everything '.' onwards
-                station_id = f[:f.index('.')]
-                tempdf['max_temp'] = tempdf['max_temp']/10   # recording maximum temperature in celsius
-                tempdf['min_temp'] = tempdf['min_temp']/10   # recording minimum temperature in celsius
-                tempdf['precipitation_amt'] = tempdf['precipitation_amt']/100  # recording precipitation amount in centimeters
-                # Appending the station id into a column in the temp dataframe
-                tempdf['station_id'] = station_id
-                # Convert the date read from the text file into pandas datetime format
-                tempdf['date'] = pd.to_datetime(tempdf.date, format = '%Y%m%d').dt.date
-                # Create a primary key column by concatenating station id and date for the postgre sql table
-                tempdf['wid'] = tempdf['station_id'] + '_' + tempdf.date.astype(str)
-                # Append the temp dataframe into filelists list
-                filelists.append(tempdf)
+                # Append the prepared station dataframe into filelists list
+                filelists.append(self.prepare_station_file(f))
+            self.log_quality()
             logging.info('weather dataframe created and ready for ingestion into Postgres Table')
             # Return the complete extracted weather dataframe
-            return pd.concat(filelists, axis=0, ignore_index=True)
+            return concat_weather_frames(filelists)
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def prepare_station_file(self, f, offset=0):
+        """
+        Prepares the weather data of a single station file.
+
+        Parameters
+        ----------
+        f (str): Name of the station file inside the weather data folder, e.g. USC00110072.txt
+        offset (int): Byte offset to start reading from, used to parse only the appended tail of a file. Must be at a line start.
+
+        Returns
+        -------
+        pandas.DataFrame ->  A pandas DataFrame containing the weather data of that station.
+        """
+        source = os.path.join(self.weather_data_path, f)
+        if offset:
+            with open(source, 'rb') as fh:
+                fh.seek(offset)
+                source = io.BytesIO(fh.read())
+        # Create a station_id variable from the file name excluding everything '.' onwards
+        station_id = f[:f.index('.')]
+        # Parse (or reuse the cached parse of) the file and drop invalid values and records
+        columns, counters = read_station_columns(source, self.station_cache)
+        self.quality[station_id] = counters
+        with profiler.stage('prepare.build_frame'):
+            if self.compact:
+                return compact_station_frame(columns, station_id)
+            # Scaled measures in celsius and centimeters, dates and the station_id + '_' + date primary key
+            return columns_to_frame(columns, station_id)
+
+    def stream_weather_data(self, batch_size=None):
+        """
+        Lazily prepares weather data so that only a bounded number of records is held in memory at any time.
+
+        Parameters
+        ----------
+        batch_size (int): Number of records per yielded dataframe. If None, one dataframe is yielded per station file.
+
+        Yields
+        ------
+        pandas.DataFrame ->  A batch of weather records with the same columns as prepare_weather_data.
+        """
+        try:
+            pending = []    # station dataframes (or their leftovers) not yet yielded when batching by size
+            pending_rows = 0
+            for f in os.listdir(self.weather_data_path):
+                tempdf = self.prepare_station_file(f)
+                if not batch_size:
+                    yield tempdf
+                    continue
+
+                pending.append(tempdf)
+                pending_rows += len(tempdf)
+                # Emit fixed size batches as soon as enough records are buffered
+                while pending_rows >= batch_size:
+                    buffered = concat_weather_frames(pending)
+                    yield buffered.iloc[:batch_size].reset_index(drop=True)
+                    pending = [buffered.iloc[batch_size:]]
+                    pending_rows -= batch_size
+
+            if batch_size and pending_rows:
+                yield concat_weather_frames(pending)
+            self.log_quality()
+            logging.info('weather data stream exhausted')
         except Exception as e:
             raise CustomException(e, sys)
 
+    def prepare_weather_data_incremental(self, manifest, files=None):
+        """
+        Prepares only the weather data that is new since the last ingestion recorded in the manifest. Unchanged files are skipped
+        on size and mtime alone, files that only had records appended are parsed from the previously ingested size onwards,
+        and any other new or modified file is parsed in full.
+
+        Parameters
+        ----------
+        manifest (dict): Maps a station file path to its last ingested entry with keys size, mtime, content_hash and
+                         last_ingested_date, as stored in the ingestion_manifest table.
+        files (list): Names of the station files to consider, e.g. one checkpoint of a larger load; all of them if None.
+
+        Returns
+        -------
+        tuple -> (pandas.DataFrame containing the new weather records, list of updated manifest entries as dicts with keys
+                 file_path, size, mtime, content_hash, last_ingested_date)
+        """
+        try:
+            filelists = []
+            entries = []
+            skipped = 0
+            for f in (os.listdir(self.weather_data_path) if files is None else files):
+                file_path = os.path.abspath(os.path.join(self.weather_data_path, f))
+                stat = os.stat(file_path)
+                previous = manifest.get(file_path)
+                if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+                    skipped += 1
+                    profiler.count('prepare.files_unchanged')
+                    continue
+
+                with profiler.stage('prepare.fingerprint'):
+                    with open(file_path, 'rb') as fh:
+                        content = fh.read()
+                    content_hash = hashlib.sha256(content).hexdigest()
+                if previous and previous['content_hash'] == content_hash:
+                    # Touched but not modified: only the mtime needs refreshing
+                    entries.append(dict(previous, file_path=file_path, mtime=stat.st_mtime))
+                    continue
+
+                offset = 0
+                if previous and stat.st_size > previous['size']:
+                    prefix = content[:previous['size']]
+                    # Records were only appended if the previously ingested bytes are untouched and ended on a full line
+                    if prefix.endswith(b'\n') and hashlib.sha256(prefix).hexdigest() == previous['content_hash']:
+                        offset = previous['size']
+
+                tempdf = self.prepare_station_file(f, offset)
+                filelists.append(tempdf)
+                last_date = pd.Timestamp(tempdf.date.max()).date() if len(tempdf) else (previous or {}).get('last_ingested_date')
+                entries.append({
+                    'file_path': file_path,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'content_hash': content_hash,
+                    'last_ingested_date': last_date,
+                })
+
+            df = concat_weather_frames(filelists) if filelists else \
+                pd.DataFrame(columns=['date', 'max_temp', 'min_temp', 'precipitation_amt', 'station_id', 'wid'])
+            self.log_quality()
+            logging.info(f'incremental weather dataframe created: {len(filelists)} files parsed, {skipped} unchanged files skipped, {len(df)} records')
+            return df, entries
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def prepare_weather_data_parallel(self):
+        """
+        Prepares weather data with a pool of self.workers processes. Station files are split into contiguous shards which are
+        parsed by parse_station_files, and the returned column arrays are copied once into preallocated arrays, so the output
+        is identical to the serial path of prepare_weather_data.
+
+        Returns
+        -------
+        pandas.DataFrame ->  A pandas DataFrame containing the weather data.
+        """
+        try:
+            file_paths = [os.path.join(self.weather_data_path, f) for f in os.listdir(self.weather_data_path)]
+            # Several shards per worker keep the pool busy when station files differ in length
+            n_shards = min(len(file_paths), self.workers * 4) or 1
+            shards = [list(shard) for shard in np.array_split(np.array(file_paths, dtype=object), n_shards)]
+            cache_dir = self.station_cache.cache_dir if self.station_cache is not None else None
+            with profiler.stage('prepare.parse_workers'):
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    results = list(executor.map(parse_station_files, shards, [cache_dir] * len(shards), [self.compact] * len(shards)))
+            # Stage times of the workers overlap, they add up to the CPU time spent in the pool rather than the wall time
+            for result in results:
+                profiler.merge(result['profile'])
+
+            # Allocate every output column once and fill it shard by shard instead of concatenating frames
+            total = sum(sum(result['counts']) for result in results)
+            measure_dtype = np.float32 if self.compact else np.float64
+            columns = {
+                'date': np.empty(total, dtype='datetime64[D]'),
+                'max_temp': np.empty(total, dtype=measure_dtype),
+                'min_temp': np.empty(total, dtype=measure_dtype),
+                'precipitation_amt': np.empty(total, dtype=measure_dtype),
+            }
+            if not self.compact:
+                columns['wid'] = np.empty(total, dtype=object)
+            offset = 0
+            for result in results:
+                size = sum(result['counts'])
+                for name, array in columns.items():
+                    array[offset:offset + size] = result[name]
+                offset += size
+            all_station_ids = [station_id for result in results for station_id in result['station_ids']]
+            all_counts = [count for result in results for count in result['counts']]
+            self.quality.update(zip(all_station_ids, (counters for result in results for counters in result['quality'])))
+            self.log_quality()
+            if self.compact:
+                df = pd.DataFrame({'date': pd.Series(columns['date'])})
+                for name in MEASURE_DECIMALS:
+                    df[name] = columns[name]
+                df['station_id'] = pd.Categorical.from_codes(
+                    np.repeat(np.arange(len(all_station_ids), dtype=np.int32), all_counts), all_station_ids)
+                logging.info(f'compact weather dataframe created with {self.workers} worker processes and ready for ingestion into Postgres Table')
+                return df
+            station_ids = np.repeat(np.array(all_station_ids, dtype=object), all_counts)
+
+            df = pd.DataFrame({
+                'date': pd.Series(columns['date']).dt.date,
+                'max_temp': columns['max_temp'],
+                'min_temp': columns['min_temp'],
+                'precipitation_amt': columns['precipitation_amt'],
+                'station_id': pd.Series(station_ids, dtype=str),
+                'wid': pd.Series(columns['wid'], dtype=str),
+            })
+            logging.info(f'weather dataframe created with {self.workers} worker processes and ready for ingestion into Postgres Table')
+            return df
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def quality_report(self):
+        """
+        Returns the data quality counters of every station prepared so far, see validate_station_columns.
+
+        Returns
+        -------
+        pandas.DataFrame ->  One row per station_id with the QUALITY_COUNTERS columns.
+        """
+        return pd.DataFrame.from_dict(self.quality, orient='index', columns=QUALITY_COUNTERS).rename_axis('station_id')
+
+    def log_quality(self):
+        totals = self.quality_report().sum().to_dict()
+        logging.info(f"weather data quality over {len(self.quality)} stations: {totals}")
+
+    def read_weather_cache(self):
+        """
+        Reads the station cache as one memory-mapped pyarrow Table, for the transform step or ad-hoc analysis without going
+        through the text files or Postgres. Stations are only present once they were prepared with the cache enabled. The
+        cache holds the values as parsed, before validate_station_columns, so missing values are still -999.9 / -99.99.
+
+        Returns
+        -------
+        pyarrow.Table ->  Columns date (date32), max_temp, min_temp, precipitation_amt (float32) and station_id (dictionary),
+                          or None if the cache is disabled or empty.
+        """
+        if self.station_cache is None:
+            return None
+        return self.station_cache.read_table()
+
     def prepare_crop_data(self):
         """
         Prepares crop yield data for ingestion into a Postgres table.
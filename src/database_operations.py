@@ -1,18 +1,202 @@
 # Import in-built libraries
-import os, sys
+import os, sys, io, time
+# Import threading and deque for the bounded producer/consumer hand-off of streamed batches
+import threading
+from collections import deque
 # Import data manipulation libraries
 import pandas as pd
 import numpy as np
 # Import python library for postgres sql
 import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
 
 # Import classes and methods from data_preparation and utils module
-from src.data_preparation import PrepareData
-from src.utils import db_params, logging, CustomException
+from src.data_preparation import PrepareData, is_compact_weather_frame, expand_weather_frame, MISSING_VALUES, VALID_RANGES
+from src.utils import db_params, logging, CustomException, peak_rss_mb
+# Import the ingestion profiler recording stage timers and counters
+from src.profiling import profiler
 # Import datetime
 from datetime import datetime
 
 
+# Supported ingestion strategies for insert_data_into_table
+LOAD_MODES = ('rows', 'copy')
+# Number of dataframe rows streamed through a single COPY ... FROM STDIN call
+COPY_BATCH_SIZE = 100000
+# Default number of prepared batches buffered between the parsing thread and the database writer
+STREAM_QUEUE_SIZE = 4
+
+# Yearly per-station aggregates of weather_data. {pending} and {source} restrict the scan to the groups being refreshed.
+# Missing values are NULL in weather_data (see PrepareData validation), so the plain aggregates already skip them.
+TRANSFORM_QUERY = '''
+    {pending}
+    INSERT INTO weather_data_transformed (years, station_id, avg_min_temp, avg_max_temp, total_precipitation_amt)
+    SELECT EXTRACT(YEAR FROM w.date) AS years, w.station_id, AVG(w.min_temp), AVG(w.max_temp), SUM(w.precipitation_amt)
+    FROM weather_data w {source}
+    GROUP BY 1, 2
+    ON CONFLICT (years, station_id) DO UPDATE SET
+        avg_min_temp = EXCLUDED.avg_min_temp, avg_max_temp = EXCLUDED.avg_max_temp,
+        total_precipitation_amt = EXCLUDED.total_precipitation_amt;
+    '''
+# Joins the aggregation to the (station_id, year) groups queued by weather_data loads, consuming the queue in the same statement.
+# The scalar date bounds are evaluated once before the scan, which lets a partitioned weather_data skip the partitions outside
+# the queued years; the join condition alone is only known row by row.
+# Queued groups left without any record (e.g. by clean_weather_data_table) are deleted in the same statement rather than
+# kept with their former figures.
+PENDING_GROUPS = '''
+    WITH pending AS (DELETE FROM weather_data_transform_queue RETURNING years, station_id),
+    emptied AS (
+        DELETE FROM weather_data_transformed t USING pending p
+        WHERE t.years = p.years AND t.station_id = p.station_id
+          AND NOT EXISTS (SELECT 1 FROM weather_data w
+                          WHERE w.station_id = p.station_id
+                            AND w.date >= make_date(p.years::int, 1, 1) AND w.date < make_date(p.years::int + 1, 1, 1)))
+    '''
+PENDING_GROUPS_SOURCE = '''
+    JOIN (SELECT DISTINCT years, station_id FROM pending) p
+      ON w.station_id = p.station_id
+     AND w.date >= make_date(p.years::int, 1, 1) AND w.date < make_date(p.years::int + 1, 1, 1)
+     AND w.date >= (SELECT make_date(min(years)::int, 1, 1) FROM pending)
+     AND w.date < (SELECT make_date(max(years)::int + 1, 1, 1) FROM pending)
+    '''
+# Measures summarized by the weather_rollup cube; its rows for all stations together use ALL_STATIONS as station_id
+ROLLUP_MEASURES = ('max_temp', 'min_temp', 'precipitation_amt')
+ALL_STATIONS = 'all'
+# Monthly and yearly per-station rows of weather_rollup, computed in a single scan of weather_data: the two grouping sets
+# share the (station_id, year, month) sort order, so the yearly rows come out of the same pass as the monthly ones.
+# {source} restricts the scan to the (station_id, year) groups being refreshed.
+ROLLUP_QUERY = '''
+    INSERT INTO weather_rollup (grain, period_start, station_id, record_count, {columns})
+    SELECT CASE WHEN GROUPING(month_start) = 0 THEN 'month' ELSE 'year' END,
+           COALESCE(month_start, year_start), station_id, COUNT(*), {aggregates}
+    FROM (SELECT w.*, date_trunc('month', w.date)::date AS month_start, date_trunc('year', w.date)::date AS year_start
+          FROM weather_data w {source}) d
+    GROUP BY GROUPING SETS ((station_id, year_start, month_start), (station_id, year_start));
+    '''
+# Rows of all stations together, combined from the per-station rows of the years given by {years} (every year if empty)
+ROLLUP_ALL_STATIONS_QUERY = '''
+    INSERT INTO weather_rollup (grain, period_start, station_id, record_count, {columns})
+    SELECT grain, period_start, %(all_stations)s, SUM(record_count), {combined}
+    FROM weather_rollup
+    WHERE station_id <> %(all_stations)s {years}
+    GROUP BY grain, period_start;
+    '''
+# Supported partition granularities of a partitioned weather_data table, in years per partition
+PARTITION_GRANULARITIES = {'year': 1, 'decade': 10}
+# Condition matching a stored measure that PrepareData would have rejected: a missing value sentinel or an out of range value
+INVALID_MEASURE = "({column} = {missing} OR {column} < {low} OR {column} > {high})"
+# Brings a plain weather_data table created by earlier versions to the current schema: missing measures are stored as NULL
+# and max_temp holds decimals. The type is only changed when it is still INTEGER, since ALTER ... TYPE rewrites the table.
+WEATHER_DATA_MIGRATION = '''
+    ALTER TABLE weather_data ALTER COLUMN max_temp DROP NOT NULL, ALTER COLUMN min_temp DROP NOT NULL;
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'weather_data' AND column_name = 'max_temp') = 'integer' THEN
+            ALTER TABLE weather_data ALTER COLUMN max_temp TYPE NUMERIC;
+        END IF;
+    END $$;
+    '''
+# Key columns the loads of a table skip existing records on, see DBOperations.table_key_columns
+TABLE_KEY_COLUMNS = {'crop_yield_data': ['year']}
+# (station_id, year) groups touched by weather_data loads since the last weather_data_transformed refresh
+TRANSFORM_QUEUE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS weather_data_transform_queue(
+    years NUMERIC NOT NULL,
+    station_id TEXT NOT NULL,
+    PRIMARY KEY (years, station_id));
+    '''
+# Data version stamp bumped by every load and read by the API response caches
+DATA_VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS data_version(
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT now());
+    '''
+
+
+class FrameQueue:
+    """
+    A blocking queue of dataframes bounded both by number of frames and by their total in-memory size, used to hand prepared
+    batches from the parsing thread to the database writer in DBOperations.stream_data_into_table.
+
+    Parameterized Constructor:
+    ----------
+    maxsize (int): Maximum number of queued frames.
+    max_bytes (int): Maximum total memory of queued frames in bytes, or None for no byte limit.
+    """
+    def __init__(self, maxsize=STREAM_QUEUE_SIZE, max_bytes=None):
+        self.maxsize = max(1, maxsize)
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.bytes = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, frame):
+        """
+        Blocks until the frame fits into the queue. Returns False if the consumer closed the queue in the meantime.
+        A None frame marks the end of the stream.
+        """
+        size = 0 if frame is None else int(frame.memory_usage(deep=True).sum())
+        with self.condition:
+            # An empty queue always admits the frame, so a single batch larger than max_bytes cannot stall the pipeline
+            while self.frames and not self.closed and (
+                len(self.frames) >= self.maxsize or (self.max_bytes and self.bytes + size > self.max_bytes)
+            ):
+                self.condition.wait()
+            if self.closed:
+                return False
+            self.frames.append((frame, size))
+            self.bytes += size
+            self.condition.notify_all()
+            return True
+
+    def get(self):
+        """
+        Blocks until a frame is available and returns it.
+        """
+        with self.condition:
+            while not self.frames:
+                self.condition.wait()
+            frame, size = self.frames.popleft()
+            self.bytes -= size
+            self.condition.notify_all()
+            return frame
+
+    def close(self):
+        """
+        Releases a producer blocked on put, e.g. after the consumer failed.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class ProfiledCursor(psycopg2.extensions.cursor):
+    """
+    A psycopg2 cursor recording every statement and COPY sent to the server as a 'db.round_trip' stage of the profiler, so
+    the report shows how many round trips a load took and how long they waited on the server. Fetching from a regular
+    (client side) cursor reads the buffered result and is not a round trip.
+    """
+    def execute(self, query, vars=None):
+        with profiler.stage('db.round_trip'):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        # psycopg2 runs one statement per parameter set
+        vars_list = list(vars_list)
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            profiler.add_stage('db.round_trip', time.perf_counter() - start, len(vars_list))
+
+    def copy_expert(self, sql, file, size=8192):
+        with profiler.stage('db.round_trip'):
+            return super().copy_expert(sql, file, size)
+
 
 class DBOperations:
     """
@@ -46,40 +230,140 @@ class DBOperations:
                 user= db_params['username'], 
                 password = db_params['password']
             )
-            self.cursor = self.conn.cursor()
+            # Every statement sent through this cursor is counted as a round trip by the profiler
+            self.cursor = self.conn.cursor(cursor_factory=ProfiledCursor)
+            self.weather_data_partitioning = None   # cached by fetch_weather_data_partitioning
+            self.weather_rollup = None              # cached by weather_rollup_exists
+            self.transform_queue = False            # set by ensure_transform_queue
             logging.info('Postgres Database connection and cursor objects initialized')
         except Exception as e:
             self.conn.close()
             raise CustomException(e, sys)
+
+
+    def commit(self):
+        """
+        Commits the current transaction, recording the time it took as the 'db.commit' stage of the profiler.
+        """
+        with profiler.stage('db.commit'):
+            self.conn.commit()
         
 
-    def create_weather_data_table(self):
+    def create_weather_data_table(self, partition_by=None, hash_partitions=0):
         """
         Creates a table named "weather_data" in the PostgreSQL database to store weather data.
 
+        Args:
+            partition_by (str): None for a plain table, or 'year' / 'decade' to create weather_data range partitioned on date.
+                                Partitions are then created during ingestion by ensure_weather_data_partitions. A partitioned
+                                table is keyed on (station_id, date), since a primary key must contain the partition key.
+            hash_partitions (int): When partitioned, split every date range partition further into this many hash partitions
+                                   on station_id. 0 disables sub-partitioning.
+
         Raises:
         -------
         CustomException (exception): Raised when there is an error creating the table.
             
         """
         try:
-            create_table = '''
+            if partition_by is None:
+                create_table = '''
                             CREATE TABLE IF NOT EXISTS weather_data(
                             date DATE NOT NULL,
-                            max_temp INTEGER NOT NULL,
-                            min_temp NUMERIC NOT NULL,
+                            max_temp NUMERIC NULL,
+                            min_temp NUMERIC NULL,
                             precipitation_amt NUMERIC NULL,
                             station_id TEXT NULL,
                             wid TEXT PRIMARY KEY NOT NULL);
+                            CREATE INDEX IF NOT EXISTS weather_data_station_id_date_idx ON weather_data (station_id, date);
+                            ''' + WEATHER_DATA_MIGRATION
+            else:
+                years_per_partition = PARTITION_GRANULARITIES[partition_by]
+                create_table = f'''
+                            CREATE TABLE IF NOT EXISTS weather_data(
+                            date DATE NOT NULL,
+                            max_temp NUMERIC NULL,
+                            min_temp NUMERIC NULL,
+                            precipitation_amt NUMERIC NULL,
+                            station_id TEXT NOT NULL,
+                            wid TEXT NOT NULL,
+                            PRIMARY KEY (station_id, date)) PARTITION BY RANGE (date);
+                            CREATE TABLE IF NOT EXISTS weather_data_partitioning(
+                            years_per_partition INT NOT NULL,
+                            hash_partitions INT NOT NULL);
+                            INSERT INTO weather_data_partitioning
+                            SELECT {years_per_partition}, {int(hash_partitions)} WHERE NOT EXISTS (SELECT 1 FROM weather_data_partitioning);
                             '''
             self.cursor.execute(create_table)
-            self.conn.commit()
-            logging.info("Table created: weather_data")
+            self.ensure_transform_queue()
+            self.commit()
+            self.weather_data_partitioning = None
+            logging.info(f"Table created: weather_data{f' partitioned by {partition_by}' if partition_by else ''}")
         except Exception as e:
             self.conn.close()
             raise CustomException(e, sys)
 
 
+    def fetch_weather_data_partitioning(self):
+        """
+        Returns the partitioning of weather_data as (years_per_partition, hash_partitions), or None for a plain table. The
+        answer is kept for the lifetime of the DBOperations instance.
+        """
+        if self.weather_data_partitioning is None:
+            self.cursor.execute("SELECT to_regclass('weather_data_partitioning') IS NOT NULL;")
+            partitioning = ()
+            if self.cursor.fetchone()[0]:
+                self.cursor.execute("SELECT years_per_partition, hash_partitions FROM weather_data_partitioning;")
+                partitioning = self.cursor.fetchone() or ()
+            self.weather_data_partitioning = partitioning
+        return self.weather_data_partitioning or None
+
+
+    def weather_data_conflict_columns(self):
+        """
+        Returns the key columns of weather_data to upsert on: wid for a plain table, (station_id, date) for a partitioned one.
+        """
+        return ['station_id', 'date'] if self.fetch_weather_data_partitioning() else ['wid']
+
+
+    def table_key_columns(self, table_name):
+        """
+        Returns the key columns a load of the table skips existing records on. The ON CONFLICT clauses name them, so a load
+        into a table without the matching unique constraint fails instead of silently appending duplicates.
+        """
+        if table_name == 'weather_data':
+            return self.weather_data_conflict_columns()
+        return TABLE_KEY_COLUMNS[table_name]
+
+
+    @profiler.timed('db.partitions')
+    def ensure_weather_data_partitions(self, df):
+        """
+        Creates the missing partitions of a partitioned weather_data table for every year present in df, so the records can be
+        loaded. Does nothing for a plain table. Runs in the caller's transaction.
+
+        Args:
+            df (pandas.DataFrame): The weather records about to be loaded, with a date column.
+        """
+        partitioning = self.fetch_weather_data_partitioning()
+        if not partitioning or not len(df):
+            return
+        years_per_partition, hash_partitions = partitioning
+        years = pd.to_datetime(df['date']).dt.year
+        for start in sorted(set((years // years_per_partition * years_per_partition).tolist())):
+            partition = f"weather_data_{'y' if years_per_partition == 1 else 'd'}{start}"
+            sub_partitioning = f" PARTITION BY HASH (station_id)" if hash_partitions else ""
+            self.cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {partition} PARTITION OF weather_data
+                FOR VALUES FROM ('{start}-01-01') TO ('{start + years_per_partition}-01-01'){sub_partitioning};
+                ''')
+            for remainder in range(hash_partitions):
+                self.cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {partition}_h{remainder} PARTITION OF {partition}
+                    FOR VALUES WITH (MODULUS {hash_partitions}, REMAINDER {remainder});
+                    ''')
+
+
     def create_crop_yield_table(self):
         """
         Creates a table named "crop_yield_data" in the PostgreSQL database to store crop yield data.
@@ -92,13 +376,23 @@ class DBOperations:
         try:
             create_table = '''
                             CREATE TABLE IF NOT EXISTS crop_yield_data(
-                            year NUMERIC NOT NULL,
+                            year NUMERIC PRIMARY KEY NOT NULL,
                             crop_grain_yield NUMERIC NOT NULL);
                         '''
             self.cursor.execute(create_table)
-            self.conn.commit()
-            logging.info('Table created: crop_yield_data')
-            print(self.conn)
+            # Tables created by earlier versions have no key: drop the duplicate years repeated loads left and add it
+            self.cursor.execute('''
+                SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'crop_yield_data'::regclass AND contype = 'p');
+                ''')
+            if not self.cursor.fetchone()[0]:
+                self.cursor.execute('''
+                    DELETE FROM crop_yield_data a USING crop_yield_data b WHERE a.year = b.year AND a.ctid > b.ctid;
+                    ''')
+                duplicates = self.cursor.rowcount
+                self.cursor.execute("ALTER TABLE crop_yield_data ADD PRIMARY KEY (year);")
+                logging.info(f'Primary key added to crop_yield_data, {duplicates} duplicate records deleted')
+            self.commit()
+            logging.info(f'Table created: crop_yield_data ({self.conn.dsn})')
         except Exception as e:
             self.conn.close()
             raise CustomException(e, sys)
@@ -117,19 +411,429 @@ class DBOperations:
             create_table = '''
                             CREATE TABLE IF NOT EXISTS weather_data_transformed(
                             years NUMERIC NOT NULL,
-                            station_id TEXT NULL,
-                            avg_min_temp NUMERIC NOT NULL,
-                            avg_max_temp NUMERIC NOT NULL,
-                            total_precipitation_amt NUMERIC NULL);
+                            station_id TEXT NOT NULL,
+                            avg_min_temp NUMERIC NULL,
+                            avg_max_temp NUMERIC NULL,
+                            total_precipitation_amt NUMERIC NULL,
+                            PRIMARY KEY (years, station_id));
+                            -- A station year without any valid temperature has NULL averages
+                            ALTER TABLE weather_data_transformed ALTER COLUMN avg_min_temp DROP NOT NULL, ALTER COLUMN avg_max_temp DROP NOT NULL;
+                            -- Running sums and counts stored by earlier versions were never read
+                            ALTER TABLE weather_data_transformed DROP COLUMN IF EXISTS sum_min_temp, DROP COLUMN IF EXISTS count_min_temp,
+                                DROP COLUMN IF EXISTS sum_max_temp, DROP COLUMN IF EXISTS count_max_temp,
+                                DROP COLUMN IF EXISTS count_precipitation_amt;
                             '''
             self.cursor.execute(create_table)
-            self.conn.commit()
+            # Tables created by earlier versions have no key, so the refresh upsert has nothing to conflict on. Their rows may
+            # be duplicated or computed by former rules: they are deleted, and the next refresh rebuilds the table in full.
+            self.cursor.execute('''
+                SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'weather_data_transformed'::regclass AND contype = 'p');
+                ''')
+            if not self.cursor.fetchone()[0]:
+                self.cursor.execute("DELETE FROM weather_data_transformed;")
+                deleted = self.cursor.rowcount
+                self.cursor.execute('''
+                    ALTER TABLE weather_data_transformed ALTER COLUMN station_id SET NOT NULL, ADD PRIMARY KEY (years, station_id);
+                    ''')
+                logging.info(f'Primary key added to weather_data_transformed, {deleted} records deleted for a full rebuild')
+            self.ensure_transform_queue()
+            self.commit()
             logging.info("Table created: weather_data_transformed")
         except Exception as e:
             self.conn.close()
             raise CustomException(e, sys)
         
     
+    def clean_weather_data_table(self):
+        """
+        Applies the PrepareData validation rules to records loaded before they existed: missing value sentinels and out of
+        range measures become NULL and records left without any measure are deleted. The (station_id, year) groups touched
+        are queued, so the next weather_data_transformed refresh recomputes them, and the weather_rollup cube is rebuilt.
+
+        Returns:
+            count (int): The number of records cleaned or deleted.
+
+        Raises:
+            CustomException: If an error occurs while cleaning the table.
+        """
+        try:
+            invalid = {column: INVALID_MEASURE.format(column=column, missing=MISSING_VALUES[column], low=VALID_RANGES[column][0],
+                                                      high=VALID_RANGES[column][1])
+                       for column in MISSING_VALUES}
+            self.cursor.execute(WEATHER_DATA_MIGRATION)
+            self.ensure_transform_queue()
+            assignments = ", ".join(f"{column} = CASE WHEN {condition} THEN NULL ELSE {column} END" for column, condition in invalid.items())
+            # Queue the groups of the changed records and count them in the same statement
+            queue_groups = '''
+                , queued AS (
+                    INSERT INTO weather_data_transform_queue (years, station_id)
+                    SELECT DISTINCT EXTRACT(YEAR FROM date), station_id FROM changed
+                    ON CONFLICT DO NOTHING)
+                SELECT count(*) FROM changed;
+                '''
+            self.cursor.execute(f'''
+                WITH changed AS (
+                    UPDATE weather_data SET {assignments}
+                    WHERE {' OR '.join(invalid.values())}
+                    RETURNING date, station_id)
+                ''' + queue_groups)
+            cleaned = self.cursor.fetchone()[0]
+            self.cursor.execute('''
+                WITH changed AS (
+                    DELETE FROM weather_data WHERE max_temp IS NULL AND min_temp IS NULL AND precipitation_amt IS NULL
+                    RETURNING date, station_id)
+                ''' + queue_groups)
+            deleted = self.cursor.fetchone()[0]
+            self.refresh_weather_rollup(full=True)
+            self.bump_data_version()
+            self.commit()
+            logging.info(f"Table cleaned: weather_data, {cleaned} records with invalid measures set to NULL and {deleted} empty records deleted")
+            return cleaned + deleted
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
+    def create_transform_queue_table(self):
+        """
+        Creates weather_data_transform_queue in a transaction of its own, so the steps of a pipeline that create weather_data
+        and weather_data_transformed concurrently on other connections do not race to create it.
+
+        Raises:
+        -------
+        CustomException (exception): Raised when there is an error creating the table.
+
+        """
+        try:
+            self.ensure_transform_queue()
+            self.commit()
+            logging.info('Table created: weather_data_transform_queue')
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
+    def ensure_transform_queue(self):
+        """
+        Creates weather_data_transform_queue if it does not exist yet, e.g. in a database created by an earlier version, at most
+        once per DBOperations instance. Runs in the caller's transaction.
+        """
+        if not self.transform_queue:
+            self.cursor.execute(TRANSFORM_QUEUE_TABLE)
+            self.transform_queue = True
+
+
+    @profiler.timed('db.queue_groups')
+    def queue_transform_groups(self, df):
+        """
+        Records the (station_id, year) groups touched by a weather_data load in weather_data_transform_queue, so the next
+        weather_data_transformed refresh only recomputes those groups. When the weather_rollup cube exists the groups are
+        queued for it as well. Runs in the caller's transaction.
+
+        Args:
+            df (pandas.DataFrame): The weather records that were just loaded, with date and station_id columns.
+        """
+        groups = pd.DataFrame({
+            'years': pd.to_datetime(df['date']).dt.year,
+            'station_id': df['station_id'],
+        }).drop_duplicates()
+        if len(groups):
+            self.ensure_transform_queue()
+            groups = list(groups.itertuples(index=False, name=None))
+            queues = ['weather_data_transform_queue'] + (['weather_rollup_queue'] if self.weather_rollup_exists() else [])
+            for queue in queues:
+                execute_values(self.cursor, f'''
+                    INSERT INTO {queue} (years, station_id) VALUES %s ON CONFLICT DO NOTHING;
+                    ''', groups)
+
+
+    def create_weather_rollup_table(self):
+        """
+        Creates the weather_rollup cube: monthly and yearly aggregates of weather_data per station and for all stations
+        together (station_id 'all'). Every row holds the record count and, per measure, the min, max, sum, count of valid values
+        and count of missing values, so means and totals over any set of rows can be combined exactly. The cube is built from
+        the records already loaded and then kept up to date by every weather_data load through weather_rollup_queue.
+
+        Raises:
+        -------
+        CustomException (exception): Raised when there is an error creating or building the table.
+
+        """
+        try:
+            measures = ",\n".join(f'''
+                            min_{m} NUMERIC NULL,
+                            max_{m} NUMERIC NULL,
+                            sum_{m} NUMERIC NULL,
+                            count_{m} BIGINT NOT NULL,
+                            missing_{m} BIGINT NOT NULL''' for m in ROLLUP_MEASURES)
+            self.cursor.execute(f'''
+                            CREATE TABLE IF NOT EXISTS weather_rollup(
+                            grain TEXT NOT NULL CHECK (grain IN ('month', 'year')),
+                            period_start DATE NOT NULL,
+                            station_id TEXT NOT NULL,
+                            record_count BIGINT NOT NULL,{measures},
+                            PRIMARY KEY (grain, station_id, period_start));
+                            CREATE TABLE IF NOT EXISTS weather_rollup_queue(
+                            years NUMERIC NOT NULL,
+                            station_id TEXT NOT NULL,
+                            PRIMARY KEY (years, station_id));
+                            ''')
+            self.weather_rollup = True
+            count = self.refresh_weather_rollup(full=True)
+            self.bump_data_version()
+            self.commit()
+            logging.info(f"Table created: weather_rollup, built from {count} (station_id, year) groups")
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
+    def weather_rollup_exists(self):
+        """
+        Returns whether the weather_rollup cube was created, cached for the lifetime of the connection.
+        """
+        if self.weather_rollup is None:
+            self.cursor.execute("SELECT to_regclass('weather_rollup') IS NOT NULL;")
+            self.weather_rollup = self.cursor.fetchone()[0]
+        return self.weather_rollup
+
+
+    @profiler.timed('db.rollup_refresh')
+    def refresh_weather_rollup(self, full=False):
+        """
+        Brings the weather_rollup cube up to date in the caller's transaction. The (station_id, year) groups queued in
+        weather_rollup_queue are deleted from the cube and recomputed from weather_data with ROLLUP_QUERY, then the all
+        stations rows of the affected years are recombined from the per-station rows. A full refresh, or one on an empty cube,
+        rebuilds every row instead. Does nothing when the cube does not exist.
+
+        Args:
+            full (bool): Rebuild the whole cube rather than the queued groups.
+
+        Returns:
+            count (int): The number of (station_id, year) groups refreshed.
+        """
+        if not self.weather_rollup_exists():
+            return 0
+        columns = ', '.join(f'min_{m}, max_{m}, sum_{m}, count_{m}, missing_{m}' for m in ROLLUP_MEASURES)
+        aggregates = ', '.join(f'MIN({m}), MAX({m}), SUM({m}), COUNT({m}), COUNT(*) - COUNT({m})' for m in ROLLUP_MEASURES)
+        combined = ', '.join(f'MIN(min_{m}), MAX(max_{m}), SUM(sum_{m}), SUM(count_{m}), SUM(missing_{m})' for m in ROLLUP_MEASURES)
+        params = {'all_stations': ALL_STATIONS}
+
+        self.cursor.execute("DELETE FROM weather_rollup_queue RETURNING years::int, station_id;")
+        groups = self.cursor.fetchall()
+        self.cursor.execute("SELECT EXISTS (SELECT 1 FROM weather_rollup);")
+        if full or not self.cursor.fetchone()[0]:
+            self.cursor.execute("TRUNCATE weather_rollup;")
+            self.cursor.execute(ROLLUP_QUERY.format(columns=columns, aggregates=aggregates, source=''))
+            self.cursor.execute(ROLLUP_ALL_STATIONS_QUERY.format(columns=columns, combined=combined, years=''), params)
+            self.cursor.execute("SELECT count(*) FROM weather_rollup WHERE grain = 'year' AND station_id <> %s;", [ALL_STATIONS])
+            return self.cursor.fetchone()[0]
+        if not groups:
+            return 0
+
+        years = sorted({year for year, _ in groups})
+        params.update(years=[year for year, _ in groups], stations=[station_id for _, station_id in groups], all_years=years,
+                      start=f'{years[0]}-01-01', end=f'{years[-1] + 1}-01-01')
+        # The pending groups, plus literal date bounds that let a partitioned weather_data skip the partitions of other years
+        pending = '''
+            JOIN unnest(%(years)s::int[], %(stations)s::text[]) AS p(years, station_id)
+              ON w.station_id = p.station_id AND w.date >= make_date(p.years, 1, 1) AND w.date < make_date(p.years + 1, 1, 1)
+            WHERE w.date >= %(start)s AND w.date < %(end)s
+            '''
+        self.cursor.execute('''
+            DELETE FROM weather_rollup r USING unnest(%(years)s::int[], %(stations)s::text[]) AS p(years, station_id)
+            WHERE r.station_id = p.station_id AND EXTRACT(YEAR FROM r.period_start) = p.years;
+            DELETE FROM weather_rollup WHERE station_id = %(all_stations)s AND EXTRACT(YEAR FROM period_start) = ANY(%(all_years)s);
+            ''', params)
+        self.cursor.execute(ROLLUP_QUERY.format(columns=columns, aggregates=aggregates, source=pending), params)
+        self.cursor.execute(ROLLUP_ALL_STATIONS_QUERY.format(columns=columns, combined=combined,
+                                                             years='AND EXTRACT(YEAR FROM period_start) = ANY(%(all_years)s)'), params)
+        return len(groups)
+
+
+    @profiler.timed('db.transform_refresh')
+    def refresh_weather_data_transformed(self):
+        """
+        Brings weather_data_transformed up to date server-side. If the table is empty the yearly aggregates are built from the
+        whole weather_data table, otherwise only the groups queued in weather_data_transform_queue are recomputed from their
+        records and upserted, and the queued groups without any record left are deleted, so the cost follows the size of the
+        latest ingestion rather than the size of weather_data.
+
+        Returns:
+            count (int): The number of (station_id, year) groups written.
+        """
+        self.ensure_transform_queue()
+        self.cursor.execute("SELECT EXISTS (SELECT 1 FROM weather_data_transformed);")
+        if self.cursor.fetchone()[0]:
+            self.cursor.execute(TRANSFORM_QUERY.format(pending=PENDING_GROUPS, source=PENDING_GROUPS_SOURCE))
+            return self.cursor.rowcount
+
+        self.cursor.execute(TRANSFORM_QUERY.format(pending='', source=''))
+        count = self.cursor.rowcount
+        # Everything queued so far is covered by the full build
+        self.cursor.execute("DELETE FROM weather_data_transform_queue;")
+        return count
+
+
+    def create_data_version_table(self):
+        """
+        Creates the data_version table read by the API response caches, so loads running concurrently on other connections do
+        not race to create it with their first version bump.
+
+        Raises:
+        -------
+        CustomException (exception): Raised when there is an error creating the table.
+
+        """
+        try:
+            self.cursor.execute(DATA_VERSION_TABLE)
+            self.commit()
+            logging.info('Table created: data_version')
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
+    @profiler.timed('db.bump_version')
+    def bump_data_version(self):
+        """
+        Increments the data version stamp in the data_version table. Called inside the transaction of every load, so API
+        response caches keyed by the version are invalidated exactly when the new data becomes visible.
+
+        Returns:
+            version (int): The new data version.
+        """
+        self.cursor.execute(DATA_VERSION_TABLE + '''
+            INSERT INTO data_version (id, version) VALUES (1, 1)
+            ON CONFLICT (id) DO UPDATE SET version = data_version.version + 1, updated_at = now()
+            RETURNING version;
+            ''')
+        return self.cursor.fetchone()[0]
+
+
+    def table_has_rows(self, table_name):
+        """
+        Checks whether the specified table holds at least one record without fetching its contents.
+
+        Args:
+            table_name (str): The name of the table to check.
+
+        Returns:
+            bool: True if the table is not empty.
+        """
+        try:
+            self.cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name});")
+            return self.cursor.fetchone()[0]
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
+    def create_ingestion_manifest_table(self):
+        """
+        Creates a table named "ingestion_manifest" in the PostgreSQL database that records, per weather station file, the size,
+        mtime and content hash it had when it was last ingested, together with the latest record date ingested from it.
+
+        Raises:
+        -------
+        CustomException (exception): Raised when there is an error creating the table.
+            
+        """
+        try:
+            create_table = '''
+                            CREATE TABLE IF NOT EXISTS ingestion_manifest(
+                            file_path TEXT PRIMARY KEY NOT NULL,
+                            size BIGINT NOT NULL,
+                            mtime DOUBLE PRECISION NOT NULL,
+                            content_hash TEXT NOT NULL,
+                            last_ingested_date DATE NULL,
+                            ingested_at TIMESTAMP NOT NULL DEFAULT now());
+                            '''
+            self.cursor.execute(create_table)
+            self.commit()
+            logging.info("Table created: ingestion_manifest")
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
+    def fetch_ingestion_manifest(self):
+        """
+        Fetches the ingestion manifest as a dictionary keyed by station file path.
+
+        Returns:
+            manifest (dict): Maps a file path to a dict with keys size, mtime, content_hash and last_ingested_date.
+        """
+        try:
+            self.cursor.execute("SELECT file_path, size, mtime, content_hash, last_ingested_date FROM ingestion_manifest;")
+            return {
+                file_path: {'size': size, 'mtime': mtime, 'content_hash': content_hash, 'last_ingested_date': last_ingested_date}
+                for file_path, size, mtime, content_hash, last_ingested_date in self.cursor.fetchall()
+            }
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
+    def ingest_weather_data_incremental(self, class_instance, checkpoint_files=None):
+        """
+        Loads only the weather records that are new since the last run into weather_data. Station files unchanged according to
+        the ingestion manifest are skipped, appended files contribute only their new tail, and the resulting delta is upserted
+        through copy_dataframe_into_table. The delta and the manifest update are committed in the same transaction.
+
+        Args:
+            class_instance (object): Object of PrepareData class from data_preparation module.
+            checkpoint_files (int): Commit every this many station files, so an interrupted load resumes after the last
+                                    committed checkpoint; None loads all the files in one transaction.
+
+        Returns:
+            None
+
+        Raises:
+            CustomException: If an error occurs while preparing or inserting data.
+        """
+        try:
+            start_time = datetime.now()
+            self.create_ingestion_manifest_table()
+            manifest = self.fetch_ingestion_manifest()
+            files = sorted(os.listdir(class_instance.weather_data_path))
+            checkpoints = [files[i:i + checkpoint_files] for i in range(0, len(files), checkpoint_files)] if checkpoint_files else [None]
+
+            count = changed = 0
+            for checkpoint, names in enumerate(checkpoints, 1):
+                with profiler.stage('prepare.weather_data'):
+                    df, entries = class_instance.prepare_weather_data_incremental(manifest, names)
+
+                if len(df):
+                    if not is_compact_weather_frame(df):
+                        df.date = df.date.astype(str)   # convert the date column into string data type
+                    self.ensure_weather_data_partitions(df)
+                    count += self.copy_dataframe_into_table(df, 'weather_data', conflict_columns=self.weather_data_conflict_columns())
+                    self.queue_transform_groups(df)
+                    self.refresh_weather_rollup()
+                if entries:
+                    execute_values(self.cursor, '''
+                        INSERT INTO ingestion_manifest (file_path, size, mtime, content_hash, last_ingested_date)
+                        VALUES %s
+                        ON CONFLICT (file_path) DO UPDATE SET size = EXCLUDED.size, mtime = EXCLUDED.mtime,
+                            content_hash = EXCLUDED.content_hash, last_ingested_date = EXCLUDED.last_ingested_date, ingested_at = now();
+                        ''', [(e['file_path'], e['size'], e['mtime'], e['content_hash'], e['last_ingested_date']) for e in entries])
+                    changed += len(entries)
+
+                # Commit the delta together with the manifest so an interrupted run is simply repeated, resuming after the
+                # last committed checkpoint
+                if len(df) or entries or (checkpoint == len(checkpoints) and not changed):
+                    self.bump_data_version()
+                    self.commit()
+                    if len(checkpoints) > 1:
+                        logging.info(f"Incremental ingestion checkpoint {checkpoint}/{len(checkpoints)} committed: {len(entries)} files changed, {count} records ingested so far")
+            end_time = datetime.now()
+            logging.info(f"Incremental ingestion process started at {start_time} and finished at {end_time}, {changed} files changed and a total number of {count} records were ingested. Peak RSS: {peak_rss_mb()} MB")
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
     def fetch_data_table(self, table_name):
         """
         Fetches all records from the specified table and returns the results.
@@ -157,7 +861,187 @@ class DBOperations:
             raise CustomException(e, sys)
 
 
-    def insert_data_into_table(self, class_instance, table_name):
+    @profiler.timed('db.copy')
+    def copy_dataframe_into_table(self, df, table_name, batch_size=COPY_BATCH_SIZE, conflict_columns=None):
+        """
+        Bulk loads a pandas dataframe into the specified table by streaming it through COPY ... FROM STDIN into a temporary
+        staging table and merging the staged rows with a single set-based INSERT ... ON CONFLICT DO NOTHING.
+
+        Args:
+            df (pandas.DataFrame): The prepared dataframe whose columns match the columns of the target table. Compact weather
+                                   dataframes are expanded batch by batch, so the full layout is never held in memory.
+            table_name (str): The name of the table to load data into.
+            batch_size (int): Number of rows written to the staging table per COPY call.
+            conflict_columns (list): Key columns of the target table. When given, existing rows with the same key are updated
+                                     with the staged values (upsert) instead of being skipped on table_key_columns.
+
+        Returns:
+            count (int): The number of records newly inserted into the target table.
+
+        Raises:
+            CustomException: If an error occurs while copying data into the table.
+        """
+        try:
+            columns = expand_weather_frame(df.iloc[:0]).columns
+            column_names = ", ".join(columns.tolist())
+            staging_table = f"{table_name}_staging"
+            # Staging table lives only for the current transaction and mirrors the target table's column types
+            self.cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging_table} (LIKE {table_name}) ON COMMIT DROP;")
+
+            # Stream the dataframe into the staging table in csv formatted batches
+            for start in range(0, len(df), batch_size):
+                with profiler.stage('db.copy_format'):
+                    buffer = io.StringIO()
+                    # Convert dtypes so integral float columns are written without a trailing .0, as in the row by row path
+                    expand_weather_frame(df.iloc[start:start + batch_size]).convert_dtypes().to_csv(buffer, header=False, index=False)
+                    buffer.seek(0)
+                profiler.count('db.bytes_copied', len(buffer.getvalue()))
+                self.cursor.copy_expert(f"COPY {staging_table} ({column_names}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+            # Merge the staged rows into the target table, skipping (or updating) rows whose key already exists
+            on_conflict = f"({', '.join(self.table_key_columns(table_name))}) DO NOTHING"
+            if conflict_columns:
+                updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns if column not in conflict_columns)
+                on_conflict = f"({', '.join(conflict_columns)}) DO UPDATE SET {updates}"
+            self.cursor.execute(f'''
+                INSERT INTO {table_name} ({column_names})
+                SELECT {column_names} FROM {staging_table}
+                ON CONFLICT {on_conflict};
+                ''')
+            count = self.cursor.rowcount
+            # With conflict_columns the updated rows are counted as inserted, as by rowcount
+            profiler.count('db.rows_inserted', count)
+            profiler.count('db.rows_skipped', len(df) - count)
+            # Drop the staging table so the next load in the same transaction starts from an empty one
+            self.cursor.execute(f"DROP TABLE {staging_table};")
+
+            return count
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    @profiler.timed('db.insert_rows')
+    def insert_rows_into_table(self, df, table_name):
+        """
+        Inserts a pandas dataframe into the specified table one row at a time, skipping rows that already exist in the table.
+
+        Args:
+            df (pandas.DataFrame): The prepared dataframe whose columns match the columns of the target table, or a compact
+                                   weather dataframe.
+            table_name (str): The name of the table to insert data into.
+
+        Returns:
+            count (int): The number of records newly inserted into the target table.
+        """
+        count = 0
+        # Convert dtypes of columns to native python dtypes from numpy.dtypes
+        df = expand_weather_frame(df).convert_dtypes()
+        # Define column names for the tables
+        column_names = df.columns.tolist()
+        key_columns = self.table_key_columns(table_name)
+
+        # Loop through rows of Pandas DataFrame and insert into PostgreSQL table
+        for index, row in df.iterrows():
+            # Create a tuple of values to insert, with missing values as NULL
+            values = tuple(None if pd.isna(value) else getattr(value, 'item', lambda: value)() for value in row.values)
+
+            # Check if the row already exists in the database, NULL measures included
+            sql_query = "SELECT EXISTS (SELECT 1 FROM {} WHERE {})".format(table_name, " AND ".join([f"{column} IS NOT DISTINCT FROM %s" for column in column_names]))
+            self.cursor.execute(sql_query, values)
+            result = self.cursor.fetchone()
+
+            # If the row doesn't already exist, insert it unless a record with the same key does
+            if not result[0]:
+                sql_query = "INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}) DO NOTHING".format(
+                    table_name, ", ".join(column_names), ", ".join(["%s"] * len(column_names)), ", ".join(key_columns))
+                self.cursor.execute(sql_query, values)
+                count += self.cursor.rowcount
+
+        profiler.count('db.rows_inserted', count)
+        profiler.count('db.rows_skipped', len(df) - count)
+        return count
+
+
+    def stream_data_into_table(self, class_instance, table_name='weather_data', load_mode='copy', batch_size=None,
+                               queue_size=STREAM_QUEUE_SIZE, max_memory_mb=None):
+        """
+        Streams weather data into the specified table without materializing the whole dataset. A background thread prepares
+        batches with class_instance.stream_weather_data() and hands them over through a bounded FrameQueue, so parsing and
+        database writes overlap and the memory held in flight stays flat regardless of the number of station files.
+
+        Args:
+            class_instance (object): Object of PrepareData class from data_preparation module.
+            table_name (str): The name of the table to insert data into.
+            load_mode (str): 'copy' or 'rows', see insert_data_into_table.
+            batch_size (int): Records per batch, or None to stream one batch per station file.
+            queue_size (int): Maximum number of prepared batches waiting for the database writer.
+            max_memory_mb (float): Ceiling in megabytes on the prepared batches buffered in the queue, or None for no ceiling.
+
+        Returns:
+            None
+
+        Raises:
+            CustomException: If an error occurs while preparing or inserting data.
+        """
+        try:
+            if load_mode not in LOAD_MODES:
+                raise ValueError(f"load_mode must be one of {LOAD_MODES}, got {load_mode}")
+            count = 0
+            batches = 0
+            start_time = datetime.now()
+            frames = FrameQueue(queue_size, int(max_memory_mb * 1024 * 1024) if max_memory_mb else None)
+            producer_errors = []
+
+            def produce():
+                # Prepare batches in the background and stop early if the writer closed the queue
+                try:
+                    for batch in class_instance.stream_weather_data(batch_size):
+                        if not frames.put(batch):
+                            return
+                except Exception as e:
+                    producer_errors.append(e)
+                finally:
+                    frames.put(None)
+
+            producer = threading.Thread(target=produce, name='weather-data-producer', daemon=True)
+            producer.start()
+            try:
+                while True:
+                    # Time the writer spends waiting on the parsing thread
+                    with profiler.stage('db.wait_for_batch'):
+                        df = frames.get()
+                    if df is None:
+                        break
+                    if not is_compact_weather_frame(df):
+                        df.date = df.date.astype(str)   # convert the date column into string data type
+                    if table_name == 'weather_data':
+                        self.ensure_weather_data_partitions(df)
+                    if load_mode == 'copy':
+                        count += self.copy_dataframe_into_table(df, table_name)
+                    else:
+                        count += self.insert_rows_into_table(df, table_name)
+                    if table_name == 'weather_data':
+                        self.queue_transform_groups(df)
+                    batches += 1
+            finally:
+                frames.close()
+                producer.join()
+            if producer_errors:
+                raise producer_errors[0]
+            if table_name == 'weather_data':
+                self.refresh_weather_rollup()
+
+            # Commit changes to the database
+            self.bump_data_version()
+            self.commit()
+            end_time = datetime.now()
+            logging.info(f"Streaming ingestion process started at {start_time} and finished at {end_time}, and a total number of {count} records were ingested in {batches} batches. Peak RSS: {peak_rss_mb()} MB")
+        except Exception as e:
+            self.conn.close()
+            raise CustomException(e, sys)
+
+
+    def insert_data_into_table(self, class_instance, table_name, load_mode='rows'):
         """
         Inserts data into the specified table from a pandas dataframe and logs the results.
 
@@ -169,6 +1053,7 @@ class DBOperations:
                                     For example: prep_data = PrepareData()  {contains the current folder path which contains all the required data}
                                     prep_data.prepare_weather_data()  {that path is passed to this method which then uses this path to read data and prepare the dataframe ultimately}
             table_name (str): The name of the table to insert data into.
+            load_mode (str): 'rows' checks and inserts the dataframe row by row, 'copy' bulk loads it through copy_dataframe_into_table.
 
         Returns:
             None
@@ -177,58 +1062,48 @@ class DBOperations:
             CustomException: If an error occurs while inserting data into the table.
         """
         try:
+            if load_mode not in LOAD_MODES:
+                raise ValueError(f"load_mode must be one of {LOAD_MODES}, got {load_mode}")
+
             # Counter variable to keep track of the number of records ingested.
             count = 0
             # start_time variable to log the ingestion process start time
             start_time = datetime.now()
             
             if table_name == 'weather_data':
-                df = class_instance.prepare_weather_data()  # store the weather dataframe in df
-                df.date = df.date.astype(str)               # convert the date column into string data type
+                with profiler.stage('prepare.weather_data'):
+                    df = class_instance.prepare_weather_data()  # store the weather dataframe in df
+                    if not is_compact_weather_frame(df):
+                        df.date = df.date.astype(str)           # convert the date column into string data type
             elif table_name == 'crop_yield_data':
-                df = class_instance.prepare_crop_data()     # store the crop dataframe in df
+                with profiler.stage('prepare.crop_data'):
+                    df = class_instance.prepare_crop_data()     # store the crop dataframe in df
             elif table_name == 'weather_data_transformed':
-                try:
-                    # Perform statistical transformations on raw weather data and ingest the transformed data into weather_data_transformed table
-                    start_time = datetime.now()
-                    sql_query = f'''
-                        SELECT EXTRACT(YEAR FROM date) as years, station_id, AVG(min_temp) as avg_min_temp, AVG(max_temp) as avg_max_temp, SUM(precipitation_amt) as total_precipitation_amt 
-                        FROM weather_data
-                        WHERE min_temp <> -999.9 OR max_temp <> -999.9 OR precipitation_amt <> -99.99
-                        GROUP BY years, station_id;
-                        '''
-                    df = pd.read_sql(sql_query, con=self.conn)
-                    end_time = datetime.now()
-                    logging.info(f"Data Transformation process started at {start_time} and finished at {end_time}, and a total number of {len(df)} \
-                                records were transformed.")
-                except Exception as e:
-                    raise CustomException(e, sys)
-
-            # Convert dtypes of columns to native python dtypes from numpy.dtypes
-            df = df.convert_dtypes()
-            # Define column names for the tables
-            column_names = df.columns.tolist()
-
-            # Loop through rows of Pandas DataFrame and insert into PostgreSQL table
-            for index, row in df.iterrows():
-                # Create a tuple of values to insert
-                values = tuple(row.values)
-
-                # Check if the row already exists in the database
-                sql_query = "SELECT EXISTS (SELECT 1 FROM {} WHERE {})".format(table_name, " AND ".join([f"{column}=%s" for column in column_names]))
-                self.cursor.execute(sql_query, values)
-                result = self.cursor.fetchone()
+                # Perform statistical transformations on raw weather data server-side, limited to the groups touched since the last refresh
+                count = self.refresh_weather_data_transformed()
+                self.bump_data_version()
+                self.commit()
+                end_time = datetime.now()
+                logging.info(f"Data Transformation process started at {start_time} and finished at {end_time}, and a total number of {count} records were transformed.")
+                return
 
-                # If the row doesn't already exist, insert it
-                if not result[0]:
-                    sql_query = "INSERT INTO {} ({}) VALUES {}".format(table_name, ", ".join(column_names), values)
-                    self.cursor.execute(sql_query)
-                    count += 1
+            if table_name == 'weather_data':
+                self.ensure_weather_data_partitions(df)
+            if load_mode == 'copy':
+                # Bulk load the whole dataframe through a staging table in a handful of round trips
+                count = self.copy_dataframe_into_table(df, table_name)
+            else:
+                # Check and insert the dataframe one row at a time
+                count = self.insert_rows_into_table(df, table_name)
+            if table_name == 'weather_data':
+                self.queue_transform_groups(df)
+                self.refresh_weather_rollup()
 
             # Commit changes to the database
-            self.conn.commit()
+            self.bump_data_version()
+            self.commit()
             end_time = datetime.now()
-            logging.info(f"Ingestion process started at {start_time} and finished at {end_time}, and a total number of {count} records were ingested.")
+            logging.info(f"Ingestion process started at {start_time} and finished at {end_time}, and a total number of {count} records were ingested. Peak RSS: {peak_rss_mb()} MB")
         except Exception as e:
             self.conn.close()
             raise CustomException(e, sys)
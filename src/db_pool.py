@@ -0,0 +1,243 @@
+# Import in-built libraries
+import re, sys, time
+from functools import partial
+# Import threading for the blocking checkout of pooled connections
+import threading
+# Import python library for postgres sql
+import psycopg2
+from psycopg2 import pool, extensions
+
+# Import logging and CustomException from utils module
+from src.utils import logging, CustomException
+
+
+# Statements prepared per pooled connection at most, the default of prepared_statements in the [db_pool] section
+PREPARED_STATEMENTS = 64
+# Values of plan_cache_mode in the [db_pool] section: auto lets Postgres switch a prepared statement to a cached generic plan
+# when it does not look worse than planning every execution; force_generic_plan always reuses the cached plan, which saves
+# the planning of narrow single station lookups but may give a worse plan to broad all-station scans
+PLAN_CACHE_MODES = ('auto', 'force_generic_plan', 'force_custom_plan')
+# psycopg2 placeholders, rewritten to the $n parameters of a server-side prepared statement
+PLACEHOLDER = re.compile(r'%%|%\((\w+)\)s|%s')
+
+
+def prepare_query(query):
+    """
+    Rewrites a query with psycopg2 %s or %(name)s placeholders into the text of a server-side prepared statement.
+
+    Args:
+        query (str): The query, as passed to cursor.execute.
+
+    Returns:
+        tuple: The query with $1, $2, ... parameters, the number of parameters and, for %(name)s placeholders, the param
+        names in parameter order (empty for %s placeholders).
+    """
+    names, count = [], 0
+
+    def number(match):
+        nonlocal count
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if name is None:
+            count += 1
+            return f'${count}'
+        if name not in names:
+            names.append(name)
+        return f'${names.index(name) + 1}'
+
+    text = PLACEHOLDER.sub(number, query)
+    return text, count or len(names), names
+
+
+class PreparedStatementCursor(extensions.cursor):
+    """
+    A cursor running the queries executed with parameters as server-side prepared statements of its connection: the first
+    execution of a query text PREPAREs it, later ones only EXECUTE it with the new values, so Postgres parses and plans the
+    query once per connection instead of once per request. Named (server-side) cursors and queries without parameters are
+    run as usual.
+    """
+    def execute(self, query, vars=None):
+        statement = None
+        if vars is not None and self.name is None:
+            statement = self.connection.prepared_statement(query)
+        if statement is None:
+            return super().execute(query, vars)
+        execute, names = statement
+        try:
+            return super().execute(execute, [vars[name] for name in names] if names else vars)
+        except psycopg2.Error:
+            # e.g. a statement timeout, or the plan of a table that was recreated with other column types. The transaction is
+            # aborted, so the statement is deallocated by the next prepared_statement call and prepared again then.
+            self.connection.discard_statement(query)
+            raise
+
+
+class PreparedStatementConnection(extensions.connection):
+    """
+    A connection whose cursors are PreparedStatementCursors, keeping the statements it prepared. Prepared statements live as
+    long as the session and survive the rollback of ConnectionPool.putconn.
+
+    Parameterized Constructor:
+    ----------
+    max_statements (int): Statements prepared on the server at most, including the failed ones not deallocated yet; further
+                          queries run unprepared.
+    """
+    def __init__(self, *args, max_statements=PREPARED_STATEMENTS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = PreparedStatementCursor
+        self.max_statements = int(max_statements)
+        self.statements = {}    # query -> (EXECUTE text, param names, statement name)
+        self.discarded = []     # names of the statements still prepared on the server but no longer used
+        self.prepared = 0
+
+    def discard_statement(self, query):
+        """
+        Stops using the prepared statement of a query whose execution failed. It is deallocated once the transaction is
+        usable again, since no command runs in an aborted transaction.
+        """
+        statement = self.statements.pop(query, None)
+        if statement is not None:
+            self.discarded.append(statement[2])
+
+    def prepared_statement(self, query):
+        """
+        Returns the EXECUTE text and param names of a query, preparing it on first use, or None once max_statements are prepared.
+        """
+        if self.discarded and self.get_transaction_status() != extensions.TRANSACTION_STATUS_INERROR:
+            with self.cursor() as cur:
+                while self.discarded:
+                    cur.execute(f'DEALLOCATE {self.discarded[-1]}')
+                    self.discarded.pop()
+        statement = self.statements.get(query)
+        if statement is None and len(self.statements) + len(self.discarded) < self.max_statements:
+            text, count, names = prepare_query(query)
+            # Names are never reused, a statement dropped from statements may still exist on the server
+            self.prepared += 1
+            name = f'api_{self.prepared}'
+            with self.cursor() as cur:
+                cur.execute(f'PREPARE {name} AS {text}')
+            statement = self.statements[query] = (f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count else
+                                                  f'EXECUTE {name}', names, name)
+        return statement[:2] if statement is not None else None
+
+
+class ConnectionPool:
+    """
+    A thread safe pool of PostgreSQL connections used by the Flask API. Connections are borrowed per request and returned on
+    teardown; callers block while all connections are in use instead of failing, broken connections are replaced
+    transparently and a connection left in a failed transaction is rolled back before it is handed to the next request.
+
+    Parameterized Constructor:
+    ----------
+    db_params (dict): A dictionary containing database connection parameters like hostname, port, database name, username, and password.
+    minconn (int): Number of connections opened up front.
+    maxconn (int): Maximum number of connections open at the same time.
+    timeout (float): Seconds to wait for a free connection before giving up.
+    health_check_interval (float): Connections idle for longer than this are pinged with SELECT 1 before being handed out.
+    prepared_statements (int): Queries prepared per connection at most, see PreparedStatementCursor; 0 disables prepared
+                               statements.
+    plan_cache_mode (str): plan_cache_mode of the connections, one of PLAN_CACHE_MODES; None keeps the server setting.
+    """
+    def __init__(self, db_params, minconn=1, maxconn=10, timeout=30, health_check_interval=30,
+                 prepared_statements=PREPARED_STATEMENTS, plan_cache_mode=None):
+        self.db_params = db_params
+        self.minconn = int(minconn)
+        self.maxconn = int(maxconn)
+        self.timeout = float(timeout)
+        self.health_check_interval = float(health_check_interval)
+        self.prepared_statements = int(prepared_statements)
+        if plan_cache_mode is not None and plan_cache_mode not in PLAN_CACHE_MODES:
+            raise ValueError(f"plan_cache_mode must be one of {PLAN_CACHE_MODES}, got {plan_cache_mode}")
+        self.plan_cache_mode = plan_cache_mode
+        self.slots = threading.BoundedSemaphore(self.maxconn)
+        self.lock = threading.Lock()
+        self.last_used = {}
+        self.pool = None
+
+    def _get_pool(self):
+        # Create the underlying pool on first use, so the API can start (and recover) while the database is unavailable
+        with self.lock:
+            if self.pool is None or self.pool.closed:
+                self.pool = pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn,
+                    host = self.db_params['hostname'],
+                    port= self.db_params['port'],
+                    database= self.db_params['dbname'],
+                    user= self.db_params['username'],
+                    password = self.db_params['password'],
+                    connection_factory = partial(PreparedStatementConnection, max_statements=self.prepared_statements)
+                                         if self.prepared_statements > 0 else None,
+                    # Set at connection startup, so the rollback of putconn does not undo it
+                    options = f'-c plan_cache_mode={self.plan_cache_mode}' if self.plan_cache_mode else None
+                )
+                logging.info(f'Postgres connection pool initialized with minconn={self.minconn} maxconn={self.maxconn} '
+                             f'prepared_statements={self.prepared_statements} plan_cache_mode={self.plan_cache_mode}')
+            return self.pool
+
+    def _is_healthy(self, conn):
+        if conn.closed or conn.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - self.last_used.get(id(conn), 0) < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Borrows a healthy connection from the pool, blocking for up to timeout seconds while all connections are in use.
+
+        Returns:
+            conn (psycopg2.extensions.connection): A connection that must be handed back with putconn.
+
+        Raises:
+            CustomException: If no connection became available or the database cannot be reached.
+        """
+        if not self.slots.acquire(timeout=self.timeout):
+            raise CustomException(f'No database connection available within {self.timeout} seconds', sys)
+        try:
+            # A broken connection is discarded and replaced; retry once per pooled connection at most
+            for _ in range(self.maxconn + 1):
+                conn = self._get_pool().getconn()
+                if self._is_healthy(conn):
+                    return conn
+                logging.info('Discarding broken pooled Postgres connection')
+                self.last_used.pop(id(conn), None)
+                self.pool.putconn(conn, close=True)
+            raise psycopg2.OperationalError('Could not obtain a healthy database connection')
+        except Exception as e:
+            self.slots.release()
+            raise CustomException(e, sys)
+
+    def putconn(self, conn):
+        """
+        Returns a borrowed connection to the pool, rolling back any open or failed transaction first.
+        """
+        try:
+            close = bool(conn.closed)
+            if not close and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            if close:
+                self.last_used.pop(id(conn), None)
+            else:
+                self.last_used[id(conn)] = time.monotonic()
+            self.pool.putconn(conn, close=close)
+        finally:
+            self.slots.release()
+
+    def closeall(self):
+        """
+        Closes every connection of the pool.
+        """
+        with self.lock:
+            if self.pool is not None and not self.pool.closed:
+                self.pool.closeall()
+            self.last_used.clear()
@@ -0,0 +1,521 @@
+# Import in-built libraries
+import os, sys, re
+# Import threading for the lazily opened shared database of the API
+import threading
+from functools import lru_cache
+# duckdb is optional, it is only needed when the [storage] section of config.ini selects backend = duckdb
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Import classes and methods from profiling and utils module. The validation rules of data_preparation (and pandas with them)
+# are imported by the loading methods, so the API can open its EmbeddedConnectionPool without importing pandas
+from src.profiling import profiler
+from src.utils import logging, CustomException, peak_rss_mb
+# Import datetime
+from datetime import datetime
+
+
+# Database file used when the [storage] section does not set a path
+DEFAULT_PATH = 'weather.duckdb'
+# Records fetched per call while iterating over an EmbeddedCursor, as the itersize of a psycopg2 named cursor
+EMBEDDED_ITERSIZE = 2000
+# Postgres constructs emitted by the shared query builders (src/api_queries.py, src/analytics.py) and their DuckDB
+# equivalents, applied in order. Measures are DOUBLE in DuckDB, so '::text' already renders them as Postgres renders NUMERIC.
+QUERY_REWRITES = [
+    (re.compile(r"to_char\((\w+), 'YYYY-MM-DD'\)"), r"strftime(\1, '%Y-%m-%d')"),
+    (re.compile(r"to_regclass\('(\w+)'\) IS NOT NULL"), r"EXISTS (SELECT 1 FROM information_schema.tables WHERE table_name = '\1')"),
+    # Row values are not coerced from text, so the date of the keyset cursor is cast explicitly
+    (re.compile(r"\(station_id, date\) > \(%s, %s\)"), "(station_id, date) > (%s, CAST(%s AS DATE))"),
+    # Postgres sums NUMERIC exactly; measures have at most two decimals, so summing them as DECIMAL gives the same figures
+    (re.compile(r"\b(AVG|SUM)\((max_temp|min_temp|precipitation_amt)\)"), r"\1(CAST(\2 AS DECIMAL(18, 2)))"),
+    (re.compile(r"%\((\w+)\)s"), r"$\1"),
+    (re.compile(r"%s"), "?"),
+]
+# Tables of the embedded database; measures are DOUBLE since DuckDB has no unconstrained NUMERIC
+EMBEDDED_TABLES = {
+    'weather_data': '''
+        CREATE TABLE IF NOT EXISTS weather_data(
+        date DATE NOT NULL,
+        max_temp DOUBLE NULL,
+        min_temp DOUBLE NULL,
+        precipitation_amt DOUBLE NULL,
+        station_id TEXT NULL,
+        wid TEXT PRIMARY KEY NOT NULL);
+        ''',
+    'crop_yield_data': '''
+        CREATE TABLE IF NOT EXISTS crop_yield_data(
+        year INTEGER PRIMARY KEY NOT NULL,
+        crop_grain_yield DOUBLE NOT NULL);
+        ''',
+    'weather_data_transformed': '''
+        CREATE TABLE IF NOT EXISTS weather_data_transformed(
+        years INTEGER NOT NULL,
+        station_id TEXT NOT NULL,
+        avg_min_temp DOUBLE NULL,
+        avg_max_temp DOUBLE NULL,
+        total_precipitation_amt DOUBLE NULL,
+        PRIMARY KEY (years, station_id));
+        ''',
+    'data_version': '''
+        CREATE TABLE IF NOT EXISTS data_version(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT now());
+        ''',
+    'ingestion_manifest': '''
+        CREATE TABLE IF NOT EXISTS ingestion_manifest(
+        file_path TEXT PRIMARY KEY,
+        size BIGINT NOT NULL,
+        mtime DOUBLE NOT NULL,
+        content_hash TEXT NOT NULL,
+        last_ingested_date DATE NULL,
+        ingested_at TIMESTAMP NOT NULL DEFAULT now());
+        ''',
+}
+# Yearly per-station aggregates of weather_data, rebuilt in a single vectorized scan. Sums and means are computed on DECIMAL
+# values like the NUMERIC ones of Postgres, see QUERY_REWRITES.
+EMBEDDED_TRANSFORM_QUERY = '''
+    INSERT INTO weather_data_transformed (years, station_id, avg_min_temp, avg_max_temp, total_precipitation_amt)
+    SELECT EXTRACT(YEAR FROM date)::INTEGER AS years, station_id, AVG(min_temp), AVG(max_temp), SUM(precipitation_amt)
+    FROM weather_data
+    GROUP BY 1, 2;
+    '''
+
+
+def embedded_available():
+    """
+    Returns True when duckdb is installed and the embedded storage backend can be used.
+    """
+    return duckdb is not None
+
+
+@lru_cache(maxsize=256)
+def translate_query(query):
+    """
+    Rewrites a query of the shared query builders into DuckDB SQL, see QUERY_REWRITES.
+
+    Args:
+        query (str): A query with psycopg2 style %s or %(name)s placeholders.
+
+    Returns:
+        str: The query with ? or $name placeholders and DuckDB functions.
+    """
+    for pattern, replacement in QUERY_REWRITES:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+class EmbeddedCursor:
+    """
+    A psycopg2 style cursor over a DuckDB connection, so the API handlers and the analytics engine run their queries on the
+    embedded database unchanged. Queries are translated with translate_query; iterating fetches itersize rows at a time.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.itersize = EMBEDDED_ITERSIZE
+
+    def execute(self, query, vars=None):
+        self.conn.execute(translate_query(query), vars if vars is not None else [])
+
+    @property
+    def description(self):
+        return self.conn.description
+
+    def fetchone(self):
+        return self.conn.fetchone()
+
+    def fetchmany(self, size=None):
+        return self.conn.fetchmany(size or self.itersize)
+
+    def fetchall(self):
+        return self.conn.fetchall()
+
+    def __iter__(self):
+        while True:
+            rows = self.conn.fetchmany(self.itersize)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EmbeddedConnection:
+    """
+    A borrowed connection of EmbeddedConnectionPool, with the cursor, commit and rollback methods the API uses.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed = False
+
+    def cursor(self, name=None):
+        # Named (server-side) cursors of psycopg2 map to plain cursors, DuckDB results are fetched incrementally anyway
+        return EmbeddedCursor(self.conn)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        if not self.closed:
+            self.conn.close()
+            self.closed = True
+
+
+class EmbeddedConnectionPool:
+    """
+    The ConnectionPool of the API for the embedded backend. The database file is opened once, read only so several API worker
+    processes can share it, and every borrowed connection is a lightweight DuckDB cursor of it, safe to use from its own thread.
+
+    Parameterized Constructor:
+    ----------
+    path (str): Path of the DuckDB database file.
+    read_only (bool): Open the database read only. Defaults to True.
+    """
+    def __init__(self, path=DEFAULT_PATH, read_only=True, **pool_params):
+        self.path = path
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        self.db = None
+
+    def _get_db(self):
+        # Open the database on first use, as ConnectionPool does, so the API can start before the file exists
+        with self.lock:
+            if self.db is None:
+                if duckdb is None:
+                    raise ImportError('duckdb is required for the duckdb storage backend')
+                self.db = duckdb.connect(self.path, read_only=self.read_only)
+                logging.info(f'DuckDB database {self.path} opened{" read only" if self.read_only else ""}')
+            return self.db
+
+    def getconn(self):
+        """
+        Returns a connection that must be handed back with putconn.
+
+        Raises:
+            CustomException: If the database cannot be opened.
+        """
+        try:
+            return EmbeddedConnection(self._get_db().cursor())
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def putconn(self, conn):
+        conn.close()
+
+    def closeall(self):
+        """
+        Closes the database.
+        """
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+class DuckDBOperations:
+    """
+    The embedded counterpart of DBOperations, storing the tables in a DuckDB file instead of a Postgres server. Prepared
+    dataframes are scanned in place by the columnar engine, without CSV serialization or round trips, and the yearly
+    aggregates of weather_data_transformed are rebuilt with one vectorized GROUP BY. It implements the DBOperations methods
+    used by data_model.py; Postgres specific features (partitioning, the weather_rollup cube) are not available.
+
+    Parameterized Constructor:
+    ----------
+    storage_params (dict): The [storage] section of config.ini, path is the database file (DEFAULT_PATH if not set).
+    """
+    def __init__(self, storage_params):
+        try:
+            if duckdb is None:
+                raise ImportError('duckdb is required for the duckdb storage backend')
+            self.path = storage_params.get('path', DEFAULT_PATH)
+            self.conn = duckdb.connect(self.path)
+            self.weather_rollup = False
+            logging.info(f'DuckDB database {self.path} opened')
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    def commit(self):
+        """
+        Commits the current transaction, recording the time it took as the 'db.commit' stage of the profiler.
+        """
+        with profiler.stage('db.commit'):
+            self.conn.commit()
+
+
+    def rollback(self):
+        # Errors raised before the transaction was opened leave nothing to roll back
+        try:
+            self.conn.rollback()
+        except duckdb.TransactionException:
+            pass
+
+
+    def create_table(self, table_name):
+        try:
+            self.conn.execute(EMBEDDED_TABLES[table_name])
+            logging.info(f"Table created: {table_name} in {self.path}")
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    def create_weather_data_table(self, partition_by=None, hash_partitions=0):
+        """
+        Creates the weather_data table. The embedded database is not partitioned, partition_by and hash_partitions are ignored.
+        """
+        if partition_by:
+            logging.info(f'partition_by={partition_by} ignored by the duckdb storage backend')
+        self.create_table('weather_data')
+
+
+    def create_crop_yield_table(self):
+        """
+        Creates the crop_yield_data table.
+        """
+        self.create_table('crop_yield_data')
+
+
+    def create_weather_data_transformed_table(self):
+        """
+        Creates the weather_data_transformed table.
+        """
+        self.create_table('weather_data_transformed')
+
+
+    def create_data_version_table(self):
+        """
+        Creates the data_version table read by the API response cache.
+        """
+        self.create_table('data_version')
+
+
+    def create_transform_queue_table(self):
+        """
+        Nothing to create: the embedded backend rebuilds weather_data_transformed in full instead of queuing groups.
+        """
+
+
+    def create_weather_rollup_table(self):
+        """
+        Not available on the embedded backend, whose yearly and monthly aggregates are computed from weather_data on demand.
+        """
+        try:
+            raise ValueError('weather_rollup requires the postgres storage backend')
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    def weather_rollup_exists(self):
+        return False
+
+
+    def clean_weather_data_table(self):
+        """
+        Sets missing and out of range measures stored in weather_data to NULL and deletes records without any valid measure,
+        see DBOperations.clean_weather_data_table.
+        """
+        from src.data_preparation import MISSING_VALUES, VALID_RANGES
+        try:
+            for column, missing in MISSING_VALUES.items():
+                low, high = VALID_RANGES[column]
+                self.conn.execute(f"UPDATE weather_data SET {column} = NULL WHERE {column} = ? OR {column} < ? OR {column} > ?",
+                                  [missing, low, high])
+            deleted = self.conn.execute('''
+                DELETE FROM weather_data WHERE max_temp IS NULL AND min_temp IS NULL AND precipitation_amt IS NULL;
+                ''').fetchone()[0]
+            self.bump_data_version()
+            logging.info(f"Table cleaned: weather_data, {deleted} empty records deleted")
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    def table_has_rows(self, table_name):
+        """
+        Checks if the specified table has any rows.
+        """
+        try:
+            return self.conn.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name});").fetchone()[0]
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    def fetch_data_table(self, table_name):
+        """
+        Fetches all records from the specified table and returns them as a list of tuples.
+        """
+        try:
+            results = self.conn.execute(f"SELECT * FROM {table_name};").fetchall()
+            logging.info(f"Fetch finished: {len(results)} records from {table_name}")
+            return results
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+    def bump_data_version(self):
+        """
+        Increments the data version stamp read by the API response cache, see DBOperations.bump_data_version.
+        """
+        with profiler.stage('db.bump_version'):
+            self.conn.execute(EMBEDDED_TABLES['data_version'])
+            return self.conn.execute('''
+                INSERT INTO data_version (id, version) VALUES (1, 1)
+                ON CONFLICT (id) DO UPDATE SET version = data_version.version + 1, updated_at = now()
+                RETURNING version;
+                ''').fetchone()[0]
+
+
+    def weather_frame_select(self, df):
+        """
+        Returns the SELECT list that reads a prepared weather dataframe registered as 'frame' in the layout of weather_data.
+        Compact dataframes are converted in the engine: measures rounded back to their decimals and the wid key derived.
+        """
+        from src.data_preparation import is_compact_weather_frame, MEASURE_DECIMALS
+        if not is_compact_weather_frame(df):
+            return "CAST(date AS DATE), max_temp, min_temp, precipitation_amt, station_id, wid"
+        measures = ', '.join(f"round(CAST({name} AS DOUBLE), {decimals})" for name, decimals in MEASURE_DECIMALS.items())
+        return (f"CAST(date AS DATE), {measures}, CAST(station_id AS VARCHAR), "
+                f"CAST(station_id AS VARCHAR) || '_' || strftime(CAST(date AS DATE), '%Y-%m-%d')")
+
+
+    def insert_frame(self, df, table_name, upsert=False):
+        """
+        Inserts a prepared dataframe into the specified table, scanning it in place. Rows whose key already exists are skipped,
+        or replaced when upsert is True.
+
+        Returns:
+            count (int): The number of records inserted (or replaced) into the table.
+        """
+        with profiler.stage('db.insert_frame'):
+            select = self.weather_frame_select(df) if table_name == 'weather_data' else '*'
+            self.conn.register('frame', df)
+            try:
+                verb = "INSERT OR REPLACE INTO" if upsert else "INSERT OR IGNORE INTO"
+                count = self.conn.execute(f"{verb} {table_name} SELECT {select} FROM frame;").fetchone()[0]
+            finally:
+                self.conn.unregister('frame')
+        profiler.count('db.rows_inserted', count)
+        profiler.count('db.rows_skipped', len(df) - count)
+        return count
+
+
+    def refresh_weather_data_transformed(self):
+        """
+        Rebuilds weather_data_transformed from the whole weather_data table; the columnar scan makes a full rebuild cheaper
+        than tracking the changed groups.
+
+        Returns:
+            count (int): The number of (station_id, year) groups written.
+        """
+        with profiler.stage('db.transform_refresh'):
+            self.conn.execute("DELETE FROM weather_data_transformed;")
+            return self.conn.execute(translate_query(EMBEDDED_TRANSFORM_QUERY)).fetchone()[0]
+
+
+    def insert_data_into_table(self, class_instance, table_name, load_mode='rows'):
+        """
+        Inserts data into the specified table from a pandas dataframe and logs the results, see
+        DBOperations.insert_data_into_table. Both load modes take the same in-process bulk path.
+
+        Args:
+            class_instance (object): Object of PrepareData class from data_preparation module.
+            table_name (str): The name of the table to insert data into.
+            load_mode (str): Accepted for compatibility with DBOperations.
+
+        Raises:
+            CustomException: If an error occurs while inserting data into the table.
+        """
+        try:
+            start_time = datetime.now()
+            self.conn.begin()
+            if table_name == 'weather_data_transformed':
+                count = self.refresh_weather_data_transformed()
+                self.bump_data_version()
+                self.commit()
+                logging.info(f"Data Transformation process started at {start_time} and finished at {datetime.now()}, and a total number of {count} records were transformed.")
+                return
+
+            if table_name == 'weather_data':
+                with profiler.stage('prepare.weather_data'):
+                    df = class_instance.prepare_weather_data()
+            else:
+                with profiler.stage('prepare.crop_data'):
+                    df = class_instance.prepare_crop_data()
+            count = self.insert_frame(df, table_name)
+            self.bump_data_version()
+            self.commit()
+            logging.info(f"Ingestion process started at {start_time} and finished at {datetime.now()}, and a total number of {count} records were ingested. Peak RSS: {peak_rss_mb()} MB")
+        except Exception as e:
+            self.rollback()
+            raise CustomException(e, sys)
+
+
+    def stream_data_into_table(self, class_instance, table_name='weather_data', load_mode='copy', batch_size=None,
+                               max_memory_mb=None, **kwargs):
+        """
+        Streams weather data into the specified table batch by batch, see DBOperations.stream_data_into_table. Batches are
+        written as soon as they are prepared, so at most one batch is held in memory and max_memory_mb is not needed.
+        """
+        try:
+            start_time = datetime.now()
+            count = batches = 0
+            self.conn.begin()
+            for df in class_instance.stream_weather_data(batch_size):
+                count += self.insert_frame(df, table_name)
+                batches += 1
+            self.bump_data_version()
+            self.commit()
+            logging.info(f"Streaming ingestion process started at {start_time} and finished at {datetime.now()}, and a total number of {count} records were ingested in {batches} batches. Peak RSS: {peak_rss_mb()} MB")
+        except Exception as e:
+            self.rollback()
+            raise CustomException(e, sys)
+
+
+    def ingest_weather_data_incremental(self, class_instance, checkpoint_files=None):
+        """
+        Loads only the weather records that are new since the last run, tracked in the ingestion_manifest table, see
+        DBOperations.ingest_weather_data_incremental. The delta and the manifest update are committed together, every
+        checkpoint_files station files if set.
+        """
+        try:
+            start_time = datetime.now()
+            self.create_table('ingestion_manifest')
+            manifest = {row[0]: dict(zip(('size', 'mtime', 'content_hash', 'last_ingested_date'), row[1:]))
+                        for row in self.conn.execute("SELECT file_path, size, mtime, content_hash, last_ingested_date FROM ingestion_manifest;").fetchall()}
+            files = sorted(os.listdir(class_instance.weather_data_path))
+            checkpoints = [files[i:i + checkpoint_files] for i in range(0, len(files), checkpoint_files)] if checkpoint_files else [None]
+
+            count = changed = 0
+            for checkpoint, names in enumerate(checkpoints, 1):
+                with profiler.stage('prepare.weather_data'):
+                    df, entries = class_instance.prepare_weather_data_incremental(manifest, names)
+                if not (len(df) or entries or (checkpoint == len(checkpoints) and not changed)):
+                    continue
+
+                self.conn.begin()
+                count += self.insert_frame(df, 'weather_data', upsert=True) if len(df) else 0
+                if entries:
+                    self.conn.executemany('''
+                        INSERT OR REPLACE INTO ingestion_manifest (file_path, size, mtime, content_hash, last_ingested_date, ingested_at)
+                        VALUES (?, ?, ?, ?, ?, now());
+                        ''', [[e['file_path'], e['size'], e['mtime'], e['content_hash'], e['last_ingested_date']] for e in entries])
+                    changed += len(entries)
+                self.bump_data_version()
+                self.commit()
+                if len(checkpoints) > 1:
+                    logging.info(f"Incremental ingestion checkpoint {checkpoint}/{len(checkpoints)} committed: {len(entries)} files changed, {count} records ingested so far")
+            logging.info(f"Incremental ingestion process started at {start_time} and finished at {datetime.now()}, {changed} files changed and a total number of {count} records were ingested. Peak RSS: {peak_rss_mb()} MB")
+        except Exception as e:
+            self.rollback()
+            raise CustomException(e, sys)
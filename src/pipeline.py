@@ -0,0 +1,167 @@
+# Import in-built libraries
+import sys, time
+# Import the thread pool running independent steps concurrently
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+# Import logging and CustomException from utils module, and the shared profiler
+from src.utils import logging, CustomException
+from src.profiling import profiler
+
+
+# Station files committed per checkpoint of the weather_data load
+CHECKPOINT_FILES = 25
+# Steps running at the same time, each on its own database connection
+PIPELINE_WORKERS = 2
+
+
+class Pipeline:
+    """
+    Runs ETL steps as a DAG. A step starts as soon as every step it requires has finished, and steps that do not depend on
+    each other run concurrently in a pool of threads. When a step fails no further step is started, the running ones are
+    waited for and the failure is raised; steps are idempotent, so running the pipeline again resumes the work.
+
+    Parameterized Constructor:
+    ----------
+    workers (int): Maximum number of steps running at the same time.
+
+    Methods
+    -------
+    add(name, func, requires) -> Adds a step calling func() once the steps named in requires have finished.
+    run() -> Runs every step and returns the seconds each one took.
+    """
+    def __init__(self, workers=PIPELINE_WORKERS):
+        self.workers = max(1, int(workers))
+        self.steps = {}     # name -> (func, requires)
+
+    def add(self, name, func, requires=()):
+        self.steps[name] = (func, tuple(requires))
+        return self
+
+    def order(self):
+        """
+        Returns the step names in an order where every step follows the steps it requires.
+
+        Raises:
+            CustomException: If a step requires an unknown step or the steps form a cycle.
+        """
+        try:
+            ordered, visiting = [], set()
+
+            def visit(name, path):
+                if name not in self.steps:
+                    raise ValueError(f"step {path[-1]} requires unknown step {name}")
+                if name in ordered:
+                    return
+                if name in visiting:
+                    raise ValueError(f"steps form a cycle: {' -> '.join(path + [name])}")
+                visiting.add(name)
+                for required in self.steps[name][1]:
+                    visit(required, path + [name])
+                ordered.append(name)
+
+            for name in self.steps:
+                visit(name, [])
+            return ordered
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def run_step(self, name):
+        start = time.perf_counter()
+        logging.info(f"Pipeline step {name} started")
+        with profiler.stage(f'pipeline.{name}'):
+            self.steps[name][0]()
+        seconds = time.perf_counter() - start
+        logging.info(f"Pipeline step {name} finished in {seconds:.2f} seconds")
+        return seconds
+
+    def run(self):
+        """
+        Runs every step, each as soon as the steps it requires have finished.
+
+        Returns:
+            timings (dict): Maps each step name to the seconds it took, in the order the steps finished.
+
+        Raises:
+            CustomException: If a step failed; steps already running are completed first and later steps are not started.
+        """
+        pending = self.order()
+        timings, running, failures = {}, {}, []
+        start_time = datetime.now()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pipeline') as executor:
+            while pending or running:
+                # Start the steps whose requirements are met, as long as nothing failed
+                if not failures:
+                    for name in [name for name in pending if all(required in timings for required in self.steps[name][1])]:
+                        pending.remove(name)
+                        running[executor.submit(self.run_step, name)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        timings[name] = future.result()
+                    except Exception as e:
+                        logging.info(f"Pipeline step {name} failed: {e}")
+                        failures.append((name, e))
+
+        if failures:
+            name, error = failures[0]
+            skipped = f", not started: {', '.join(pending)}" if pending else ''
+            try:
+                raise RuntimeError(f"pipeline step {name} failed{skipped}. Run the pipeline again to resume: {error}")
+            except Exception as e:
+                raise CustomException(e, sys)
+        logging.info(f"Pipeline started at {start_time} and finished at {datetime.now()}: " +
+                     ', '.join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+        return timings
+
+
+def build_etl_pipeline(db_operations_factory, prep_data_factory, load_mode='copy', checkpoint_files=CHECKPOINT_FILES,
+                       partition_by=None, hash_partitions=0, workers=PIPELINE_WORKERS):
+    """
+    Builds the pipeline of the whole ETL: the tables are created, weather_data and crop_yield_data are loaded concurrently,
+    and weather_data_transformed is refreshed as soon as weather_data is loaded.
+
+    Every step opens its own DBOperations and is idempotent, so an interrupted run is resumed by running it again: tables
+    are created if they do not exist, weather_data is loaded incrementally and committed every checkpoint_files station
+    files (files committed before are skipped through the ingestion manifest), crop_yield_data rows that already exist are
+    skipped, and the transform refreshes the (station, year) groups queued by the loads.
+
+    Args:
+        db_operations_factory (callable): Returns a new DBOperations (or DuckDBOperations) with its own connection.
+        prep_data_factory (callable): Returns a new PrepareData of the data folder.
+        load_mode (str): Load mode of crop_yield_data, see DBOperations.insert_data_into_table.
+        checkpoint_files (int): Station files committed per checkpoint of the weather_data load.
+        partition_by (str): Partitioning of a newly created weather_data table, see DBOperations.create_weather_data_table.
+        hash_partitions (int): Hash sub-partitions of a newly created partitioned weather_data table.
+        workers (int): Maximum number of steps running at the same time.
+
+    Returns:
+        Pipeline: The pipeline, started with run().
+    """
+    def step(method):
+        # Every step runs on a connection of its own, closed once the step is over
+        def run():
+            db_operations = db_operations_factory()
+            try:
+                method(db_operations)
+            finally:
+                db_operations.conn.close()
+        return run
+
+    return (Pipeline(workers)
+        .add('create_data_version', step(lambda ops: ops.create_data_version_table()))
+        .add('create_transform_queue', step(lambda ops: ops.create_transform_queue_table()))
+        .add('create_weather_data', step(lambda ops: ops.create_weather_data_table(partition_by, hash_partitions)),
+             requires=['create_transform_queue'])
+        .add('create_crop_yield_data', step(lambda ops: ops.create_crop_yield_table()))
+        .add('create_weather_data_transformed', step(lambda ops: ops.create_weather_data_transformed_table()),
+             requires=['create_transform_queue'])
+        .add('load_weather_data', step(lambda ops: ops.ingest_weather_data_incremental(prep_data_factory(), checkpoint_files)),
+             requires=['create_data_version', 'create_transform_queue', 'create_weather_data'])
+        .add('load_crop_yield_data', step(lambda ops: ops.insert_data_into_table(prep_data_factory(), 'crop_yield_data', load_mode)),
+             requires=['create_data_version', 'create_crop_yield_data'])
+        .add('transform_weather_data', step(lambda ops: ops.insert_data_into_table(None, 'weather_data_transformed')),
+             requires=['load_weather_data', 'create_weather_data_transformed']))
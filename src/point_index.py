@@ -0,0 +1,169 @@
+# Import in-built libraries
+import sys
+from datetime import date as Date
+# Import data manipulation libraries
+import numpy as np
+
+from src.utils import logging, CustomException
+
+
+# Measures of the index, in the order of its last axis, with the decimals they are recorded with (MEASURE_DECIMALS of
+# src/station_cache.py, not imported to keep pandas out of the API)
+POINT_MEASURES = {'max_temp': 1, 'min_temp': 1, 'precipitation_amt': 2}
+# Day numbers of the index count from this date
+EPOCH = Date(1970, 1, 1)
+# One row per station with its days and measures as comma separated text, ordered by date: a few hundred rows of long strings
+# transfer and parse far faster than a row per record. Missing measures are sent as nan. Records without a station_id (allowed
+# by a plain weather_data table) cannot be looked up and are left out.
+POINT_INDEX_QUERY = '''
+    SELECT station_id,
+           string_agg((date - DATE '1970-01-01')::text, ',' ORDER BY date),
+           string_agg(coalesce(max_temp::text, 'nan'), ',' ORDER BY date),
+           string_agg(coalesce(min_temp::text, 'nan'), ',' ORDER BY date),
+           string_agg(coalesce(precipitation_amt::text, 'nan'), ',' ORDER BY date)
+    FROM weather_data
+    WHERE station_id IS NOT NULL
+    GROUP BY station_id
+    '''
+
+
+def day_number(value):
+    """
+    Converts a YYYY-MM-DD date string into the day number of the index.
+
+    Raises:
+        ValueError: If the date is not a valid YYYY-MM-DD date.
+    """
+    # fromisoformat is an order of magnitude faster than strptime; the length check rejects its other ISO 8601 forms
+    if not isinstance(value, str) or len(value) != 10 or value[4] != '-':
+        raise ValueError(f"date must be a YYYY-MM-DD date, got {value}")
+    try:
+        return Date.fromisoformat(value).toordinal() - EPOCH.toordinal()
+    except ValueError:
+        raise ValueError(f"date must be a YYYY-MM-DD date, got {value}")
+
+
+class WeatherPointIndex:
+    """
+    In-memory index of the weather records for "one station, one day" and "all stations on one date" lookups. Measures are
+    held in a dense float32 NumPy array indexed [station ordinal, day number - first day, measure], so a lookup is a dict
+    access and an array read instead of a database round trip. Missing measures are NaN; days without a record are flagged
+    in a boolean array of the same [station, day] shape.
+
+    Parameters:
+    ----------
+    station_ids (numpy.ndarray): Sorted station ids of the first axis.
+    first_day (int): Day number of the first position of the second axis.
+    measures (numpy.ndarray): float32 measures in POINT_MEASURES order, shape (stations, days, 3).
+    present (numpy.ndarray): Whether a record exists, shape (stations, days).
+    """
+    def __init__(self, station_ids, first_day, measures, present):
+        self.station_ids = station_ids
+        self.station_names = station_ids.tolist()
+        self.station_position = {station_id: position for position, station_id in enumerate(self.station_names)}
+        self.first_day = int(first_day)
+        self.measures = measures
+        self.present = present
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds the index from the rows of POINT_INDEX_QUERY, one per station, written straight into the dense arrays.
+        """
+        stations = sorted((station_id, np.fromstring(days, sep=',', dtype=np.int64), measures)
+                          for station_id, days, *measures in rows)
+        first_day = min((days[0] for _, days, _ in stations if len(days)), default=0)
+        span = max((int(days[-1]) - first_day + 1 for _, days, _ in stations if len(days)), default=0)
+        measures = np.full((len(stations), span, len(POINT_MEASURES)), np.nan, dtype=np.float32)
+        present = np.zeros((len(stations), span), dtype=bool)
+        for position, (_, days, columns) in enumerate(stations):
+            for axis, column in enumerate(columns):
+                measures[position, days - first_day, axis] = np.fromstring(column, sep=',', dtype=np.float32)
+            present[position, days - first_day] = True
+        return cls(np.array([station_id for station_id, _, _ in stations], dtype=str), first_day, measures, present)
+
+    @classmethod
+    def fetch(cls, cursor):
+        """
+        Loads the index from every record of weather_data.
+
+        Args:
+            cursor: A database cursor.
+
+        Returns:
+            WeatherPointIndex: The index of every station and day in the database.
+        """
+        try:
+            cursor.execute(POINT_INDEX_QUERY)
+            index = cls.from_rows(cursor.fetchall())
+            logging.info(f"Weather point index loaded: {len(index.station_ids)} stations x {index.present.shape[1]} days, "
+                         f"{int(index.present.sum())} records, {index.nbytes / 1e6:.1f} MB")
+            return index
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @property
+    def nbytes(self):
+        return self.measures.nbytes + self.present.nbytes
+
+    def records(self, positions, day):
+        """
+        Returns the records of the stations at the given positions on a day (relative to first_day), in the layout of the
+        /api/weather records with the measures as numbers.
+        """
+        date = Date.fromordinal(EPOCH.toordinal() + self.first_day + day).isoformat()
+        # float32 values are rounded back to their recorded decimals, e.g. 12.199999809 -> 12.2; NaN becomes null
+        values = self.measures[positions, day].astype(np.float64)
+        columns = [[None if value != value else value for value in np.round(values[:, axis], decimals).tolist()]
+                   for axis, decimals in enumerate(POINT_MEASURES.values())]
+        return [
+            {'date': date, 'max_temp': max_temp, 'min_temp': min_temp, 'precipitation_amt': precipitation_amt,
+             'station_id': self.station_names[position], 'wid': f'{self.station_names[position]}_{date}'}
+            for position, max_temp, min_temp, precipitation_amt in zip(positions, *columns)
+        ]
+
+    def lookup(self, station_id, date):
+        """
+        Returns the record of one station on one day.
+
+        Args:
+            station_id (str): The station id.
+            date (str): The day as YYYY-MM-DD.
+
+        Returns:
+            dict: The record, or None if the station has no record that day.
+
+        Raises:
+            ValueError: If the date is not a valid YYYY-MM-DD date.
+        """
+        position = self.station_position.get(station_id)
+        day = day_number(date) - self.first_day
+        if position is None or not 0 <= day < self.present.shape[1] or not self.present[position, day]:
+            return None
+        date = Date.fromordinal(EPOCH.toordinal() + self.first_day + day).isoformat()
+        max_temp, min_temp, precipitation_amt = (None if value != value else round(value, decimals)
+                                                 for value, decimals in zip(self.measures[position, day].tolist(), POINT_MEASURES.values()))
+        return {'date': date, 'max_temp': max_temp, 'min_temp': min_temp, 'precipitation_amt': precipitation_amt,
+                'station_id': station_id, 'wid': f'{station_id}_{date}'}
+
+    def day_slice(self, date, station_ids=None):
+        """
+        Returns the records of every station (or of the given stations) on one day, ordered by station id.
+
+        Args:
+            date (str): The day as YYYY-MM-DD.
+            station_ids (list): The stations to return, None for every station.
+
+        Returns:
+            list: The records, empty if no station has a record that day.
+
+        Raises:
+            ValueError: If the date is not a valid YYYY-MM-DD date.
+        """
+        day = day_number(date) - self.first_day
+        if not 0 <= day < self.present.shape[1]:
+            return []
+        present = self.present[:, day]
+        if station_ids is not None:
+            present = present & np.isin(self.station_ids, station_ids)
+        return self.records(np.flatnonzero(present), day)
@@ -0,0 +1,257 @@
+# Import in-built libraries
+import os, sys, json, time, threading, functools
+# Import deterministic profiler and its statistics reader for the optional cProfile capture
+import cProfile, pstats
+from contextlib import contextmanager
+from collections import Counter
+from datetime import datetime
+
+# Import log file location, logging and peak_rss_mb from utils module
+from src.utils import LOG_FILE_PATH, logging, peak_rss_mb, CustomException
+
+
+# Capture modes accepted by Profiler.capture (and the --profile flag of data_model.py)
+CAPTURE_MODES = ('cprofile', 'sample')
+# Number of functions listed in the report by the cProfile and sampling captures
+TOP_FUNCTIONS = 25
+# Seconds between two stack samples of the sampling capture
+SAMPLE_INTERVAL = 0.005
+
+
+def report_path(suffix='.profile.json'):
+    """
+    Returns the path of a report written next to the log file of this run, e.g. logs/<run>.log/<run>.profile.json
+    """
+    return os.path.splitext(LOG_FILE_PATH)[0] + suffix
+
+
+class StackSampler:
+    """
+    A low overhead sampling profiler: a daemon thread takes a snapshot of the stack of every other thread at a fixed interval
+    and counts the functions found at the top of the stacks (self) and anywhere on them (cumulative).
+
+    Parameterized Constructor:
+    ----------
+    interval (float): Seconds between two samples.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.own = Counter()
+        self.cumulative = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+
+    def run(self):
+        ident = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == ident:
+                    continue
+                self.samples += 1
+                self.own[self.function(frame)] += 1
+                # Recursive functions are counted once per sample
+                seen = set()
+                while frame is not None:
+                    seen.add(self.function(frame))
+                    frame = frame.f_back
+                self.cumulative.update(seen)
+
+    @staticmethod
+    def function(frame):
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def top(self, limit=TOP_FUNCTIONS):
+        """
+        Returns the sampled functions with the most cumulative samples, with the share of samples spent in and under them.
+        """
+        total = self.samples or 1
+        return {
+            'mode': 'sample',
+            'interval_seconds': self.interval,
+            'samples': self.samples,
+            'functions': [{'function': function, 'cumulative_share': round(count / total, 4),
+                           'self_share': round(self.own[function] / total, 4)}
+                          for function, count in self.cumulative.most_common(limit)],
+        }
+
+
+class Profiler:
+    """
+    Collects per-stage timers and counters of an ingestion run. PrepareData and DBOperations record into the module level
+    profiler instance, data_model.py writes it as a JSON report next to the log file once the run is over.
+
+    Stages measure wall time and number of calls; stages running in parallel (the parsing thread of a streamed load, or
+    the worker processes of a parallel parse) overlap, so their seconds may add up to more than the run took.
+
+    Methods
+    -------
+    stage(name) -> Context manager adding the time spent inside it to the named stage.
+    timed(name) -> Decorator recording every call of a function as the named stage.
+    count(name, value) -> Adds value to the named counter.
+    capture(mode) -> Context manager running the block under cProfile or the stack sampler.
+    snapshot() / since(snapshot) / merge(snapshot) -> Exports the stages and counters (all, or those recorded after an earlier
+                                                     snapshot, e.g. by a worker process) and adds them to this profiler.
+    write_report(path) -> Writes the stages, counters and capture results as JSON.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.stages = {}    # name -> {'seconds': float, 'calls': int}
+        self.counters = {}  # name -> int
+        self.capture_result = None
+
+    def reset(self):
+        with self.lock:
+            self.started_at = datetime.now()
+            self.stages = {}
+            self.counters = {}
+            self.capture_result = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """
+        Decorator recording every call of the decorated function as the named stage.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_stage(self, name, seconds, calls=1):
+        with self.lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            stage['seconds'] += seconds
+            stage['calls'] += calls
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def snapshot(self):
+        """
+        Returns the stages and counters recorded so far as plain dicts that can be pickled or serialized.
+        """
+        with self.lock:
+            return {'stages': {name: dict(stage) for name, stage in self.stages.items()}, 'counters': dict(self.counters)}
+
+    def since(self, snapshot):
+        """
+        Returns the stages and counters recorded after the given snapshot was taken, as a snapshot of their own.
+        """
+        current = self.snapshot()
+        stages = {}
+        for name, stage in current['stages'].items():
+            before = snapshot['stages'].get(name, {'seconds': 0.0, 'calls': 0})
+            if stage['calls'] > before['calls']:
+                stages[name] = {'seconds': stage['seconds'] - before['seconds'], 'calls': stage['calls'] - before['calls']}
+        counters = {name: value - snapshot['counters'].get(name, 0) for name, value in current['counters'].items()
+                    if value != snapshot['counters'].get(name, 0)}
+        return {'stages': stages, 'counters': counters}
+
+    def merge(self, snapshot):
+        """
+        Adds the stages and counters of a snapshot, e.g. returned by a worker process, to this profiler.
+        """
+        for name, stage in snapshot['stages'].items():
+            self.add_stage(name, stage['seconds'], stage['calls'])
+        for name, value in snapshot['counters'].items():
+            self.count(name, value)
+
+    @contextmanager
+    def capture(self, mode=None):
+        """
+        Runs the block under the deterministic profiler ('cprofile') or the stack sampler ('sample'); None only runs it.
+        The top functions end up in the report, a cProfile capture is also dumped as a .prof file for pstats or snakeviz.
+        """
+        if mode is None:
+            yield
+            return
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"profile mode must be one of {CAPTURE_MODES}, got {mode}")
+        if mode == 'sample':
+            sampler = StackSampler()
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                self.capture_result = sampler.top()
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            dump_path = report_path('.prof')
+            profile.dump_stats(dump_path)
+            stats = pstats.Stats(profile)
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+            self.capture_result = {
+                'mode': 'cprofile',
+                'stats_file': dump_path,
+                'functions': [{'function': f"{os.path.basename(filename)}:{line}({name})", 'calls': calls,
+                               'self_seconds': round(self_time, 6), 'cumulative_seconds': round(cumulative, 6)}
+                              for (filename, line, name), (_, calls, self_time, cumulative, _) in functions],
+            }
+
+    def report(self):
+        """
+        Returns the report as a dict with the run times, peak memory, stages sorted by time, counters and capture results.
+        """
+        snapshot = self.snapshot()
+        finished_at = datetime.now()
+        return {
+            'command': sys.argv,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'wall_seconds': round((finished_at - self.started_at).total_seconds(), 6),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': {name: {'seconds': round(stage['seconds'], 6), 'calls': stage['calls']}
+                       for name, stage in sorted(snapshot['stages'].items(), key=lambda item: -item[1]['seconds'])},
+            'counters': dict(sorted(snapshot['counters'].items())),
+            'profile': self.capture_result,
+        }
+
+    def write_report(self, path=None):
+        """
+        Writes the report as JSON, by default next to the log file of this run.
+
+        Returns
+        -------
+        str ->  The path of the written report.
+        """
+        try:
+            path = path or report_path()
+            # The log folder only exists once something was logged
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as fh:
+                json.dump(self.report(), fh, indent=2)
+            logging.info(f"Profiling report written to {path}")
+            return path
+        except Exception as e:
+            raise CustomException(e, sys)
+
+
+# Profiler shared by the ingestion modules of this process
+profiler = Profiler()
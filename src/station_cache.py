@@ -0,0 +1,174 @@
+# Import in-built libraries
+import os, sys, glob
+# Import hashlib to key cache entries by station file content
+import hashlib
+# Import data manipulation libraries
+import pandas as pd
+import numpy as np
+# pyarrow is optional, without it PrepareData simply parses the station files every time
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# Import logging and CustomException from utils module
+from src.utils import logging, CustomException
+# Import the ingestion profiler recording stage timers and counters
+from src.profiling import profiler
+
+
+# Columns of a cached station file: date as int32 days since 1970-01-01, measures as float32 in celsius and centimeters
+CACHE_COLUMNS = ['date', 'max_temp', 'min_temp', 'precipitation_amt']
+# Decimal places of each measure after unit scaling, used to restore the exact float64 values from float32
+MEASURE_DECIMALS = {'max_temp': 1, 'min_temp': 1, 'precipitation_amt': 2}
+
+
+def cache_available():
+    """
+    Returns True when pyarrow is installed and station files can be cached.
+    """
+    return pa is not None
+
+
+def parse_station_columns(path):
+    """
+    Parses a raw station file into typed columns.
+
+    Parameters
+    ----------
+    path (str): Path of the station file.
+
+    Returns
+    -------
+    dict ->  'date' as int32 days since epoch and 'max_temp', 'min_temp', 'precipitation_amt' as float32 arrays.
+    """
+    with profiler.stage('prepare.read_csv'):
+        raw = pd.read_csv(path, sep = '\t', names = CACHE_COLUMNS)
+    with profiler.stage('prepare.convert'):
+        columns = {
+            'date': pd.to_datetime(raw.date, format = '%Y%m%d').values.astype('datetime64[D]').astype(np.int32),
+            'max_temp': (raw['max_temp']/10).values.astype(np.float32),   # maximum temperature in celsius
+            'min_temp': (raw['min_temp']/10).values.astype(np.float32),   # minimum temperature in celsius
+            'precipitation_amt': (raw['precipitation_amt']/100).values.astype(np.float32),  # precipitation amount in centimeters
+        }
+    profiler.count('prepare.files_read')
+    profiler.count('prepare.bytes_read', os.path.getsize(path) if isinstance(path, str) else len(path.getbuffer()))
+    profiler.count('prepare.rows_parsed', len(raw))
+    return columns
+
+
+def columns_to_frame(columns, station_id):
+    """
+    Builds the weather dataframe of one station from cached columns, identical to PrepareData.prepare_station_file.
+
+    Parameters
+    ----------
+    columns (dict): Typed columns as returned by parse_station_columns or StationCache.columns.
+    station_id (str): The station id of the columns.
+
+    Returns
+    -------
+    pandas.DataFrame ->  A pandas DataFrame containing the weather data of that station.
+    """
+    dates = columns['date'].astype('datetime64[D]')
+    tempdf = pd.DataFrame({'date': pd.Series(dates).dt.date})
+    for name, decimals in MEASURE_DECIMALS.items():
+        # float32 keeps enough digits to recover the scaled value exactly after rounding
+        tempdf[name] = np.round(columns[name].astype(np.float64), decimals)
+    tempdf['station_id'] = station_id
+    # Format the keys from the day numbers directly, which is much faster than formatting date objects
+    tempdf['wid'] = station_id + '_' + pd.Series(np.datetime_as_string(dates, unit='D'), dtype=str)
+    return tempdf
+
+
+class StationCache:
+    """
+    A columnar cache of parsed weather station files stored as Arrow IPC files, one per station, named after the station id and
+    the hash of the source file content. Valid entries are memory-mapped, so reading them costs no parsing and no copy.
+
+    Parameterized Constructor:
+    ----------
+    cache_dir (str): Folder holding the cache files.
+
+    Methods
+    -------
+    columns(path) -> Returns the typed columns of a station file, from the cache when valid or by parsing and caching it.
+    read_table() -> Returns every cached station as one memory-mapped pyarrow Table for the transform step or ad-hoc analysis.
+    """
+    def __init__(self, cache_dir):
+        try:
+            if pa is None:
+                raise ImportError('pyarrow is required for the station cache')
+            self.cache_dir = cache_dir
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.hits = 0
+            self.misses = 0
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def entry_path(self, path):
+        f = os.path.basename(path)
+        with open(path, 'rb') as fh:
+            content_hash = hashlib.sha1(fh.read()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{f[:f.index('.')]}-{content_hash}.arrow")
+
+    def columns(self, path):
+        """
+        Returns the typed columns of a station file.
+
+        Parameters
+        ----------
+        path (str): Path of the station file.
+
+        Returns
+        -------
+        dict ->  Columns as described by parse_station_columns; on a cache hit they are zero-copy views of the mapped file.
+        """
+        with profiler.stage('prepare.cache_read'):
+            entry = self.entry_path(path)
+            if os.path.exists(entry):
+                self.hits += 1
+                table = pa.ipc.open_file(pa.memory_map(entry, 'r')).read_all()
+                profiler.count('prepare.cache_hits')
+                profiler.count('prepare.rows_cached', table.num_rows)
+                return {name: table.column(name).to_numpy() for name in CACHE_COLUMNS}
+
+        self.misses += 1
+        columns = parse_station_columns(path)
+        with profiler.stage('prepare.cache_write'):
+            self.store(entry, columns)
+        return columns
+
+    def store(self, entry, columns):
+        # Entries of an older version of the same station file are stale now
+        for stale in glob.glob(entry[:entry.rindex('-')] + '-*.arrow'):
+            os.remove(stale)
+        station_id = os.path.basename(entry)[:os.path.basename(entry).rindex('-')]
+        table = pa.table({
+            'date': pa.array(columns['date'], type=pa.int32()).cast(pa.date32()),
+            'max_temp': pa.array(columns['max_temp'], type=pa.float32()),
+            'min_temp': pa.array(columns['min_temp'], type=pa.float32()),
+            'precipitation_amt': pa.array(columns['precipitation_amt'], type=pa.float32()),
+            'station_id': pa.DictionaryArray.from_arrays(
+                pa.array(np.zeros(len(columns['date']), dtype=np.int32)), pa.array([station_id])),
+        })
+        # Write to a temporary file first so concurrent workers never map a partial entry
+        tmp_entry = f"{entry}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_entry, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_entry, entry)
+
+    def read_table(self):
+        """
+        Returns every cached station as one memory-mapped pyarrow Table with date, max_temp, min_temp, precipitation_amt and
+        station_id columns.
+        """
+        try:
+            tables = [pa.ipc.open_file(pa.memory_map(entry, 'r')).read_all()
+                      for entry in sorted(glob.glob(os.path.join(self.cache_dir, '*.arrow')))]
+            logging.info(f'station cache table read from {len(tables)} cached stations')
+            return pa.concat_tables(tables) if tables else None
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,70 @@
+# Import python library for postgres sql
+import psycopg2
+
+# Import the utils module, whose config.ini sections are read on first lookup: the functions below look them up when they are
+# called, and the backend modules (pandas, duckdb) are imported by the functions that use them, so importing this module
+# reads no configuration and stays cheap for the API and for data_model.py --help
+from src import utils
+
+
+# Storage backends selectable with backend = ... in the [storage] section of config.ini
+STORAGE_BACKENDS = ('postgres', 'duckdb')
+
+
+def storage_backend(params=None):
+    """
+    Returns the configured storage backend, 'postgres' unless the [storage] section (or params) says otherwise.
+    """
+    params = utils.storage_params if params is None else params
+    backend = params.get('backend', 'postgres').strip().lower()
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"storage backend must be one of {STORAGE_BACKENDS}, got {backend}")
+    return backend
+
+
+def database_errors(params=None):
+    """
+    Returns the errors the API treats as a database that is reachable but not loaded yet, for the configured backend.
+    """
+    params = utils.storage_params if params is None else params
+    if params.get('backend', 'postgres').strip().lower() == 'duckdb':
+        # Only duckdb itself: src.duckdb_operations would import the data preparation modules and pandas with them
+        try:
+            import duckdb
+            return (psycopg2.Error, duckdb.Error)
+        except ImportError:
+            pass
+    return (psycopg2.Error,)
+
+
+def __getattr__(name):
+    # DATABASE_ERRORS, the errors the API treats as a database that is reachable but not loaded yet whichever backend is
+    # configured, is resolved on first lookup and kept as a module attribute from then on, as the sections of src.utils
+    if name == 'DATABASE_ERRORS':
+        errors = globals()[name] = database_errors()
+        return errors
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def create_db_operations(params=None):
+    """
+    Returns the DBOperations of the configured backend: DBOperations on Postgres or DuckDBOperations on the embedded file.
+    """
+    params = utils.storage_params if params is None else params
+    if storage_backend(params) == 'duckdb':
+        from src.duckdb_operations import DuckDBOperations
+        return DuckDBOperations(params)
+    from src.database_operations import DBOperations
+    return DBOperations(utils.db_params)
+
+
+def create_connection_pool(params=None):
+    """
+    Returns the connection pool of the API for the configured backend, sized by the [db_pool] section on Postgres.
+    """
+    params = utils.storage_params if params is None else params
+    if storage_backend(params) == 'duckdb':
+        from src.duckdb_operations import EmbeddedConnectionPool, DEFAULT_PATH
+        return EmbeddedConnectionPool(params.get('path', DEFAULT_PATH))
+    from src.db_pool import ConnectionPool
+    return ConnectionPool(utils.db_params, **utils.db_pool_params)
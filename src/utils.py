@@ -2,33 +2,92 @@
 import os
 import sys
 import logging
+import functools
 from datetime import datetime
 from configparser import ConfigParser
+# resource module is only available on Unix platforms
+try:
+    import resource
+except ImportError:
+    resource = None
 
 # Read Config file
 cfg_file = 'config.ini'
-# Initialize config parser object
-config = ConfigParser()
-# Read the config file into an object
-config.read(cfg_file, encoding="utf-8")
-# Storing the contents of the config file into respective dictionary variables
-db_params = dict(config.items('db_params'))
+# Sections of config.ini exposed as dictionaries: module attribute -> (section name, whether the section is required)
+CONFIG_SECTIONS = {
+    'db_params': ('db_params', True),
+    # Optional connection pool settings of the API (minconn, maxconn, timeout, health_check_interval) in a [db_pool] section
+    'db_pool_params': ('db_pool', False),
+    # Optional API response cache settings (backend, ttl, max_entries, max_bytes, directory, version_check_interval) in a [cache] section
+    'cache_params': ('cache', False),
+    # Optional storage backend settings (backend = postgres or duckdb, path of the DuckDB file) in a [storage] section
+    'storage_params': ('storage', False),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def load_config():
+    """
+    Reads config.ini from the working directory the first time the configuration is needed.
+    """
+    # Initialize config parser object
+    config = ConfigParser()
+    # Read the config file into an object
+    config.read(cfg_file, encoding="utf-8")
+    return config
+
+
+def __getattr__(name):
+    # config and the section dictionaries (db_params, db_pool_params, cache_params, storage_params) are read on first lookup,
+    # e.g. by "from src.utils import db_params", and kept as module attributes from then on
+    if name == 'config':
+        return load_config()
+    if name in CONFIG_SECTIONS:
+        section, required = CONFIG_SECTIONS[name]
+        config = load_config()
+        params = dict(config.items(section)) if required or config.has_section(section) else {}
+        globals()[name] = params
+        return params
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class LazyFileHandler(logging.FileHandler):
+    """
+    Log file handler that creates the log folder and opens the log file with the first record, so a process that logs
+    nothing (--help, argument errors, imports by tools) leaves no empty log folder behind.
+    """
+    def __init__(self, filename):
+        super().__init__(filename, delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
 
 
 # Logging Configuration
 LOG_FILE=f"{datetime.now().strftime('%m_%d_%Y_%H_%M_%S')}.log"   # Define the log filename format
-logs_path=os.path.join(os.getcwd(),"logs",LOG_FILE)  # Create a log folder path variable for the log files to be stored
-os.makedirs(logs_path, exist_ok=True)  # if the folder exists, keep on appending the log file to the folder itself
+logs_path=os.path.join(os.getcwd(),"logs",LOG_FILE)  # Log folder of this run, created with the first log record
 # Log file path constant
 LOG_FILE_PATH=os.path.join(logs_path,LOG_FILE)
 # Logging Basic Configuration "creationtime linenumber root INFO message"
 logging.basicConfig(
-    filename=LOG_FILE_PATH,
+    handlers=[LazyFileHandler(LOG_FILE_PATH)],
     format="[ %(asctime)s ] %(lineno)d %(name)s - %(levelname)s - %(message)s", 
     level=logging.INFO
 )
 
 
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process in megabytes, or None where the platform does not expose it.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
 # Custom Exception Configuration
 def error_message_detail(error, error_detail:sys):
     _,_,exc_tb=error_detail.exc_info()    # Throws which file and which line an exception is occurring in
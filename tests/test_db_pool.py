@@ -0,0 +1,43 @@
+# Import in-built libraries
+from functools import partial
+# Import testing library
+import pytest
+# Import python library for postgres sql
+import psycopg2
+
+# Import the prepared statement connection of the API pool
+from src.db_pool import PreparedStatementConnection
+
+
+@pytest.fixture
+def conn():
+    # Connects with the libpq environment variables (PGHOST, PGUSER, PGDATABASE, ...)
+    try:
+        conn = psycopg2.connect('', connection_factory=partial(PreparedStatementConnection, max_statements=4))
+    except psycopg2.OperationalError as e:
+        pytest.skip(f'no Postgres server available: {e}')
+    yield conn
+    conn.close()
+
+
+def server_statements(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM pg_prepared_statements")
+        return cur.fetchone()[0]
+
+
+def test_failed_executions_do_not_leak_prepared_statements(conn):
+    cur = conn.cursor()
+    # Committed, so the setting outlives the rollbacks below
+    cur.execute("SET statement_timeout = 10")
+    conn.commit()
+    for _ in range(20):
+        # Every EXECUTE is cancelled by the statement timeout
+        with pytest.raises(psycopg2.errors.QueryCanceled):
+            cur.execute("SELECT pg_sleep(%s)", [1])
+        conn.rollback()
+        assert server_statements(conn) <= conn.max_statements
+    cur.execute("SET statement_timeout = 0")
+    cur.execute("SELECT %s::int + 1", [1])
+    assert cur.fetchone()[0] == 2
+    assert server_statements(conn) == 1